@@ -2,17 +2,20 @@ import os
 from dotenv import load_dotenv
 import snowflake.connector
 
+import profiling
+import query_trace
+
 load_dotenv()
 
 def get_connection():
-    return snowflake.connector.connect(
+    return query_trace.traced(snowflake.connector.connect(
         user=os.getenv("SNOWFLAKE_USER"),
         password=os.getenv("SNOWFLAKE_PASSWORD"),
         role=os.getenv("SNOWFLAKE_ROLE"),
         account=os.getenv("SNOWFLAKE_ACCOUNT"),
         warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
         database=os.getenv("SNOWFLAKE_DATABASE")
-    )
+    ))
 
 def create_schemas():
     """Create all schemas"""
@@ -144,8 +147,10 @@ def create_linkmap_tables():
         contributor VARCHAR(200),
         total_commits INTEGER DEFAULT 0,
         recent_90_days_commits INTEGER DEFAULT 0,
-        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+        load_batch_id INTEGER
     )
+    CLUSTER BY (load_batch_id)
     """)
     
     # git_repo_commits
@@ -157,8 +162,10 @@ def create_linkmap_tables():
         commits_90d INTEGER DEFAULT 0,
         commits_180d INTEGER DEFAULT 0,
         last_commit_date TIMESTAMP_NTZ,
-        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+        load_batch_id INTEGER
     )
+    CLUSTER BY (load_batch_id)
     """)
     
     # git_repo_issues
@@ -169,8 +176,10 @@ def create_linkmap_tables():
         open_issues INTEGER DEFAULT 0,
         closed_issues INTEGER DEFAULT 0,
         issues_last_90d INTEGER DEFAULT 0,
-        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+        load_batch_id INTEGER
     )
+    CLUSTER BY (load_batch_id)
     """)
     
     # git_repo_releases
@@ -181,7 +190,46 @@ def create_linkmap_tables():
         release_count INTEGER DEFAULT 0,
         last_release_date TIMESTAMP_NTZ,
         days_since_last_release INTEGER DEFAULT 999,
-        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+        load_timestamp TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+        load_batch_id INTEGER
+    )
+    CLUSTER BY (load_batch_id)
+    """)
+    
+    # every LINKMAP load is one batch; enrichment reads only each repo's latest batch
+    cursor.execute("CREATE OR REPLACE SEQUENCE LINKMAP.SEQ_LOAD_BATCH START = 1 INCREMENT = 1")
+
+    cursor.execute("""
+    CREATE OR REPLACE TABLE LINKMAP.LOAD_BATCHES (
+        load_batch_id INTEGER,
+        hub_table VARCHAR(100),
+        row_count INTEGER DEFAULT 0,
+        loaded_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """)
+
+    # each repo's latest batch, one table per hub so the concurrent hub loads never
+    # MERGE into the same table
+    cursor.execute("DROP TABLE IF EXISTS LINKMAP.HUB_LATEST_BATCH")
+    for hub in ['HUB_REPO_CONTRIBUTORS', 'HUB_REPO_COMMITS', 'HUB_REPO_ISSUES', 'HUB_REPO_RELEASES']:
+        cursor.execute(f"""
+        CREATE OR REPLACE TABLE LINKMAP.{hub}_LATEST_BATCH (
+            data_source VARCHAR(200),
+            repo VARCHAR(400),
+            load_batch_id INTEGER
+        )
+        """)
+
+    # Contributor counts per repo, refreshed from each contributor batch so ENRICH
+    # never re-aggregates HUB_REPO_CONTRIBUTORS
+    cursor.execute("""
+    CREATE OR REPLACE TABLE LINKMAP.REPO_CONTRIBUTOR_AGG (
+        data_source VARCHAR(200),
+        repo_full_name VARCHAR(400),
+        total_contributors INTEGER DEFAULT 0,
+        active_contributors_90d INTEGER DEFAULT 0,
+        load_batch_id INTEGER,
+        updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
     )
     """)
     
@@ -219,6 +267,7 @@ def create_enrich_table():
         release_count INTEGER DEFAULT 0,
         last_release_date TIMESTAMP_NTZ,
         days_since_last_release INTEGER DEFAULT 999,
+        scoring_fingerprint NUMBER(19,0),
         enriched_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
     )
     """)
@@ -244,13 +293,70 @@ def create_curate_table():
         open_issues INTEGER DEFAULT 0,
         risk_score FLOAT DEFAULT 0.0,
         risk_category VARCHAR(20),
+        scoring_fingerprint NUMBER(19,0),
         last_updated TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
     )
     """)
     
+    # One row per score change; VALID_TO is NULL for the current score
+    cursor.execute("""
+    CREATE OR REPLACE TABLE CURATE.RISK_SCORE_HISTORY (
+        data_source VARCHAR(200),
+        full_name VARCHAR(400),
+        risk_score FLOAT,
+        risk_category VARCHAR(20),
+        model_version VARCHAR(20),
+        valid_from TIMESTAMP_NTZ,
+        valid_to TIMESTAMP_NTZ
+    )
+    CLUSTER BY (full_name)
+    """)
+    
+    cursor.close()
+    conn.close()
+    print("Curate tables created")
+
+def create_orchestration_tables():
+    """Create orchestration tables"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # repos touched by the current stream delta, consumed by ENRICH and CURATE
+    cursor.execute("""
+    CREATE OR REPLACE TABLE ORCHESTRATION.CHANGED_REPOS (
+        data_source VARCHAR(200),
+        full_name VARCHAR(400),
+        changed_layer VARCHAR(50),
+        changed_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """)
+
+    # row counts and quality counters written by each pipeline step when it finishes
+    cursor.execute("""
+    CREATE OR REPLACE TABLE ORCHESTRATION.PIPELINE_METRICS (
+        stage VARCHAR(50),
+        metric_name VARCHAR(100),
+        metric_value NUMBER,
+        recorded_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """)
+
+    # current row counts and quality counters per table, read by the monitoring view
+    cursor.execute("""
+    CREATE OR REPLACE TABLE ORCHESTRATION.LAYER_METRICS (
+        layer VARCHAR(50),
+        table_name VARCHAR(100),
+        data_source VARCHAR(200),
+        metric_name VARCHAR(100),
+        metric_value FLOAT,
+        metric_ts TIMESTAMP_NTZ,
+        recorded_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """)
+
     cursor.close()
     conn.close()
-    print("Curate table created")
+    print("Orchestration tables created")
 
 def main():
     """Main function"""
@@ -260,6 +366,7 @@ def main():
     create_linkmap_tables()
     create_enrich_table()
     create_curate_table()
+    create_orchestration_tables()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_main(main, 'create_tables_schemas')
\ No newline at end of file
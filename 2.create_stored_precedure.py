@@ -3,20 +3,37 @@ import snowflake.connector
 import os
 from dotenv import load_dotenv
 
+import contributor_sketch
+import layer_metrics
+import profiling
+import query_trace
+import risk_scoring
+
 load_dotenv()
 
+# CURATE scoring is rendered from the active version in risk_models.json
+RISK_MODEL = risk_scoring.load_model()
+
 def get_connection():
-    return snowflake.connector.connect(
+    return query_trace.traced(snowflake.connector.connect(
         user=os.getenv("SNOWFLAKE_USER"),
         password=os.getenv("SNOWFLAKE_PASSWORD"),
         role=os.getenv("SNOWFLAKE_ROLE"),
         account=os.getenv("SNOWFLAKE_ACCOUNT"),
         warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
         database=os.getenv("SNOWFLAKE_DATABASE")
-    )
+    ))
 
 # Define all stored procedures
 STORED_PROCEDURES = [
+    {
+        "name": "ORCHESTRATION.SP_RECORD_LAYER_METRICS",
+        "code": layer_metrics.snowflake_procedure_sql()
+    },
+    {
+        "name": "ORCHESTRATION.SP_REFRESH_LAYER_METRICS",
+        "code": layer_metrics.snowflake_refresh_procedure_sql()
+    },
     {
         "name": "STAGE.SP_LOAD_STG_REPOSITORIES",
         "code": """
@@ -30,37 +47,43 @@ DECLARE
     v_valid_records INTEGER;
     v_invalid_records INTEGER;
     v_duplicate_count INTEGER;
+    v_missing_id INTEGER;
+    v_missing_name INTEGER;
+    v_missing_full_name INTEGER;
+    v_negative_stars INTEGER;
+    v_negative_forks INTEGER;
+    v_missing_created_at INTEGER;
     v_final_records INTEGER;
     v_result VARCHAR;
 BEGIN
-    -- Get total records count
-    SELECT COUNT(*) INTO v_total_records 
-    FROM RAW.SRC_GIT_REPOSITORIES 
-    WHERE DATA_SOURCE = 'git_hub';
-    
-    -- Count records that fail data quality checks
-    SELECT COUNT(*) INTO v_invalid_records 
-    FROM RAW.SRC_GIT_REPOSITORIES 
-    WHERE DATA_SOURCE = 'git_hub'
-      AND (
-          ID IS NULL 
-          OR TRIM(ID) = ''
-          OR NAME IS NULL 
-          OR TRIM(NAME) = ''
-          OR FULL_NAME IS NULL 
-          OR TRIM(FULL_NAME) = ''
-          OR STARS < 0
-          OR FORKS < 0
-          OR (CREATED_AT IS NULL OR TO_VARCHAR(CREATED_AT) = '')
-      );
+    -- Single pass over the stream delta: cleansing, validity flag, reason code and dedup rank
+    CREATE OR REPLACE TEMPORARY TABLE TEMP_CLEANED_REPOS (
+        DATA_SOURCE VARCHAR(200),
+        ID VARCHAR(100),
+        NAME VARCHAR(200),
+        FULL_NAME VARCHAR(400),
+        OWNER VARCHAR(200),
+        LANGUAGE VARCHAR(100),
+        STARS INTEGER,
+        FORKS INTEGER,
+        HTML_URL VARCHAR(500),
+        CREATED_AT TIMESTAMP_NTZ,
+        UPDATED_AT TIMESTAMP_NTZ,
+        VALID_FLAG BOOLEAN,
+        INVALID_REASON VARCHAR(500),
+        MISSING_CREATED_AT BOOLEAN,
+        RN INTEGER
+    );
     
-    v_valid_records := v_total_records - v_invalid_records;
+    -- Consuming the stream advances its offset only when this transaction commits, so a
+    -- failure in any write below leaves the delta in the stream for the next run
+    BEGIN TRANSACTION;
     
-    CREATE OR REPLACE TEMPORARY TABLE TEMP_CLEANED_REPOS AS
+    INSERT INTO TEMP_CLEANED_REPOS
     SELECT 
         *,
         ROW_NUMBER() OVER (
-            PARTITION BY TRIM(FULL_NAME) 
+            PARTITION BY FULL_NAME 
             ORDER BY 
                 CASE 
                     WHEN UPDATED_AT IS NULL THEN '1970-01-01 00:00:00'::TIMESTAMP_NTZ
@@ -108,26 +131,77 @@ BEGIN
                 WHEN STARS < 0 THEN 'Negative Stars Count'
                 WHEN FORKS < 0 THEN 'Negative Forks Count'
                 ELSE 'Valid'
-            END AS INVALID_REASON
-        FROM RAW.SRC_GIT_REPOSITORIES
+            END AS INVALID_REASON,
+            (CREATED_AT IS NULL OR TO_VARCHAR(CREATED_AT) = '') AS MISSING_CREATED_AT
+        FROM RAW.STREAM_SRC_GIT_REPOSITORIES
         WHERE DATA_SOURCE = 'git_hub'
+          AND METADATA$ACTION = 'INSERT'
     );
     
-    SELECT COUNT(*) - COUNT(DISTINCT FULL_NAME) INTO v_duplicate_count 
+    -- Every quality counter in one aggregate over the cleaned delta
+    SELECT 
+        COUNT(*),
+        COUNT_IF(NOT VALID_FLAG OR MISSING_CREATED_AT),
+        COUNT_IF(RN > 1),
+        COUNT_IF(INVALID_REASON = 'Missing ID'),
+        COUNT_IF(INVALID_REASON = 'Missing Name'),
+        COUNT_IF(INVALID_REASON = 'Missing Full Name'),
+        COUNT_IF(INVALID_REASON = 'Negative Stars Count'),
+        COUNT_IF(INVALID_REASON = 'Negative Forks Count'),
+        COUNT_IF(MISSING_CREATED_AT)
+    INTO 
+        :v_total_records, :v_invalid_records, :v_duplicate_count,
+        :v_missing_id, :v_missing_name, :v_missing_full_name,
+        :v_negative_stars, :v_negative_forks, :v_missing_created_at
     FROM TEMP_CLEANED_REPOS;
     
+    v_valid_records := v_total_records - v_invalid_records;
     
-    INSERT INTO STAGE.STG_REPOSITORIES (
+    -- Upsert the delta so STAGE keeps one row per repository
+    MERGE INTO STAGE.STG_REPOSITORIES tgt
+    USING (
+        SELECT 
+            DATA_SOURCE, ID, NAME, FULL_NAME, OWNER, LANGUAGE, STARS, FORKS, HTML_URL,
+            CREATED_AT, UPDATED_AT, VALID_FLAG, INVALID_REASON
+        FROM TEMP_CLEANED_REPOS
+        WHERE rn = 1
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.FULL_NAME = src.FULL_NAME
+    WHEN MATCHED AND src.UPDATED_AT >= tgt.UPDATED_AT THEN UPDATE SET
+        ID = src.ID, NAME = src.NAME, OWNER = src.OWNER, LANGUAGE = src.LANGUAGE,
+        STARS = src.STARS, FORKS = src.FORKS, HTML_URL = src.HTML_URL,
+        CREATED_AT = src.CREATED_AT, UPDATED_AT = src.UPDATED_AT,
+        LOAD_TIMESTAMP = CURRENT_TIMESTAMP(),
+        VALID_FLAG = src.VALID_FLAG, INVALID_REASON = src.INVALID_REASON
+    WHEN NOT MATCHED THEN INSERT (
         DATA_SOURCE, ID, NAME, FULL_NAME, OWNER, LANGUAGE, STARS, FORKS, HTML_URL, 
         CREATED_AT, UPDATED_AT, LOAD_TIMESTAMP, VALID_FLAG, INVALID_REASON
-    )
-    SELECT 
-        DATA_SOURCE, ID, NAME, FULL_NAME, OWNER, LANGUAGE, STARS, FORKS, HTML_URL,
-        CREATED_AT, UPDATED_AT, CURRENT_TIMESTAMP(), VALID_FLAG, INVALID_REASON
+    ) VALUES (
+        src.DATA_SOURCE, src.ID, src.NAME, src.FULL_NAME, src.OWNER, src.LANGUAGE, src.STARS, src.FORKS, src.HTML_URL,
+        src.CREATED_AT, src.UPDATED_AT, CURRENT_TIMESTAMP(), src.VALID_FLAG, src.INVALID_REASON
+    );
+    
+    v_final_records := SQLROWCOUNT;
+    
+    -- Hand the touched repositories on to ENRICH (rn = 1 is already one row per repository)
+    INSERT INTO ORCHESTRATION.CHANGED_REPOS (DATA_SOURCE, FULL_NAME, CHANGED_LAYER)
+    SELECT DATA_SOURCE, FULL_NAME, 'STAGE'
     FROM TEMP_CLEANED_REPOS
     WHERE rn = 1;
     
-    v_final_records := SQLROWCOUNT;
+    INSERT INTO ORCHESTRATION.PIPELINE_METRICS (STAGE, METRIC_NAME, METRIC_VALUE)
+    VALUES 
+        ('STAGE', 'TOTAL_RECORDS', :v_total_records),
+        ('STAGE', 'VALID_RECORDS', :v_valid_records),
+        ('STAGE', 'INVALID_RECORDS', :v_invalid_records),
+        ('STAGE', 'DUPLICATE_RECORDS', :v_duplicate_count),
+        ('STAGE', 'MISSING_ID', :v_missing_id),
+        ('STAGE', 'MISSING_NAME', :v_missing_name),
+        ('STAGE', 'MISSING_FULL_NAME', :v_missing_full_name),
+        ('STAGE', 'NEGATIVE_STARS', :v_negative_stars),
+        ('STAGE', 'NEGATIVE_FORKS', :v_negative_forks),
+        ('STAGE', 'MISSING_CREATED_AT', :v_missing_created_at),
+        ('STAGE', 'FINAL_LOADED', :v_final_records);
     
     v_result := 'SUCCESS: Total=' || v_total_records || 
                 ', Valid=' || v_valid_records || 
@@ -136,11 +210,14 @@ BEGIN
                 ', FinalLoaded=' || v_final_records || 
                 ' records to STAGE.STG_REPOSITORIES';
     
+    COMMIT;
+    
     DROP TABLE TEMP_CLEANED_REPOS;
     
     RETURN v_result;
 EXCEPTION
     WHEN OTHER THEN
+        ROLLBACK;
         SYSTEM$LOG('error', 'SP_LOAD_STG_REPOSITORIES failed: ' || SQLERRM);
         RAISE;
 END;
@@ -155,10 +232,28 @@ RETURNS VARCHAR
 LANGUAGE SQL
 AS
 $$
+DECLARE
+    v_stream_has_data BOOLEAN;
+    v_batch_id INTEGER;
+    v_loaded INTEGER;
 BEGIN
     
+    -- An empty stream takes no batch id: an empty LOAD_BATCHES row would count towards
+    -- SP_PURGE_HUB_BATCHES' retention window
+    SELECT SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_CONTRIBUTORS') INTO v_stream_has_data;
+    IF (v_stream_has_data = FALSE) THEN
+        RETURN 'SUCCESS: No new records for LINKMAP.HUB_REPO_CONTRIBUTORS';
+    END IF;
+    
+    SELECT LINKMAP.SEQ_LOAD_BATCH.NEXTVAL INTO :v_batch_id;
+    
+    -- The stream offset advances only when this transaction commits, so the batch, its
+    -- latest-batch pointers and the ENRICH hand-off are written together or not at all
+    BEGIN TRANSACTION;
+    
+    -- Only rows inserted into RAW since the last run
     INSERT INTO LINKMAP.HUB_REPO_CONTRIBUTORS (
-        DATA_SOURCE, REPO_FULL_NAME, CONTRIBUTOR, TOTAL_COMMITS, RECENT_90_DAYS_COMMITS, LOAD_TIMESTAMP
+        DATA_SOURCE, REPO_FULL_NAME, CONTRIBUTOR, TOTAL_COMMITS, RECENT_90_DAYS_COMMITS, LOAD_TIMESTAMP, LOAD_BATCH_ID
     )
     SELECT 
         DATA_SOURCE,
@@ -170,11 +265,69 @@ BEGIN
             WHEN RECENT_90_DAYS_COMMITS > TOTAL_COMMITS THEN TOTAL_COMMITS
             ELSE RECENT_90_DAYS_COMMITS 
         END AS RECENT_90_DAYS_COMMITS,
-        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP
-    FROM RAW.SRC_GIT_REPO_CONTRIBUTORS
-    WHERE DATA_SOURCE = 'git_hub';
+        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP,
+        :v_batch_id AS LOAD_BATCH_ID
+    FROM RAW.STREAM_SRC_GIT_REPO_CONTRIBUTORS
+    WHERE DATA_SOURCE = 'git_hub'
+      AND METADATA$ACTION = 'INSERT';
+    
+    v_loaded := SQLROWCOUNT;
+    
+    INSERT INTO LINKMAP.LOAD_BATCHES (LOAD_BATCH_ID, HUB_TABLE, ROW_COUNT)
+    VALUES (:v_batch_id, 'HUB_REPO_CONTRIBUTORS', :v_loaded);
+    
+    -- Point each repo in this batch at it so ENRICH reads only the latest batch
+    MERGE INTO LINKMAP.HUB_REPO_CONTRIBUTORS_LATEST_BATCH tgt
+    USING (
+        SELECT DISTINCT DATA_SOURCE, REPO_FULL_NAME AS REPO
+        FROM LINKMAP.HUB_REPO_CONTRIBUTORS
+        WHERE LOAD_BATCH_ID = :v_batch_id
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.REPO = src.REPO
+    WHEN MATCHED THEN UPDATE SET LOAD_BATCH_ID = :v_batch_id
+    WHEN NOT MATCHED THEN INSERT (DATA_SOURCE, REPO, LOAD_BATCH_ID)
+        VALUES (src.DATA_SOURCE, src.REPO, :v_batch_id);
+    
+    -- Each batch holds a repo's full contributor snapshot, so its counts replace the old ones
+    MERGE INTO LINKMAP.REPO_CONTRIBUTOR_AGG tgt
+    USING (
+        SELECT 
+            DATA_SOURCE,
+            REPO_FULL_NAME,
+            """ + contributor_sketch.distinct_count_sql("CONTRIBUTOR") + """ AS TOTAL_CONTRIBUTORS,
+            """ + contributor_sketch.distinct_count_sql(
+                "CASE WHEN RECENT_90_DAYS_COMMITS > 0 THEN CONTRIBUTOR END"
+            ) + """ AS ACTIVE_CONTRIBUTORS_90D
+        FROM LINKMAP.HUB_REPO_CONTRIBUTORS
+        WHERE LOAD_BATCH_ID = :v_batch_id
+        GROUP BY DATA_SOURCE, REPO_FULL_NAME
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.REPO_FULL_NAME = src.REPO_FULL_NAME
+    WHEN MATCHED THEN UPDATE SET
+        TOTAL_CONTRIBUTORS = src.TOTAL_CONTRIBUTORS,
+        ACTIVE_CONTRIBUTORS_90D = src.ACTIVE_CONTRIBUTORS_90D,
+        LOAD_BATCH_ID = :v_batch_id,
+        UPDATED_AT = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (
+        DATA_SOURCE, REPO_FULL_NAME, TOTAL_CONTRIBUTORS, ACTIVE_CONTRIBUTORS_90D, LOAD_BATCH_ID, UPDATED_AT
+    ) VALUES (
+        src.DATA_SOURCE, src.REPO_FULL_NAME, src.TOTAL_CONTRIBUTORS, src.ACTIVE_CONTRIBUTORS_90D,
+        :v_batch_id, CURRENT_TIMESTAMP()
+    );
+    
+    INSERT INTO ORCHESTRATION.CHANGED_REPOS (DATA_SOURCE, FULL_NAME, CHANGED_LAYER)
+    SELECT DATA_SOURCE, REPO, 'LINKMAP'
+    FROM LINKMAP.HUB_REPO_CONTRIBUTORS_LATEST_BATCH
+    WHERE LOAD_BATCH_ID = :v_batch_id;
+    
+    COMMIT;
     
-    RETURN 'SUCCESS: Loaded ' || SQLROWCOUNT || ' records to LINKMAP.HUB_REPO_CONTRIBUTORS';
+    RETURN 'SUCCESS: Loaded ' || v_loaded || ' records to LINKMAP.HUB_REPO_CONTRIBUTORS';
+EXCEPTION
+    WHEN OTHER THEN
+        ROLLBACK;
+        SYSTEM$LOG('error', 'SP_LOAD_HUB_REPO_CONTRIBUTORS failed: ' || SQLERRM);
+        RAISE;
 END;
 $$;
 """
@@ -187,10 +340,28 @@ RETURNS VARCHAR
 LANGUAGE SQL
 AS
 $$
+DECLARE
+    v_stream_has_data BOOLEAN;
+    v_batch_id INTEGER;
+    v_loaded INTEGER;
 BEGIN
     
+    -- An empty stream takes no batch id: an empty LOAD_BATCHES row would count towards
+    -- SP_PURGE_HUB_BATCHES' retention window
+    SELECT SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_COMMITS') INTO v_stream_has_data;
+    IF (v_stream_has_data = FALSE) THEN
+        RETURN 'SUCCESS: No new records for LINKMAP.HUB_REPO_COMMITS';
+    END IF;
+    
+    SELECT LINKMAP.SEQ_LOAD_BATCH.NEXTVAL INTO :v_batch_id;
+    
+    -- The stream offset advances only when this transaction commits, so the batch, its
+    -- latest-batch pointers and the ENRICH hand-off are written together or not at all
+    BEGIN TRANSACTION;
+    
+    -- Only rows inserted into RAW since the last run
     INSERT INTO LINKMAP.HUB_REPO_COMMITS (
-        DATA_SOURCE, REPO, COMMITS_30D, COMMITS_90D, COMMITS_180D, LAST_COMMIT_DATE, LOAD_TIMESTAMP
+        DATA_SOURCE, REPO, COMMITS_30D, COMMITS_90D, COMMITS_180D, LAST_COMMIT_DATE, LOAD_TIMESTAMP, LOAD_BATCH_ID
     )
     SELECT 
         DATA_SOURCE,
@@ -211,11 +382,47 @@ BEGIN
             THEN CURRENT_TIMESTAMP()
             ELSE LAST_COMMIT_DATE
         END AS LAST_COMMIT_DATE,
-        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP
-    FROM RAW.SRC_GIT_REPO_COMMITS
-    WHERE DATA_SOURCE = 'git_hub';
+        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP,
+        :v_batch_id AS LOAD_BATCH_ID
+    FROM RAW.STREAM_SRC_GIT_REPO_COMMITS s
+    WHERE DATA_SOURCE = 'git_hub'
+      AND METADATA$ACTION = 'INSERT'
+    -- One row per repo and batch: of several snapshots in one delta keep the latest RAW
+    -- load, with the row id as a deterministic tiebreak within one load
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY TRIM(s.REPO) ORDER BY s.LOAD_TIMESTAMP DESC, s.METADATA$ROW_ID DESC
+    ) = 1;
+    
+    v_loaded := SQLROWCOUNT;
+    
+    INSERT INTO LINKMAP.LOAD_BATCHES (LOAD_BATCH_ID, HUB_TABLE, ROW_COUNT)
+    VALUES (:v_batch_id, 'HUB_REPO_COMMITS', :v_loaded);
     
-    RETURN 'SUCCESS: Loaded ' || SQLROWCOUNT || ' records to LINKMAP.HUB_REPO_COMMITS';
+    -- Point each repo in this batch at it so ENRICH reads only the latest batch
+    MERGE INTO LINKMAP.HUB_REPO_COMMITS_LATEST_BATCH tgt
+    USING (
+        SELECT DISTINCT DATA_SOURCE, REPO
+        FROM LINKMAP.HUB_REPO_COMMITS
+        WHERE LOAD_BATCH_ID = :v_batch_id
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.REPO = src.REPO
+    WHEN MATCHED THEN UPDATE SET LOAD_BATCH_ID = :v_batch_id
+    WHEN NOT MATCHED THEN INSERT (DATA_SOURCE, REPO, LOAD_BATCH_ID)
+        VALUES (src.DATA_SOURCE, src.REPO, :v_batch_id);
+    
+    INSERT INTO ORCHESTRATION.CHANGED_REPOS (DATA_SOURCE, FULL_NAME, CHANGED_LAYER)
+    SELECT DATA_SOURCE, REPO, 'LINKMAP'
+    FROM LINKMAP.HUB_REPO_COMMITS_LATEST_BATCH
+    WHERE LOAD_BATCH_ID = :v_batch_id;
+    
+    COMMIT;
+    
+    RETURN 'SUCCESS: Loaded ' || v_loaded || ' records to LINKMAP.HUB_REPO_COMMITS';
+EXCEPTION
+    WHEN OTHER THEN
+        ROLLBACK;
+        SYSTEM$LOG('error', 'SP_LOAD_HUB_REPO_COMMITS failed: ' || SQLERRM);
+        RAISE;
 END;
 $$;
 """
@@ -228,10 +435,28 @@ RETURNS VARCHAR
 LANGUAGE SQL
 AS
 $$
+DECLARE
+    v_stream_has_data BOOLEAN;
+    v_batch_id INTEGER;
+    v_loaded INTEGER;
 BEGIN
     
+    -- An empty stream takes no batch id: an empty LOAD_BATCHES row would count towards
+    -- SP_PURGE_HUB_BATCHES' retention window
+    SELECT SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_ISSUES') INTO v_stream_has_data;
+    IF (v_stream_has_data = FALSE) THEN
+        RETURN 'SUCCESS: No new records for LINKMAP.HUB_REPO_ISSUES';
+    END IF;
+    
+    SELECT LINKMAP.SEQ_LOAD_BATCH.NEXTVAL INTO :v_batch_id;
+    
+    -- The stream offset advances only when this transaction commits, so the batch, its
+    -- latest-batch pointers and the ENRICH hand-off are written together or not at all
+    BEGIN TRANSACTION;
+    
+    -- Only rows inserted into RAW since the last run
     INSERT INTO LINKMAP.HUB_REPO_ISSUES (
-        DATA_SOURCE, REPO, OPEN_ISSUES, CLOSED_ISSUES, ISSUES_LAST_90D, LOAD_TIMESTAMP
+        DATA_SOURCE, REPO, OPEN_ISSUES, CLOSED_ISSUES, ISSUES_LAST_90D, LOAD_TIMESTAMP, LOAD_BATCH_ID
     )
     SELECT 
         DATA_SOURCE,
@@ -243,11 +468,47 @@ BEGIN
             WHEN ISSUES_LAST_90D > (OPEN_ISSUES + CLOSED_ISSUES) THEN (OPEN_ISSUES + CLOSED_ISSUES)
             ELSE ISSUES_LAST_90D 
         END AS ISSUES_LAST_90D,
-        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP
-    FROM RAW.SRC_GIT_REPO_ISSUES
-    WHERE DATA_SOURCE = 'git_hub';
+        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP,
+        :v_batch_id AS LOAD_BATCH_ID
+    FROM RAW.STREAM_SRC_GIT_REPO_ISSUES s
+    WHERE DATA_SOURCE = 'git_hub'
+      AND METADATA$ACTION = 'INSERT'
+    -- One row per repo and batch: of several snapshots in one delta keep the latest RAW
+    -- load, with the row id as a deterministic tiebreak within one load
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY TRIM(s.REPO) ORDER BY s.LOAD_TIMESTAMP DESC, s.METADATA$ROW_ID DESC
+    ) = 1;
+    
+    v_loaded := SQLROWCOUNT;
+    
+    INSERT INTO LINKMAP.LOAD_BATCHES (LOAD_BATCH_ID, HUB_TABLE, ROW_COUNT)
+    VALUES (:v_batch_id, 'HUB_REPO_ISSUES', :v_loaded);
+    
+    -- Point each repo in this batch at it so ENRICH reads only the latest batch
+    MERGE INTO LINKMAP.HUB_REPO_ISSUES_LATEST_BATCH tgt
+    USING (
+        SELECT DISTINCT DATA_SOURCE, REPO
+        FROM LINKMAP.HUB_REPO_ISSUES
+        WHERE LOAD_BATCH_ID = :v_batch_id
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.REPO = src.REPO
+    WHEN MATCHED THEN UPDATE SET LOAD_BATCH_ID = :v_batch_id
+    WHEN NOT MATCHED THEN INSERT (DATA_SOURCE, REPO, LOAD_BATCH_ID)
+        VALUES (src.DATA_SOURCE, src.REPO, :v_batch_id);
+    
+    INSERT INTO ORCHESTRATION.CHANGED_REPOS (DATA_SOURCE, FULL_NAME, CHANGED_LAYER)
+    SELECT DATA_SOURCE, REPO, 'LINKMAP'
+    FROM LINKMAP.HUB_REPO_ISSUES_LATEST_BATCH
+    WHERE LOAD_BATCH_ID = :v_batch_id;
     
-    RETURN 'SUCCESS: Loaded ' || SQLROWCOUNT || ' records to LINKMAP.HUB_REPO_ISSUES';
+    COMMIT;
+    
+    RETURN 'SUCCESS: Loaded ' || v_loaded || ' records to LINKMAP.HUB_REPO_ISSUES';
+EXCEPTION
+    WHEN OTHER THEN
+        ROLLBACK;
+        SYSTEM$LOG('error', 'SP_LOAD_HUB_REPO_ISSUES failed: ' || SQLERRM);
+        RAISE;
 END;
 $$;
 """
@@ -260,10 +521,28 @@ RETURNS VARCHAR
 LANGUAGE SQL
 AS
 $$
+DECLARE
+    v_stream_has_data BOOLEAN;
+    v_batch_id INTEGER;
+    v_loaded INTEGER;
 BEGIN
     
+    -- An empty stream takes no batch id: an empty LOAD_BATCHES row would count towards
+    -- SP_PURGE_HUB_BATCHES' retention window
+    SELECT SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_RELEASES') INTO v_stream_has_data;
+    IF (v_stream_has_data = FALSE) THEN
+        RETURN 'SUCCESS: No new records for LINKMAP.HUB_REPO_RELEASES';
+    END IF;
+    
+    SELECT LINKMAP.SEQ_LOAD_BATCH.NEXTVAL INTO :v_batch_id;
+    
+    -- The stream offset advances only when this transaction commits, so the batch, its
+    -- latest-batch pointers and the ENRICH hand-off are written together or not at all
+    BEGIN TRANSACTION;
+    
+    -- Only rows inserted into RAW since the last run
     INSERT INTO LINKMAP.HUB_REPO_RELEASES (
-        DATA_SOURCE, REPO, RELEASE_COUNT, LAST_RELEASE_DATE, DAYS_SINCE_LAST_RELEASE, LOAD_TIMESTAMP
+        DATA_SOURCE, REPO, RELEASE_COUNT, LAST_RELEASE_DATE, DAYS_SINCE_LAST_RELEASE, LOAD_TIMESTAMP, LOAD_BATCH_ID
     )
     SELECT 
         DATA_SOURCE,
@@ -275,11 +554,129 @@ BEGIN
             ELSE LAST_RELEASE_DATE
         END AS LAST_RELEASE_DATE,
         CASE WHEN DAYS_SINCE_LAST_RELEASE < 0 THEN 999 ELSE DAYS_SINCE_LAST_RELEASE END AS DAYS_SINCE_LAST_RELEASE,
-        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP
-    FROM RAW.SRC_GIT_REPO_RELEASES
-    WHERE DATA_SOURCE = 'git_hub';
+        CURRENT_TIMESTAMP() AS LOAD_TIMESTAMP,
+        :v_batch_id AS LOAD_BATCH_ID
+    FROM RAW.STREAM_SRC_GIT_REPO_RELEASES s
+    WHERE DATA_SOURCE = 'git_hub'
+      AND METADATA$ACTION = 'INSERT'
+    -- One row per repo and batch: of several snapshots in one delta keep the latest RAW
+    -- load, with the row id as a deterministic tiebreak within one load
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY TRIM(s.REPO) ORDER BY s.LOAD_TIMESTAMP DESC, s.METADATA$ROW_ID DESC
+    ) = 1;
+    
+    v_loaded := SQLROWCOUNT;
     
-    RETURN 'SUCCESS: Loaded ' || SQLROWCOUNT || ' records to LINKMAP.HUB_REPO_RELEASES';
+    INSERT INTO LINKMAP.LOAD_BATCHES (LOAD_BATCH_ID, HUB_TABLE, ROW_COUNT)
+    VALUES (:v_batch_id, 'HUB_REPO_RELEASES', :v_loaded);
+    
+    -- Point each repo in this batch at it so ENRICH reads only the latest batch
+    MERGE INTO LINKMAP.HUB_REPO_RELEASES_LATEST_BATCH tgt
+    USING (
+        SELECT DISTINCT DATA_SOURCE, REPO
+        FROM LINKMAP.HUB_REPO_RELEASES
+        WHERE LOAD_BATCH_ID = :v_batch_id
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.REPO = src.REPO
+    WHEN MATCHED THEN UPDATE SET LOAD_BATCH_ID = :v_batch_id
+    WHEN NOT MATCHED THEN INSERT (DATA_SOURCE, REPO, LOAD_BATCH_ID)
+        VALUES (src.DATA_SOURCE, src.REPO, :v_batch_id);
+    
+    INSERT INTO ORCHESTRATION.CHANGED_REPOS (DATA_SOURCE, FULL_NAME, CHANGED_LAYER)
+    SELECT DATA_SOURCE, REPO, 'LINKMAP'
+    FROM LINKMAP.HUB_REPO_RELEASES_LATEST_BATCH
+    WHERE LOAD_BATCH_ID = :v_batch_id;
+    
+    COMMIT;
+    
+    RETURN 'SUCCESS: Loaded ' || v_loaded || ' records to LINKMAP.HUB_REPO_RELEASES';
+EXCEPTION
+    WHEN OTHER THEN
+        ROLLBACK;
+        SYSTEM$LOG('error', 'SP_LOAD_HUB_REPO_RELEASES failed: ' || SQLERRM);
+        RAISE;
+END;
+$$;
+"""
+    },
+    {
+        "name": "LINKMAP.SP_PURGE_HUB_BATCHES",
+        "code": """
+CREATE OR REPLACE PROCEDURE LINKMAP.SP_PURGE_HUB_BATCHES(P_RETAIN_BATCHES INTEGER)
+RETURNS VARCHAR
+LANGUAGE SQL
+AS
+$$
+DECLARE
+    v_purged INTEGER DEFAULT 0;
+BEGIN
+    
+    -- Oldest batch still inside the retention window, per hub table
+    CREATE OR REPLACE TEMPORARY TABLE TEMP_BATCH_CUTOFF AS
+    SELECT HUB_TABLE, MIN(LOAD_BATCH_ID) AS CUTOFF_BATCH_ID
+    FROM (
+        SELECT HUB_TABLE, LOAD_BATCH_ID
+        FROM LINKMAP.LOAD_BATCHES
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY HUB_TABLE ORDER BY LOAD_BATCH_ID DESC) <= :P_RETAIN_BATCHES
+    )
+    GROUP BY HUB_TABLE;
+    
+    -- Compact: drop rows superseded by a newer batch of the same repo once they leave the window.
+    -- A repo's latest batch is always kept, however old it is.
+    DELETE FROM LINKMAP.HUB_REPO_CONTRIBUTORS t
+    USING LINKMAP.HUB_REPO_CONTRIBUTORS_LATEST_BATCH lb, TEMP_BATCH_CUTOFF bc
+    WHERE bc.HUB_TABLE = 'HUB_REPO_CONTRIBUTORS'
+      AND t.DATA_SOURCE = lb.DATA_SOURCE AND t.REPO_FULL_NAME = lb.REPO
+      AND t.LOAD_BATCH_ID < lb.LOAD_BATCH_ID
+      AND t.LOAD_BATCH_ID < bc.CUTOFF_BATCH_ID;
+    
+    v_purged := v_purged + SQLROWCOUNT;
+    
+    DELETE FROM LINKMAP.HUB_REPO_COMMITS t
+    USING LINKMAP.HUB_REPO_COMMITS_LATEST_BATCH lb, TEMP_BATCH_CUTOFF bc
+    WHERE bc.HUB_TABLE = 'HUB_REPO_COMMITS'
+      AND t.DATA_SOURCE = lb.DATA_SOURCE AND t.REPO = lb.REPO
+      AND t.LOAD_BATCH_ID < lb.LOAD_BATCH_ID
+      AND t.LOAD_BATCH_ID < bc.CUTOFF_BATCH_ID;
+    
+    v_purged := v_purged + SQLROWCOUNT;
+    
+    DELETE FROM LINKMAP.HUB_REPO_ISSUES t
+    USING LINKMAP.HUB_REPO_ISSUES_LATEST_BATCH lb, TEMP_BATCH_CUTOFF bc
+    WHERE bc.HUB_TABLE = 'HUB_REPO_ISSUES'
+      AND t.DATA_SOURCE = lb.DATA_SOURCE AND t.REPO = lb.REPO
+      AND t.LOAD_BATCH_ID < lb.LOAD_BATCH_ID
+      AND t.LOAD_BATCH_ID < bc.CUTOFF_BATCH_ID;
+    
+    v_purged := v_purged + SQLROWCOUNT;
+    
+    DELETE FROM LINKMAP.HUB_REPO_RELEASES t
+    USING LINKMAP.HUB_REPO_RELEASES_LATEST_BATCH lb, TEMP_BATCH_CUTOFF bc
+    WHERE bc.HUB_TABLE = 'HUB_REPO_RELEASES'
+      AND t.DATA_SOURCE = lb.DATA_SOURCE AND t.REPO = lb.REPO
+      AND t.LOAD_BATCH_ID < lb.LOAD_BATCH_ID
+      AND t.LOAD_BATCH_ID < bc.CUTOFF_BATCH_ID;
+    
+    v_purged := v_purged + SQLROWCOUNT;
+    
+    DELETE FROM LINKMAP.LOAD_BATCHES b
+    USING TEMP_BATCH_CUTOFF bc
+    WHERE b.HUB_TABLE = bc.HUB_TABLE
+      AND b.LOAD_BATCH_ID < bc.CUTOFF_BATCH_ID
+      AND b.LOAD_BATCH_ID NOT IN (
+          SELECT LOAD_BATCH_ID FROM LINKMAP.HUB_REPO_CONTRIBUTORS_LATEST_BATCH
+          UNION ALL SELECT LOAD_BATCH_ID FROM LINKMAP.HUB_REPO_COMMITS_LATEST_BATCH
+          UNION ALL SELECT LOAD_BATCH_ID FROM LINKMAP.HUB_REPO_ISSUES_LATEST_BATCH
+          UNION ALL SELECT LOAD_BATCH_ID FROM LINKMAP.HUB_REPO_RELEASES_LATEST_BATCH
+      );
+    
+    DROP TABLE TEMP_BATCH_CUTOFF;
+    
+    RETURN 'SUCCESS: Purged ' || v_purged || ' superseded LINKMAP records';
+EXCEPTION
+    WHEN OTHER THEN
+        SYSTEM$LOG('error', 'SP_PURGE_HUB_BATCHES failed: ' || SQLERRM);
+        RAISE;
 END;
 $$;
 """
@@ -294,62 +691,138 @@ AS
 $$
 DECLARE
     v_total_enriched INTEGER;
+    v_removed_records INTEGER;
     v_result VARCHAR;
 BEGIN
     
-    INSERT INTO ENRICH.REPO_ENTRYLINE (
+    -- Repositories touched in STAGE or LINKMAP since the last enrichment; the queue rows are
+    -- removed only once they are enriched and handed on, up to the latest change seen here
+    CREATE OR REPLACE TEMPORARY TABLE TEMP_ENRICH_KEYS AS
+    SELECT FULL_NAME, MAX(CHANGED_AT) AS CHANGED_AT
+    FROM ORCHESTRATION.CHANGED_REPOS
+    WHERE DATA_SOURCE = 'git_hub'
+      AND CHANGED_LAYER IN ('STAGE', 'LINKMAP')
+    GROUP BY FULL_NAME;
+    
+    MERGE INTO ENRICH.REPO_ENTRYLINE tgt
+    USING (
+        WITH 
+        contributors_agg AS (
+            -- maintained by SP_LOAD_HUB_REPO_CONTRIBUTORS from each new batch
+            SELECT a.REPO_FULL_NAME, a.TOTAL_CONTRIBUTORS, a.ACTIVE_CONTRIBUTORS_90D
+            FROM LINKMAP.REPO_CONTRIBUTOR_AGG a
+            JOIN TEMP_ENRICH_KEYS k ON a.REPO_FULL_NAME = k.FULL_NAME
+            WHERE a.DATA_SOURCE = 'git_hub'
+        ),
+        -- the hub loads keep one row per repo and batch; only batches loaded before they did can
+        -- hold several, and the QUALIFYs pick one of those deterministically so the MERGE source
+        -- stays unique
+        commits_data AS (
+            SELECT c.REPO, c.COMMITS_30D, c.COMMITS_90D, c.COMMITS_180D, c.LAST_COMMIT_DATE
+            FROM LINKMAP.HUB_REPO_COMMITS c
+            JOIN LINKMAP.HUB_REPO_COMMITS_LATEST_BATCH lb
+              ON lb.DATA_SOURCE = c.DATA_SOURCE
+             AND c.REPO = lb.REPO AND c.LOAD_BATCH_ID = lb.LOAD_BATCH_ID
+            JOIN TEMP_ENRICH_KEYS k ON lb.REPO = k.FULL_NAME
+            WHERE c.DATA_SOURCE = 'git_hub'
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY c.REPO ORDER BY HASH(c.*) DESC) = 1
+        ),
+        issues_data AS (
+            SELECT i.REPO, i.OPEN_ISSUES, i.CLOSED_ISSUES, i.ISSUES_LAST_90D
+            FROM LINKMAP.HUB_REPO_ISSUES i
+            JOIN LINKMAP.HUB_REPO_ISSUES_LATEST_BATCH lb
+              ON lb.DATA_SOURCE = i.DATA_SOURCE
+             AND i.REPO = lb.REPO AND i.LOAD_BATCH_ID = lb.LOAD_BATCH_ID
+            JOIN TEMP_ENRICH_KEYS k ON lb.REPO = k.FULL_NAME
+            WHERE i.DATA_SOURCE = 'git_hub'
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY i.REPO ORDER BY HASH(i.*) DESC) = 1
+        ),
+        releases_data AS (
+            SELECT r.REPO, r.RELEASE_COUNT, r.LAST_RELEASE_DATE, r.DAYS_SINCE_LAST_RELEASE
+            FROM LINKMAP.HUB_REPO_RELEASES r
+            JOIN LINKMAP.HUB_REPO_RELEASES_LATEST_BATCH lb
+              ON lb.DATA_SOURCE = r.DATA_SOURCE
+             AND r.REPO = lb.REPO AND r.LOAD_BATCH_ID = lb.LOAD_BATCH_ID
+            JOIN TEMP_ENRICH_KEYS k ON lb.REPO = k.FULL_NAME
+            WHERE r.DATA_SOURCE = 'git_hub'
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY r.REPO ORDER BY HASH(r.*) DESC) = 1
+        )
+        SELECT 
+            sr.DATA_SOURCE, sr.ID, sr.NAME, sr.FULL_NAME, sr.OWNER, sr.LANGUAGE, sr.STARS, sr.FORKS, sr.HTML_URL,
+            sr.CREATED_AT, sr.UPDATED_AT, sr.VALID_FLAG,
+            COALESCE(cd.COMMITS_30D, 0) AS COMMITS_30D,
+            COALESCE(cd.COMMITS_90D, 0) AS COMMITS_90D,
+            COALESCE(cd.COMMITS_180D, 0) AS COMMITS_180D,
+            cd.LAST_COMMIT_DATE,
+            COALESCE(ca.total_contributors, 0) AS TOTAL_CONTRIBUTORS,
+            COALESCE(ca.active_contributors_90d, 0) AS ACTIVE_CONTRIBUTORS_90D,
+            COALESCE(id.OPEN_ISSUES, 0) AS OPEN_ISSUES,
+            COALESCE(id.CLOSED_ISSUES, 0) AS CLOSED_ISSUES,
+            COALESCE(id.ISSUES_LAST_90D, 0) AS ISSUES_LAST_90D,
+            COALESCE(rd.RELEASE_COUNT, 0) AS RELEASE_COUNT,
+            rd.LAST_RELEASE_DATE,
+            COALESCE(rd.DAYS_SINCE_LAST_RELEASE, 999) AS DAYS_SINCE_LAST_RELEASE,
+            -- Fingerprint of the columns CURATE copies and scores; unchanged inputs skip rescoring
+            HASH(
+                sr.LANGUAGE, sr.STARS, COALESCE(cd.COMMITS_90D, 0), COALESCE(ca.active_contributors_90d, 0),
+                COALESCE(rd.DAYS_SINCE_LAST_RELEASE, 999), COALESCE(id.OPEN_ISSUES, 0)
+            ) AS SCORING_FINGERPRINT
+        FROM STAGE.STG_REPOSITORIES sr
+        JOIN TEMP_ENRICH_KEYS k ON sr.FULL_NAME = k.FULL_NAME
+        LEFT JOIN contributors_agg ca ON sr.FULL_NAME = ca.REPO_FULL_NAME
+        LEFT JOIN commits_data cd ON sr.FULL_NAME = cd.REPO
+        LEFT JOIN issues_data id ON sr.FULL_NAME = id.REPO
+        LEFT JOIN releases_data rd ON sr.FULL_NAME = rd.REPO
+        WHERE sr.DATA_SOURCE = 'git_hub'
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.FULL_NAME = src.FULL_NAME
+    -- a repo whose latest STAGE row failed validation leaves ENRICH; its ENRICH queue
+    -- entry below tells CURATE to drop it too
+    WHEN MATCHED AND NOT src.VALID_FLAG THEN DELETE
+    WHEN MATCHED THEN UPDATE SET
+        ID = src.ID, NAME = src.NAME, OWNER = src.OWNER, LANGUAGE = src.LANGUAGE,
+        STARS = src.STARS, FORKS = src.FORKS, HTML_URL = src.HTML_URL,
+        CREATED_AT = src.CREATED_AT, UPDATED_AT = src.UPDATED_AT,
+        COMMITS_30D = src.COMMITS_30D, COMMITS_90D = src.COMMITS_90D, COMMITS_180D = src.COMMITS_180D,
+        LAST_COMMIT_DATE = src.LAST_COMMIT_DATE,
+        TOTAL_CONTRIBUTORS = src.TOTAL_CONTRIBUTORS, ACTIVE_CONTRIBUTORS_90D = src.ACTIVE_CONTRIBUTORS_90D,
+        OPEN_ISSUES = src.OPEN_ISSUES, CLOSED_ISSUES = src.CLOSED_ISSUES, ISSUES_LAST_90D = src.ISSUES_LAST_90D,
+        RELEASE_COUNT = src.RELEASE_COUNT, LAST_RELEASE_DATE = src.LAST_RELEASE_DATE,
+        DAYS_SINCE_LAST_RELEASE = src.DAYS_SINCE_LAST_RELEASE,
+        SCORING_FINGERPRINT = src.SCORING_FINGERPRINT,
+        ENRICHED_AT = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED AND src.VALID_FLAG THEN INSERT (
         DATA_SOURCE, ID, NAME, FULL_NAME, OWNER, LANGUAGE, STARS, FORKS, HTML_URL,
         CREATED_AT, UPDATED_AT, COMMITS_30D, COMMITS_90D, COMMITS_180D, LAST_COMMIT_DATE,
         TOTAL_CONTRIBUTORS, ACTIVE_CONTRIBUTORS_90D, OPEN_ISSUES, CLOSED_ISSUES, ISSUES_LAST_90D,
-        RELEASE_COUNT, LAST_RELEASE_DATE, DAYS_SINCE_LAST_RELEASE, ENRICHED_AT
-    )
-    WITH 
-    contributors_agg AS (
-        SELECT 
-            REPO_FULL_NAME,
-            COUNT(DISTINCT CONTRIBUTOR) as total_contributors,
-            COUNT(DISTINCT CASE WHEN RECENT_90_DAYS_COMMITS > 0 THEN CONTRIBUTOR END) as active_contributors_90d
-        FROM LINKMAP.HUB_REPO_CONTRIBUTORS
-        WHERE DATA_SOURCE = 'git_hub'
-        GROUP BY REPO_FULL_NAME
-    ),
-    commits_data AS (
-        SELECT REPO, COMMITS_30D, COMMITS_90D, COMMITS_180D, LAST_COMMIT_DATE
-        FROM LINKMAP.HUB_REPO_COMMITS WHERE DATA_SOURCE = 'git_hub'
-    ),
-    issues_data AS (
-        SELECT REPO, OPEN_ISSUES, CLOSED_ISSUES, ISSUES_LAST_90D
-        FROM LINKMAP.HUB_REPO_ISSUES WHERE DATA_SOURCE = 'git_hub'
-    ),
-    releases_data AS (
-        SELECT REPO, RELEASE_COUNT, LAST_RELEASE_DATE, DAYS_SINCE_LAST_RELEASE
-        FROM LINKMAP.HUB_REPO_RELEASES WHERE DATA_SOURCE = 'git_hub'
-    )
-    SELECT 
-        sr.DATA_SOURCE, sr.ID, sr.NAME, sr.FULL_NAME, sr.OWNER, sr.LANGUAGE, sr.STARS, sr.FORKS, sr.HTML_URL,
-        sr.CREATED_AT, sr.UPDATED_AT,
-        COALESCE(cd.COMMITS_30D, 0) AS COMMITS_30D,
-        COALESCE(cd.COMMITS_90D, 0) AS COMMITS_90D,
-        COALESCE(cd.COMMITS_180D, 0) AS COMMITS_180D,
-        cd.LAST_COMMIT_DATE,
-        COALESCE(ca.total_contributors, 0) AS TOTAL_CONTRIBUTORS,
-        COALESCE(ca.active_contributors_90d, 0) AS ACTIVE_CONTRIBUTORS_90D,
-        COALESCE(id.OPEN_ISSUES, 0) AS OPEN_ISSUES,
-        COALESCE(id.CLOSED_ISSUES, 0) AS CLOSED_ISSUES,
-        COALESCE(id.ISSUES_LAST_90D, 0) AS ISSUES_LAST_90D,
-        COALESCE(rd.RELEASE_COUNT, 0) AS RELEASE_COUNT,
-        rd.LAST_RELEASE_DATE,
-        COALESCE(rd.DAYS_SINCE_LAST_RELEASE, 999) AS DAYS_SINCE_LAST_RELEASE,
-        CURRENT_TIMESTAMP() AS ENRICHED_AT
-    FROM STAGE.STG_REPOSITORIES sr
-    LEFT JOIN contributors_agg ca ON sr.FULL_NAME = ca.REPO_FULL_NAME
-    LEFT JOIN commits_data cd ON sr.FULL_NAME = cd.REPO
-    LEFT JOIN issues_data id ON sr.FULL_NAME = id.REPO
-    LEFT JOIN releases_data rd ON sr.FULL_NAME = rd.REPO
-    WHERE sr.DATA_SOURCE = 'git_hub' AND sr.VALID_FLAG = TRUE;
-    
-    v_total_enriched := SQLROWCOUNT;
-    v_result := 'SUCCESS: Enriched ' || v_total_enriched || ' records into ENRICH.REPO_ENTRYLINE';
+        RELEASE_COUNT, LAST_RELEASE_DATE, DAYS_SINCE_LAST_RELEASE, SCORING_FINGERPRINT, ENRICHED_AT
+    ) VALUES (
+        src.DATA_SOURCE, src.ID, src.NAME, src.FULL_NAME, src.OWNER, src.LANGUAGE, src.STARS, src.FORKS, src.HTML_URL,
+        src.CREATED_AT, src.UPDATED_AT, src.COMMITS_30D, src.COMMITS_90D, src.COMMITS_180D, src.LAST_COMMIT_DATE,
+        src.TOTAL_CONTRIBUTORS, src.ACTIVE_CONTRIBUTORS_90D, src.OPEN_ISSUES, src.CLOSED_ISSUES, src.ISSUES_LAST_90D,
+        src.RELEASE_COUNT, src.LAST_RELEASE_DATE, src.DAYS_SINCE_LAST_RELEASE, src.SCORING_FINGERPRINT, CURRENT_TIMESTAMP()
+    );
+    
+    SELECT "number of rows inserted" + "number of rows updated", "number of rows deleted"
+    INTO :v_total_enriched, :v_removed_records
+    FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()));
+    
+    -- Hand the enriched repositories on to CURATE
+    INSERT INTO ORCHESTRATION.CHANGED_REPOS (DATA_SOURCE, FULL_NAME, CHANGED_LAYER)
+    SELECT 'git_hub', FULL_NAME, 'ENRICH'
+    FROM TEMP_ENRICH_KEYS;
+    
+    DELETE FROM ORCHESTRATION.CHANGED_REPOS cr
+    USING TEMP_ENRICH_KEYS k
+    WHERE cr.DATA_SOURCE = 'git_hub'
+      AND cr.CHANGED_LAYER IN ('STAGE', 'LINKMAP')
+      AND cr.FULL_NAME = k.FULL_NAME
+      AND cr.CHANGED_AT <= k.CHANGED_AT;
+    
+    DROP TABLE TEMP_ENRICH_KEYS;
+    
+    v_result := 'SUCCESS: Enriched ' || v_total_enriched || ' records into ENRICH.REPO_ENTRYLINE, removed ' ||
+                v_removed_records || ' invalid';
     RETURN v_result;
 EXCEPTION
     WHEN OTHER THEN
@@ -369,102 +842,175 @@ AS
 $$
 DECLARE
     v_total_records INTEGER;
+    v_candidate_records INTEGER;
+    v_skipped_records INTEGER;
+    v_history_records INTEGER;
+    v_removed_records INTEGER;
+    v_run_ts TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP();
     v_high_risk_count INTEGER;
     v_medium_risk_count INTEGER;
     v_low_risk_count INTEGER;
     v_result VARCHAR;
 BEGIN
     
-    INSERT INTO CURATE.RISK_ANALYSIS_DATA_PRODUCT (
-        DATA_SOURCE, FULL_NAME, LANGUAGE, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
-        DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES, RISK_SCORE, RISK_CATEGORY, LAST_UPDATED
-    )
-    WITH risk_calc AS (
-        SELECT 
-            DATA_SOURCE, FULL_NAME, LANGUAGE, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
-            DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES,
-            CASE 
-                WHEN STARS >= 10000 THEN 0.0
-                WHEN STARS >= 1000 THEN 0.2
-                WHEN STARS >= 100 THEN 0.4
-                WHEN STARS >= 10 THEN 0.6
-                WHEN STARS >= 1 THEN 0.8
-                ELSE 1.0
-            END AS stars_risk_factor,
-            CASE 
-                WHEN COMMITS_90D >= 100 THEN 0.0
-                WHEN COMMITS_90D >= 50 THEN 0.2
-                WHEN COMMITS_90D >= 20 THEN 0.4
-                WHEN COMMITS_90D >= 5 THEN 0.6
-                WHEN COMMITS_90D >= 1 THEN 0.8
-                ELSE 1.0
-            END AS commits_risk_factor,
-            CASE 
-                WHEN ACTIVE_CONTRIBUTORS_90D >= 10 THEN 0.0
-                WHEN ACTIVE_CONTRIBUTORS_90D >= 5 THEN 0.2
-                WHEN ACTIVE_CONTRIBUTORS_90D >= 3 THEN 0.4
-                WHEN ACTIVE_CONTRIBUTORS_90D >= 1 THEN 0.6
-                ELSE 1.0
-            END AS contributors_risk_factor,
-            CASE 
-                WHEN DAYS_SINCE_LAST_RELEASE <= 30 THEN 0.0
-                WHEN DAYS_SINCE_LAST_RELEASE <= 90 THEN 0.3
-                WHEN DAYS_SINCE_LAST_RELEASE <= 180 THEN 0.6
-                WHEN DAYS_SINCE_LAST_RELEASE <= 365 THEN 0.8
-                ELSE 1.0
-            END AS release_risk_factor,
-            CASE 
-                WHEN OPEN_ISSUES = 0 THEN 0.0
-                WHEN OPEN_ISSUES <= 5 THEN 0.2
-                WHEN OPEN_ISSUES <= 10 THEN 0.4
-                WHEN OPEN_ISSUES <= 20 THEN 0.6
-                WHEN OPEN_ISSUES <= 50 THEN 0.8
-                ELSE 1.0
-            END AS issues_risk_factor
-        FROM ENRICH.REPO_ENTRYLINE
-        WHERE DATA_SOURCE = 'git_hub'
-    ),
-    weighted_risk AS (
+    -- Repositories re-enriched since the last curation
+    CREATE OR REPLACE TEMPORARY TABLE TEMP_CURATE_KEYS AS
+    SELECT FULL_NAME, MAX(CHANGED_AT) AS CHANGED_AT
+    FROM ORCHESTRATION.CHANGED_REPOS
+    WHERE DATA_SOURCE = 'git_hub'
+      AND CHANGED_LAYER = 'ENRICH'
+    GROUP BY FULL_NAME;
+    
+    SELECT COUNT(*) INTO v_candidate_records
+    FROM ENRICH.REPO_ENTRYLINE e
+    JOIN TEMP_CURATE_KEYS k ON e.FULL_NAME = k.FULL_NAME
+    WHERE e.DATA_SOURCE = 'git_hub';
+    
+    -- Queued repositories that ENRICH dropped because their latest STAGE row failed validation
+    CREATE OR REPLACE TEMPORARY TABLE TEMP_CURATE_REMOVED AS
+    SELECT k.FULL_NAME
+    FROM TEMP_CURATE_KEYS k
+    LEFT JOIN ENRICH.REPO_ENTRYLINE e
+      ON e.DATA_SOURCE = 'git_hub' AND e.FULL_NAME = k.FULL_NAME
+    WHERE e.FULL_NAME IS NULL;
+    
+    -- The MERGE, the history rows it implies and the queue delete commit together: a
+    -- retry after a failure here must see the old fingerprints, or the MERGE would skip
+    -- the repos and their score change would never reach the history
+    BEGIN TRANSACTION;
+    
+    MERGE INTO CURATE.RISK_ANALYSIS_DATA_PRODUCT tgt
+    USING (
+        WITH changed AS (
+            -- Skip repositories whose scoring inputs and model version are unchanged; the factor
+            -- CASEs below use unqualified metric names, so they must not see CURATE's columns
+            SELECT 
+                e.DATA_SOURCE, e.FULL_NAME, e.LANGUAGE, e.STARS, e.COMMITS_90D, e.ACTIVE_CONTRIBUTORS_90D,
+                e.DAYS_SINCE_LAST_RELEASE, e.OPEN_ISSUES,
+                HASH(e.SCORING_FINGERPRINT, '""" + RISK_MODEL['version'] + """') as SCORING_FINGERPRINT
+            FROM ENRICH.REPO_ENTRYLINE e
+            JOIN TEMP_CURATE_KEYS k ON e.FULL_NAME = k.FULL_NAME
+            LEFT JOIN CURATE.RISK_ANALYSIS_DATA_PRODUCT c
+              ON c.DATA_SOURCE = e.DATA_SOURCE AND c.FULL_NAME = e.FULL_NAME
+            WHERE e.DATA_SOURCE = 'git_hub'
+              AND c.SCORING_FINGERPRINT IS DISTINCT FROM HASH(e.SCORING_FINGERPRINT, '""" + RISK_MODEL['version'] + """')
+        ),
+        risk_calc AS (
+            SELECT 
+                DATA_SOURCE, FULL_NAME, LANGUAGE, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
+                DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES, SCORING_FINGERPRINT,
+""" + risk_scoring.snowflake_factor_sql(RISK_MODEL) + """
+            FROM changed
+        ),
+        weighted_risk AS (
+            SELECT 
+                DATA_SOURCE, FULL_NAME, LANGUAGE, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
+                DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES, SCORING_FINGERPRINT,
+                """ + risk_scoring.snowflake_score_sql(RISK_MODEL) + """ as risk_score_raw
+            FROM risk_calc
+        )
         SELECT 
             DATA_SOURCE, FULL_NAME, LANGUAGE, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
-            DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES,
-            ROUND(
-                (stars_risk_factor * 0.15) + (commits_risk_factor * 0.25) + 
-                (contributors_risk_factor * 0.20) + (release_risk_factor * 0.25) + 
-                (issues_risk_factor * 0.15), 2
-            ) * 100 as risk_score_raw
-        FROM risk_calc
-    )
-    SELECT 
+            DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES, SCORING_FINGERPRINT,
+            risk_score_raw as RISK_SCORE,
+            """ + risk_scoring.category_sql(RISK_MODEL) + """ as RISK_CATEGORY
+        FROM weighted_risk
+    ) src
+    ON tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.FULL_NAME = src.FULL_NAME
+    WHEN MATCHED THEN UPDATE SET
+        LANGUAGE = src.LANGUAGE, STARS = src.STARS, COMMITS_90D = src.COMMITS_90D,
+        ACTIVE_CONTRIBUTORS_90D = src.ACTIVE_CONTRIBUTORS_90D,
+        DAYS_SINCE_LAST_RELEASE = src.DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES = src.OPEN_ISSUES,
+        RISK_SCORE = src.RISK_SCORE, RISK_CATEGORY = src.RISK_CATEGORY,
+        SCORING_FINGERPRINT = src.SCORING_FINGERPRINT,
+        LAST_UPDATED = :v_run_ts
+    WHEN NOT MATCHED THEN INSERT (
         DATA_SOURCE, FULL_NAME, LANGUAGE, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
-        DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES,
-        risk_score_raw as RISK_SCORE,
-        CASE 
-            WHEN risk_score_raw >= 70 THEN 'HIGH'
-            WHEN risk_score_raw >= 40 THEN 'MEDIUM'
-            ELSE 'LOW'
-        END as RISK_CATEGORY,
-        CURRENT_TIMESTAMP() as LAST_UPDATED
-    FROM weighted_risk;
+        DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES, RISK_SCORE, RISK_CATEGORY, SCORING_FINGERPRINT, LAST_UPDATED
+    ) VALUES (
+        src.DATA_SOURCE, src.FULL_NAME, src.LANGUAGE, src.STARS, src.COMMITS_90D, src.ACTIVE_CONTRIBUTORS_90D,
+        src.DAYS_SINCE_LAST_RELEASE, src.OPEN_ISSUES, src.RISK_SCORE, src.RISK_CATEGORY, src.SCORING_FINGERPRINT,
+        :v_run_ts
+    );
     
     v_total_records := SQLROWCOUNT;
+    v_skipped_records := v_candidate_records - v_total_records;
+    
+    -- History: close the open interval of repos whose score or category moved...
+    UPDATE CURATE.RISK_SCORE_HISTORY h
+    SET VALID_TO = :v_run_ts
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT c
+    WHERE h.DATA_SOURCE = c.DATA_SOURCE AND h.FULL_NAME = c.FULL_NAME
+      AND h.VALID_TO IS NULL
+      AND c.LAST_UPDATED = :v_run_ts
+      AND (h.RISK_SCORE <> c.RISK_SCORE OR h.RISK_CATEGORY <> c.RISK_CATEGORY);
+    
+    -- ...and open a new one for them and for repos seen for the first time
+    INSERT INTO CURATE.RISK_SCORE_HISTORY (
+        DATA_SOURCE, FULL_NAME, RISK_SCORE, RISK_CATEGORY, MODEL_VERSION, VALID_FROM, VALID_TO
+    )
+    SELECT c.DATA_SOURCE, c.FULL_NAME, c.RISK_SCORE, c.RISK_CATEGORY, '""" + RISK_MODEL['version'] + """', :v_run_ts, NULL
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT c
+    WHERE c.LAST_UPDATED = :v_run_ts
+      AND NOT EXISTS (
+          SELECT 1 FROM CURATE.RISK_SCORE_HISTORY h
+          WHERE h.DATA_SOURCE = c.DATA_SOURCE AND h.FULL_NAME = c.FULL_NAME AND h.VALID_TO IS NULL
+      );
+    
+    v_history_records := SQLROWCOUNT;
+    
+    -- Removals: close the open interval of repos that left ENRICH, then drop their product row
+    UPDATE CURATE.RISK_SCORE_HISTORY h
+    SET VALID_TO = :v_run_ts
+    FROM TEMP_CURATE_REMOVED r
+    WHERE h.DATA_SOURCE = 'git_hub' AND h.FULL_NAME = r.FULL_NAME
+      AND h.VALID_TO IS NULL;
+    
+    DELETE FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT c
+    USING TEMP_CURATE_REMOVED r
+    WHERE c.DATA_SOURCE = 'git_hub' AND c.FULL_NAME = r.FULL_NAME;
+    
+    v_removed_records := SQLROWCOUNT;
+    
+    INSERT INTO ORCHESTRATION.PIPELINE_METRICS (STAGE, METRIC_NAME, METRIC_VALUE)
+    VALUES 
+        ('CURATE', 'RESCORED_RECORDS', :v_total_records),
+        ('CURATE', 'SKIPPED_RECORDS', :v_skipped_records),
+        ('CURATE', 'HISTORY_RECORDS', :v_history_records),
+        ('CURATE', 'REMOVED_RECORDS', :v_removed_records);
+    
+    DELETE FROM ORCHESTRATION.CHANGED_REPOS cr
+    USING TEMP_CURATE_KEYS k
+    WHERE cr.DATA_SOURCE = 'git_hub'
+      AND cr.CHANGED_LAYER = 'ENRICH'
+      AND cr.FULL_NAME = k.FULL_NAME
+      AND cr.CHANGED_AT <= k.CHANGED_AT;
+    
+    COMMIT;
+    
+    DROP TABLE TEMP_CURATE_KEYS;
+    DROP TABLE TEMP_CURATE_REMOVED;
     
+    -- Categories of this run's rescored repositories (the table-wide counts are in LAYER_METRICS)
     SELECT 
-        COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END),
-        COUNT(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 END),
-        COUNT(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 END)
+        COUNT_IF(RISK_CATEGORY = 'HIGH'),
+        COUNT_IF(RISK_CATEGORY = 'MEDIUM'),
+        COUNT_IF(RISK_CATEGORY = 'LOW')
     INTO v_high_risk_count, v_medium_risk_count, v_low_risk_count
     FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
-    WHERE DATA_SOURCE = 'git_hub';
+    WHERE DATA_SOURCE = 'git_hub' AND LAST_UPDATED = :v_run_ts;
     
-    v_result := 'SUCCESS: Created ' || v_total_records || ' risk analysis records. ' ||
+    v_result := 'SUCCESS: Rescored ' || v_total_records || ' risk analysis records, ' ||
+                'skipped ' || v_skipped_records || ' unchanged, removed ' || v_removed_records || '. Rescored ' ||
                 'High Risk: ' || v_high_risk_count || ' | ' ||
                 'Medium Risk: ' || v_medium_risk_count || ' | ' ||
-                'Low Risk: ' || v_low_risk_count;
+                'Low Risk: ' || v_low_risk_count || ' | ' ||
+                'Model: """ + RISK_MODEL['version'] + """';
     
     RETURN v_result;
 EXCEPTION
     WHEN OTHER THEN
+        ROLLBACK;
         SYSTEM$LOG('error', 'SP_LOAD_RISK_ANALYSIS_DATA_PRODUCT failed: ' || SQLERRM);
         RAISE;
 END;
@@ -497,4 +1043,4 @@ def create_stored_procedures():
             conn.close()
 
 if __name__ == "__main__":
-    create_stored_procedures()
\ No newline at end of file
+    profiling.run_main(create_stored_procedures, 'create_stored_procedures')
\ No newline at end of file
@@ -8,17 +8,22 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import snowflake.connector
 
+import contributor_sketch
+import instrumentation
+import profiling
+import query_trace
+
 load_dotenv()
 
 def get_connection():
-    return snowflake.connector.connect(
+    return query_trace.traced(snowflake.connector.connect(
         user=os.getenv("SNOWFLAKE_USER"),
         password=os.getenv("SNOWFLAKE_PASSWORD"),
         role=os.getenv("SNOWFLAKE_ROLE"),
         account=os.getenv("SNOWFLAKE_ACCOUNT"),
         warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
         database=os.getenv("SNOWFLAKE_DATABASE")
-    )
+    ))
 
 def get_gh_archive_data():
     yesterday = datetime.now() - timedelta(days=1)
@@ -34,13 +39,19 @@ def get_gh_archive_data():
         url = f"https://data.gharchive.org/{date_str}-{hour}.json.gz"
         
         try:
-            response = requests.get(url, stream=True, timeout=10)
-            response.raise_for_status()
+            with instrumentation.meter('fetch') as fetch:
+                response = requests.get(url, stream=True, timeout=10)
+                response.raise_for_status()
+                content = response.content
+            fetch.add(1, len(content))
             
-            with gzip.GzipFile(fileobj=io.BytesIO(response.content)) as gz_file:
-                for line in gz_file:
+            parse = instrumentation.meter('parse')
+            with gzip.GzipFile(fileobj=io.BytesIO(content)) as gz_file:
+                for line in instrumentation.timed_iter('decompress', gz_file):
                     try:
-                        event = json.loads(line.decode('utf-8'))
+                        with parse:
+                            event = json.loads(line.decode('utf-8'))
+                        parse.add(1, len(line))
                         events.append(event)
                         if len(events) >= 5000:
                             break
@@ -63,7 +74,7 @@ def process_to_repositories(events):
         if repo_name not in repos_dict:
             repos_dict[repo_name] = {
                 'events': [],
-                'contributors': set(),
+                'contributors': contributor_sketch.new_contributor_set(),
                 'last_event': event['created_at']
             }
         
@@ -140,10 +151,13 @@ def process_to_repositories(events):
 
 def load_to_raw(repositories):
     """Load data to raw tables"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with instrumentation.meter('connect'):
+        conn = get_connection()
+        cursor = conn.cursor()
     
     # Load repositories
+    build = instrumentation.meter('build.SRC_GIT_REPOSITORIES')
+    build.start()
     records = []
     for repo in repositories:
         created_str = repo['created_at'].strftime('%Y-%m-%d %H:%M:%S')
@@ -162,17 +176,23 @@ def load_to_raw(repositories):
             created_str,
             updated_str
         ))
+    build.stop(len(records))
     
+    insert = instrumentation.meter('insert.RAW.SRC_GIT_REPOSITORIES')
     batch_size = 1000
     for i in range(0, len(records), batch_size):
         batch = records[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO RAW.SRC_GIT_REPOSITORIES 
             (data_source, id, name, full_name, owner, language, stars, forks, html_url, created_at, updated_at)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
     # Load contributors
+    build = instrumentation.meter('build.SRC_GIT_REPO_CONTRIBUTORS')
+    build.start()
     contributors_data = []
     for repo in repositories:
         for i in range(repo['total_contributors']):
@@ -187,16 +207,22 @@ def load_to_raw(repositories):
                 total_commits,
                 recent_commits
             ))
+    build.stop(len(contributors_data))
     
+    insert = instrumentation.meter('insert.RAW.SRC_GIT_REPO_CONTRIBUTORS')
     for i in range(0, len(contributors_data), batch_size):
         batch = contributors_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO RAW.SRC_GIT_REPO_CONTRIBUTORS 
             (data_source, repo_full_name, contributor, total_commits, recent_90_days_commits)
             VALUES (%s, %s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
     # Load commits
+    build = instrumentation.meter('build.SRC_GIT_REPO_COMMITS')
+    build.start()
     commits_data = []
     for repo in repositories:
         if repo['commits_90d'] > 0:
@@ -216,16 +242,22 @@ def load_to_raw(repositories):
             commits_180d,
             last_commit.strftime('%Y-%m-%d %H:%M:%S')
         ))
+    build.stop(len(commits_data))
     
+    insert = instrumentation.meter('insert.RAW.SRC_GIT_REPO_COMMITS')
     for i in range(0, len(commits_data), batch_size):
         batch = commits_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO RAW.SRC_GIT_REPO_COMMITS 
             (data_source, repo, commits_30d, commits_90d, commits_180d, last_commit_date)
             VALUES (%s, %s, %s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
     # Load issues
+    build = instrumentation.meter('build.SRC_GIT_REPO_ISSUES')
+    build.start()
     issues_data = []
     for repo in repositories:
         if repo['open_issues'] + repo['closed_issues'] > 0:
@@ -240,16 +272,22 @@ def load_to_raw(repositories):
             repo['closed_issues'],
             issues_last_90d
         ))
+    build.stop(len(issues_data))
     
+    insert = instrumentation.meter('insert.RAW.SRC_GIT_REPO_ISSUES')
     for i in range(0, len(issues_data), batch_size):
         batch = issues_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO RAW.SRC_GIT_REPO_ISSUES 
             (data_source, repo, open_issues, closed_issues, issues_last_90d)
             VALUES (%s, %s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
     # Load releases
+    build = instrumentation.meter('build.SRC_GIT_REPO_RELEASES')
+    build.start()
     releases_data = []
     for repo in repositories:
         last_release_str = repo['last_release_date'].strftime('%Y-%m-%d %H:%M:%S')
@@ -263,26 +301,34 @@ def load_to_raw(repositories):
             last_release_str,
             days_since
         ))
+    build.stop(len(releases_data))
     
+    insert = instrumentation.meter('insert.RAW.SRC_GIT_REPO_RELEASES')
     for i in range(0, len(releases_data), batch_size):
         batch = releases_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO RAW.SRC_GIT_REPO_RELEASES 
             (data_source, repo, release_count, last_release_date, days_since_last_release)
             VALUES (%s, %s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
-    conn.commit()
+    with instrumentation.meter('commit'):
+        conn.commit()
     cursor.close()
     conn.close()
 
 def main():
     events = get_gh_archive_data()
-    repositories = process_to_repositories(events)
+    with instrumentation.meter('aggregate') as aggregate:
+        repositories = process_to_repositories(events)
+    aggregate.add(len(events))
     
     load_to_raw(repositories)
     
     print("Data loaded to raw tables")
+    instrumentation.emit_summary('load_data_to_snowflake')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_main(main, 'load_data_to_snowflake')
\ No newline at end of file
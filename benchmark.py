@@ -0,0 +1,1785 @@
+import argparse
+import gzip
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import instrumentation
+import layer_metrics
+import local_pipeline as lp
+import query_trace
+import risk_queries
+
+BASE_AS_OF = datetime(2025, 1, 1)
+DELTA_AS_OF = BASE_AS_OF + timedelta(days=7)
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def _curate_snapshot(conn):
+    return conn.execute("""
+        SELECT FULL_NAME, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
+               DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES, RISK_SCORE, RISK_CATEGORY
+        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+        ORDER BY FULL_NAME
+    """).fetchall()
+
+def _invalidate(conn, full_name, as_of):
+    """Insert a newer RAW snapshot of a repo that fails STAGE validation (negative stars)"""
+    owner, name = full_name.split('/', 1)
+    stamp = as_of.strftime('%Y-%m-%d %H:%M:%S')
+    conn.execute("""
+        INSERT INTO RAW.SRC_GIT_REPOSITORIES
+        (data_source, id, name, full_name, owner, language, stars, forks, html_url, created_at, updated_at)
+        VALUES ('git_hub', 'synth_invalid', ?, ?, ?, 'Python', -1, 0, ?, ?, ?)
+    """, (name, full_name, owner, f"https://github.com/{full_name}", stamp, stamp))
+    conn.commit()
+
+def _open_history(conn, full_name):
+    return conn.execute("""
+        SELECT COUNT(*) FROM CURATE.RISK_SCORE_HISTORY WHERE FULL_NAME = ? AND VALID_TO IS NULL
+    """, (full_name,)).fetchone()[0]
+
+class InjectedFailure(Exception):
+    pass
+
+@contextmanager
+def _fail_after_consume(table):
+    """Fail the next consumer of `table` right after it consumed the stream
+
+    Like a Snowflake stream read, opening the local stream moves its offset at once; the
+    failure then hits before anything downstream (hub batch, latest-batch pointers, the
+    CHANGED_REPOS hand-off) is written, so only a rollback can bring the delta back.
+    """
+    open_stream = lp._open_stream
+
+    def failing(conn, name, full=False):
+        lo, hi = open_stream(conn, name, full)
+        if name == table:
+            lp._advance_stream(conn, name, hi)
+            raise InjectedFailure(f"injected failure after consuming STREAM_{table}")
+        return lo, hi
+
+    lp._open_stream = failing
+    try:
+        yield
+    finally:
+        lp._open_stream = open_stream
+
+def bench_stream(repos, delta):
+    """Full reprocessing vs stream-delta processing of one pipeline tick"""
+    base_names = lp.synthetic_repo_names(repos)
+    # half of the delta updates existing repos, half adds new ones
+    delta_names = lp.synthetic_repo_names(delta, start=repos - delta // 2)
+    # and one untouched repo's newer snapshot fails validation, so it must leave CURATE
+    invalid_name = base_names[0]
+
+    def build():
+        conn = lp.get_local_connection()
+        lp.load_synthetic_raw(conn, base_names, seed=1, as_of=BASE_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+        lp.load_synthetic_raw(conn, delta_names, seed=2, as_of=DELTA_AS_OF)
+        _invalidate(conn, invalid_name, DELTA_AS_OF)
+        return conn
+
+    print("\n" + "="*70)
+    print(f"STREAM DELTA BENCHMARK: {repos:,} repos, delta of {delta:,} repos")
+    print("="*70)
+
+    full_conn = build()
+    _, full_elapsed = _timed(lp.sp_run_git_pipeline, full_conn, full=True)
+
+    inc_conn = build()
+    _, inc_elapsed = _timed(lp.sp_run_git_pipeline, inc_conn)
+
+    # reference: a full run over only the latest snapshot of every repo
+    ref_conn = lp.get_local_connection()
+    delta_set = set(delta_names)
+    untouched = [name for name in base_names if name not in delta_set and name != invalid_name]
+    lp.load_synthetic_raw(ref_conn, untouched, seed=1, as_of=BASE_AS_OF)
+    lp.load_synthetic_raw(ref_conn, delta_names, seed=2, as_of=DELTA_AS_OF)
+    _invalidate(ref_conn, invalid_name, DELTA_AS_OF)
+    lp.sp_run_git_pipeline(ref_conn, full=True)
+
+    matches = _curate_snapshot(inc_conn) == _curate_snapshot(ref_conn)
+
+    # two snapshots of the same repos in one delta: the single-row hubs keep the later one
+    hub_columns = "SELECT FULL_NAME, COMMITS_90D, OPEN_ISSUES, DAYS_SINCE_LAST_RELEASE FROM ENRICH.REPO_ENTRYLINE ORDER BY FULL_NAME"
+    twice_conn, once_conn = lp.get_local_connection(), lp.get_local_connection()
+    lp.load_synthetic_raw(twice_conn, delta_names, seed=1, as_of=BASE_AS_OF)
+    for conn in (twice_conn, once_conn):
+        lp.load_synthetic_raw(conn, delta_names, seed=2, as_of=DELTA_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+    latest_kept = twice_conn.execute(hub_columns).fetchall() == once_conn.execute(hub_columns).fetchall()
+    twice_conn.close()
+    once_conn.close()
+
+    # a hub load over its now-empty stream must not take a load batch
+    batch_count = "SELECT COUNT(*) FROM LINKMAP.LOAD_BATCHES"
+    batches = inc_conn.execute(batch_count).fetchone()[0]
+    for target in lp.LINKMAP_LOADS:
+        lp.sp_load_hub(inc_conn, target)
+    no_empty_batches = inc_conn.execute(batch_count).fetchone()[0] == batches
+    invalid_closed = _open_history(inc_conn, invalid_name) == 0 and _open_history(full_conn, invalid_name) == 0
+
+    # failure injection: STAGE fails on one tick and a hub load on the next, each right
+    # after consuming its stream; the rolled-back step must leave the delta in the stream
+    # so a later tick retries it
+    fail_conn = build()
+    failures = 0
+    for table in ('SRC_GIT_REPOSITORIES', 'SRC_GIT_REPO_COMMITS'):
+        with _fail_after_consume(table):
+            try:
+                lp.sp_run_git_pipeline(fail_conn)
+            except InjectedFailure:
+                failures += 1
+    lp.sp_run_git_pipeline(fail_conn)
+    retried = _curate_snapshot(fail_conn) == _curate_snapshot(ref_conn)
+    queued = fail_conn.execute("SELECT COUNT(*) FROM ORCHESTRATION.CHANGED_REPOS").fetchone()[0]
+
+    print(f"Full run:        {full_elapsed*1000:10.1f} ms")
+    print(f"Incremental run: {inc_elapsed*1000:10.1f} ms")
+    print(f"Speedup:         {full_elapsed / inc_elapsed:10.1f}x")
+    print(f"CURATE matches latest-snapshot rebuild: {matches}")
+    print(f"Invalidated repo dropped with its history interval closed: {invalid_closed}")
+    print(f"Empty hub streams take no load batch: {no_empty_batches}")
+    print(f"Hub loads keep the latest of two snapshots in one delta: {latest_kept}")
+    print(f"After {failures} injected failures, retried delta matches rebuild: {retried} "
+          f"({queued} repos left queued)")
+    print("="*70)
+
+    for conn in (full_conn, inc_conn, ref_conn, fail_conn):
+        conn.close()
+
+def _linkmap_rows(conn):
+    return sum(
+        conn.execute(f"SELECT COUNT(*) FROM LINKMAP.{target}").fetchone()[0]
+        for target in lp.LINKMAP_LOADS
+    )
+
+def bench_linkmap(repos, delta, runs, retain):
+    """ENRICH cost and LINKMAP size over many pipeline ticks, with and without retention"""
+    base_names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"LINKMAP RETENTION BENCHMARK: {repos:,} repos, {runs} runs of {delta:,} changed repos")
+    print("="*70)
+    print(f"{'Run':<8} {'Retention':<12} {'LINKMAP rows':<15} {'ENRICH ms':<12}")
+    print("-"*70)
+
+    report_every = max(runs // 5, 1)
+    for retain_batches in (None, retain):
+        conn = lp.get_local_connection()
+        lp.load_synthetic_raw(conn, base_names, seed=0, as_of=BASE_AS_OF)
+        lp.sp_run_git_pipeline(conn, retain_batches=retain_batches)
+
+        for run in range(1, runs + 1):
+            # every tick re-snapshots the same hot set of repos
+            lp.load_synthetic_raw(conn, base_names[:delta], seed=run,
+                                  as_of=BASE_AS_OF + timedelta(days=run))
+            lp.sp_load_stg_repositories(conn)
+            for target in lp.LINKMAP_LOADS:
+                lp.sp_load_hub(conn, target)
+            _, enrich_elapsed = _timed(lp.sp_load_repo_entryline, conn)
+            lp.sp_load_risk_analysis_data_product(conn)
+            if retain_batches is not None:
+                lp.sp_purge_hub_batches(conn, retain_batches)
+
+            if run % report_every == 0 or run == runs:
+                label = 'off' if retain_batches is None else f"{retain_batches} batches"
+                print(f"{run:<8} {label:<12} {_linkmap_rows(conn):<15,} {enrich_elapsed*1000:<12.1f}")
+        conn.close()
+
+    print("="*70)
+
+def _node_durations(conn):
+    rows = conn.execute("""
+        SELECT stage, start_time, end_time FROM ORCHESTRATION.PIPELINE_LOG
+        WHERE status = 'COMPLETED' AND stage != 'FULL_PIPELINE'
+        ORDER BY log_id
+    """).fetchall()
+    fmt = '%Y-%m-%d %H:%M:%S.%f'
+    return {
+        stage: (datetime.strptime(end, fmt) - datetime.strptime(start, fmt)).total_seconds()
+        for stage, start, end in rows
+    }
+
+def bench_graph(repos, workers):
+    """Sequential vs task-graph execution of one backfill run on a file-backed local backend"""
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"TASK GRAPH BENCHMARK: {repos:,} repos, {workers} workers")
+    print("="*70)
+
+    results = {}
+    for label, worker_count in (('sequential', 0), ('graph', workers)):
+        with tempfile.TemporaryDirectory() as path:
+            conn = lp.get_local_connection(path)
+            lp.load_synthetic_raw(conn, names, seed=1, as_of=BASE_AS_OF)
+            worker_conns = lp.open_worker_connections(path, worker_count) if worker_count else None
+            _, elapsed = _timed(lp.sp_run_git_pipeline, conn, worker_conns=worker_conns)
+            results[label] = (elapsed, _node_durations(conn), _curate_snapshot(conn))
+            for worker in worker_conns or []:
+                worker.close()
+            conn.close()
+
+    durations = results['sequential'][1]
+    print(f"{'Node':<25} {'Sequential ms':<15} {'Graph ms':<15}")
+    print("-"*70)
+    for node, seconds in durations.items():
+        print(f"{node:<25} {seconds*1000:<15.1f} {results['graph'][1].get(node, 0)*1000:<15.1f}")
+
+    hubs = [seconds for node, seconds in durations.items() if node.startswith('LINKMAP_')]
+    critical_path = sum(durations.values()) - sum(hubs) + max(hubs)
+    print("-"*70)
+    print(f"Sequential run:          {results['sequential'][0]*1000:10.1f} ms")
+    print(f"Graph run:               {results['graph'][0]*1000:10.1f} ms")
+    print(f"Critical path (seq.):    {critical_path*1000:10.1f} ms")
+    print(f"CURATE identical: {results['sequential'][2] == results['graph'][2]}")
+    print("="*70)
+
+def _fill_raw_repositories(conn, rows):
+    """Bulk-generate RAW repository rows in SQL, with ~10% duplicates and a few invalid rows"""
+    conn.execute("""
+        WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < ?)
+        INSERT INTO RAW.SRC_GIT_REPOSITORIES (
+            data_source, id, name, full_name, owner, language, stars, forks, html_url, created_at, updated_at
+        )
+        SELECT
+            'git_hub',
+            CASE WHEN x % 1000 = 0 THEN NULL ELSE 'id_' || x END,
+            CASE WHEN x % 1500 = 0 THEN '' ELSE 'repo-' || k END,
+            'user' || (k % 997) || '/repo-' || k,
+            'user' || (k % 997),
+            CASE x % 5 WHEN 0 THEN 'Python' WHEN 1 THEN 'Go' WHEN 2 THEN 'Rust' WHEN 3 THEN 'Java' ELSE NULL END,
+            CASE WHEN x % 2000 = 0 THEN -1 ELSE x % 5000 END,
+            x % 300,
+            'https://github.com/user' || (k % 997) || '/repo-' || k,
+            CASE WHEN x % 2500 = 0 THEN NULL ELSE '2020-01-01 00:00:00' END,
+            '2025-01-01 ' || printf('%02d:%02d:%02d', x % 24, x % 60, x % 59)
+        FROM (SELECT x, x % ? AS k FROM seq)
+    """, (rows, rows * 9 // 10))
+    conn.commit()
+
+def _legacy_stage_load(conn):
+    """The pre-single-pass STAGE load: copy, two counts, ranked rebuild, distinct count, upsert"""
+    conn.execute("CREATE TEMP TABLE TEMP_DELTA_REPOS AS SELECT * FROM RAW.SRC_GIT_REPOSITORIES WHERE DATA_SOURCE = 'git_hub'")
+    total = conn.execute("SELECT COUNT(*) FROM TEMP_DELTA_REPOS").fetchone()[0]
+    invalid = conn.execute("""
+        SELECT COUNT(*) FROM TEMP_DELTA_REPOS
+        WHERE DATA_SOURCE = 'git_hub'
+          AND (ID IS NULL OR TRIM(ID) = '' OR NAME IS NULL OR TRIM(NAME) = ''
+               OR FULL_NAME IS NULL OR TRIM(FULL_NAME) = '' OR STARS < 0 OR FORKS < 0
+               OR CREATED_AT IS NULL OR CREATED_AT = '')
+    """).fetchone()[0]
+    conn.execute("""
+        CREATE TEMP TABLE TEMP_CLEANED_REPOS AS
+        SELECT *, ROW_NUMBER() OVER (PARTITION BY FULL_NAME ORDER BY COALESCE(UPDATED_AT, '1970-01-01 00:00:00') DESC) AS rn
+        FROM (
+            SELECT DATA_SOURCE, TRIM(ID) AS ID,
+                   CASE WHEN NAME IS NULL OR TRIM(NAME) = '' THEN 'UNKNOWN' ELSE TRIM(NAME) END AS NAME,
+                   CASE WHEN FULL_NAME IS NULL OR TRIM(FULL_NAME) = '' THEN 'UNKNOWN/UNKNOWN' ELSE TRIM(FULL_NAME) END AS FULL_NAME,
+                   CASE WHEN OWNER IS NULL OR TRIM(OWNER) = '' THEN 'UNKNOWN' ELSE TRIM(OWNER) END AS OWNER,
+                   CASE WHEN LANGUAGE IS NULL OR TRIM(LANGUAGE) = '' THEN 'Unknown' ELSE TRIM(LANGUAGE) END AS LANGUAGE,
+                   CASE WHEN STARS < 0 THEN 0 ELSE STARS END AS STARS,
+                   CASE WHEN FORKS < 0 THEN 0 ELSE FORKS END AS FORKS,
+                   HTML_URL, CREATED_AT, UPDATED_AT,
+                   CASE WHEN ID IS NOT NULL AND TRIM(ID) != '' AND NAME IS NOT NULL AND TRIM(NAME) != ''
+                             AND FULL_NAME IS NOT NULL AND TRIM(FULL_NAME) != '' AND STARS >= 0 AND FORKS >= 0
+                        THEN 1 ELSE 0 END AS VALID_FLAG,
+                   CASE WHEN ID IS NULL OR TRIM(ID) = '' THEN 'Missing ID'
+                        WHEN NAME IS NULL OR TRIM(NAME) = '' THEN 'Missing Name'
+                        WHEN FULL_NAME IS NULL OR TRIM(FULL_NAME) = '' THEN 'Missing Full Name'
+                        WHEN STARS < 0 THEN 'Negative Stars Count'
+                        WHEN FORKS < 0 THEN 'Negative Forks Count'
+                        ELSE 'Valid' END AS INVALID_REASON
+            FROM TEMP_DELTA_REPOS
+            WHERE DATA_SOURCE = 'git_hub'
+        )
+    """)
+    duplicates = conn.execute("SELECT COUNT(*) - COUNT(DISTINCT FULL_NAME) FROM TEMP_CLEANED_REPOS").fetchone()[0]
+    conn.execute("""
+        INSERT INTO STAGE.STG_REPOSITORIES (
+            DATA_SOURCE, ID, NAME, FULL_NAME, OWNER, LANGUAGE, STARS, FORKS, HTML_URL,
+            CREATED_AT, UPDATED_AT, VALID_FLAG, INVALID_REASON
+        )
+        SELECT DATA_SOURCE, ID, NAME, FULL_NAME, OWNER, LANGUAGE, STARS, FORKS, HTML_URL,
+               CREATED_AT, UPDATED_AT, VALID_FLAG, INVALID_REASON
+        FROM TEMP_CLEANED_REPOS
+        WHERE rn = 1
+        ON CONFLICT (DATA_SOURCE, FULL_NAME) DO NOTHING
+    """)
+    conn.execute("DROP TABLE temp.TEMP_CLEANED_REPOS")
+    conn.execute("DROP TABLE temp.TEMP_DELTA_REPOS")
+    conn.commit()
+    return total, invalid, duplicates
+
+def bench_stage(rows):
+    """Multi-scan vs single-pass STAGE validation over one RAW load"""
+    print("\n" + "="*70)
+    print(f"STAGE VALIDATION BENCHMARK: {rows:,} RAW rows")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        conn = lp.get_local_connection(path)
+        _, fill_elapsed = _timed(_fill_raw_repositories, conn, rows)
+        print(f"RAW generated in {fill_elapsed:.1f} s")
+
+        (total, invalid, duplicates), legacy_elapsed = _timed(_legacy_stage_load, conn)
+        conn.execute("DELETE FROM STAGE.STG_REPOSITORIES")
+        conn.commit()
+        _, single_elapsed = _timed(lp.sp_load_stg_repositories, conn, full=True)
+
+        metrics = dict(conn.execute("""
+            SELECT metric_name, metric_value FROM ORCHESTRATION.PIPELINE_METRICS WHERE stage = 'STAGE'
+        """).fetchall())
+        conn.close()
+
+    counters_match = (total, invalid, duplicates) == (
+        metrics['TOTAL_RECORDS'], metrics['INVALID_RECORDS'], metrics['DUPLICATE_RECORDS']
+    )
+    print(f"Multi-scan load:   {legacy_elapsed:8.2f} s")
+    print(f"Single-pass load:  {single_elapsed:8.2f} s")
+    print(f"Speedup:           {legacy_elapsed / single_elapsed:8.2f}x")
+    print(f"Counters: Total={metrics['TOTAL_RECORDS']:,} Invalid={metrics['INVALID_RECORDS']:,} "
+          f"Duplicates={metrics['DUPLICATE_RECORDS']:,} (match multi-scan: {counters_match})")
+    print("="*70)
+
+def bench_score(rows):
+    """Vectorized risk scoring vs the CURATE SQL on the local engine"""
+    import numpy as np
+    import risk_scoring
+
+    rng = np.random.default_rng(0)
+    inputs = (
+        rng.integers(0, 50000, rows), rng.integers(0, 150, rows), rng.integers(0, 15, rows),
+        rng.integers(0, 900, rows), rng.integers(0, 80, rows),
+    )
+
+    print("\n" + "="*70)
+    print(f"RISK SCORING BENCHMARK: {rows:,} rows")
+    print("="*70)
+
+    scores, vector_elapsed = _timed(risk_scoring.risk_scores, *inputs)
+    _, category_elapsed = _timed(risk_scoring.risk_categories, scores)
+    vector_elapsed += category_elapsed
+
+    conn = lp.get_local_connection()
+    conn.executemany("""
+        INSERT INTO ENRICH.REPO_ENTRYLINE (
+            DATA_SOURCE, FULL_NAME, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
+            DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES
+        ) VALUES ('git_hub', ?, ?, ?, ?, ?, ?)
+    """, ((str(i),) + row for i, row in enumerate(zip(*(column.tolist() for column in inputs)))))
+    sql_scores, sql_elapsed = _timed(
+        lambda: conn.execute(f"SELECT risk_score_raw FROM ({lp.risk_score_sql()}) ORDER BY rowid").fetchall()
+    )
+    conn.close()
+
+    matches = np.array_equal(scores, np.array([row[0] for row in sql_scores]))
+    print(f"NumPy scoring:  {vector_elapsed*1000:10.1f} ms ({rows / vector_elapsed:14,.0f} rows/sec)")
+    print(f"SQL scoring:    {sql_elapsed*1000:10.1f} ms ({rows / sql_elapsed:14,.0f} rows/sec)")
+    print(f"Scores identical: {matches}")
+    print("="*70)
+
+def _curate_metrics(conn):
+    return dict(conn.execute("""
+        SELECT metric_name, metric_value FROM ORCHESTRATION.PIPELINE_METRICS
+        WHERE stage = 'CURATE'
+          AND recorded_at = (SELECT MAX(recorded_at) FROM ORCHESTRATION.PIPELINE_METRICS WHERE stage = 'CURATE')
+    """).fetchall())
+
+def bench_fingerprint(repos, changed):
+    """CURATE rescoring every re-enriched repo vs only repos whose scoring inputs changed"""
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"FINGERPRINT BENCHMARK: {repos:,} repos re-delivered, {changed:,} with new inputs")
+    print("="*70)
+
+    results = {}
+    for mode in ('rescore all', 'fingerprint'):
+        conn = lp.get_local_connection()
+        lp.load_synthetic_raw(conn, names, seed=1, as_of=BASE_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+        # a steady-state tick: every repo is re-delivered, most with identical metrics
+        lp.load_synthetic_raw(conn, names[changed:], seed=1, as_of=BASE_AS_OF)
+        lp.load_synthetic_raw(conn, names[:changed], seed=2, as_of=DELTA_AS_OF)
+        lp.sp_load_stg_repositories(conn)
+        for target in lp.LINKMAP_LOADS:
+            lp.sp_load_hub(conn, target)
+        lp.sp_load_repo_entryline(conn)
+        if mode == 'rescore all':
+            # without stored fingerprints every candidate is rescored, as before
+            conn.execute("UPDATE CURATE.RISK_ANALYSIS_DATA_PRODUCT SET SCORING_FINGERPRINT = NULL")
+            conn.commit()
+        _, elapsed = _timed(lp.sp_load_risk_analysis_data_product, conn)
+        results[mode] = (elapsed, _curate_metrics(conn), _curate_snapshot(conn))
+        conn.close()
+
+    for mode, (elapsed, metrics, _) in results.items():
+        print(f"{mode:<12} CURATE {elapsed*1000:8.1f} ms  rescored {metrics['RESCORED_RECORDS']:>8,}  "
+              f"skipped {metrics['SKIPPED_RECORDS']:>8,}")
+    print(f"Speedup:         {results['rescore all'][0] / results['fingerprint'][0]:8.1f}x")
+    print(f"CURATE identical: {results['rescore all'][2] == results['fingerprint'][2]}")
+    print("="*70)
+
+def bench_history(repos, delta, runs):
+    """RISK_SCORE_HISTORY growth over many pipeline ticks vs one snapshot per run"""
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"RISK HISTORY BENCHMARK: {repos:,} repos, {runs} runs of {delta:,} changed repos")
+    print("="*70)
+    print(f"{'Run':<8} {'History rows':<15} {'Score changes':<15} {'Snapshot rows':<15}")
+    print("-"*70)
+
+    conn = lp.get_local_connection()
+    lp.load_synthetic_raw(conn, names, seed=0, as_of=BASE_AS_OF)
+    lp.sp_run_git_pipeline(conn)
+
+    report_every = max(runs // 5, 1)
+    for run in range(1, runs + 1):
+        # the whole catalogue is re-delivered each tick; only a rotating slice has new metrics
+        start = (run * delta) % repos
+        changed = set(names[start:start + delta])
+        lp.load_synthetic_raw(conn, [name for name in names if name not in changed], seed=0, as_of=BASE_AS_OF)
+        lp.load_synthetic_raw(conn, sorted(changed), seed=run, as_of=BASE_AS_OF + timedelta(days=run))
+        lp.sp_run_git_pipeline(conn)
+
+        if run % report_every == 0 or run == runs:
+            history_rows = conn.execute("SELECT COUNT(*) FROM CURATE.RISK_SCORE_HISTORY").fetchone()[0]
+            print(f"{run:<8} {history_rows:<15,} {history_rows - repos:<15,} {repos * (run + 1):<15,}")
+
+    # every repo has exactly one open interval, and intervals never overlap
+    open_rows = conn.execute("SELECT COUNT(*) FROM CURATE.RISK_SCORE_HISTORY WHERE VALID_TO IS NULL").fetchone()[0]
+    overlaps = conn.execute("""
+        SELECT COUNT(*) FROM CURATE.RISK_SCORE_HISTORY a
+        JOIN CURATE.RISK_SCORE_HISTORY b
+          ON a.FULL_NAME = b.FULL_NAME AND a.rowid < b.rowid
+         AND a.VALID_FROM < COALESCE(b.VALID_TO, '9999') AND b.VALID_FROM < COALESCE(a.VALID_TO, '9999')
+    """).fetchone()[0]
+    current_matches = conn.execute("""
+        SELECT COUNT(*) FROM CURATE.RISK_SCORE_HISTORY h
+        JOIN CURATE.RISK_ANALYSIS_DATA_PRODUCT c ON h.FULL_NAME = c.FULL_NAME
+        WHERE h.VALID_TO IS NULL AND h.RISK_SCORE = c.RISK_SCORE AND h.RISK_CATEGORY = c.RISK_CATEGORY
+    """).fetchone()[0]
+    conn.close()
+
+    print(f"Open intervals: {open_rows:,} | Overlapping intervals: {overlaps} | "
+          f"Open interval matches CURATE: {current_matches == repos}")
+    print("="*70)
+
+def _legacy_contributor_counts(conn):
+    """Pre-aggregate-table ENRICH: COUNT(DISTINCT) over each key's latest contributor batch"""
+    return conn.execute(f"""
+        SELECT
+            REPO_FULL_NAME,
+            COUNT(DISTINCT CONTRIBUTOR),
+            COUNT(DISTINCT CASE WHEN RECENT_90_DAYS_COMMITS > 0 THEN CONTRIBUTOR END)
+        FROM ({lp._latest_load('HUB_REPO_CONTRIBUTORS', 'REPO_FULL_NAME')})
+        GROUP BY REPO_FULL_NAME
+        ORDER BY REPO_FULL_NAME
+    """).fetchall()
+
+def _aggregate_contributor_counts(conn):
+    return conn.execute("""
+        SELECT a.REPO_FULL_NAME, a.TOTAL_CONTRIBUTORS, a.ACTIVE_CONTRIBUTORS_90D
+        FROM TEMP_ENRICH_KEYS k
+        JOIN LINKMAP.REPO_CONTRIBUTOR_AGG a
+          ON a.DATA_SOURCE = 'git_hub' AND a.REPO_FULL_NAME = k.FULL_NAME
+        ORDER BY a.REPO_FULL_NAME
+    """).fetchall()
+
+def bench_contributors(repos, delta, runs):
+    """Contributor counts for one ENRICH delta: re-aggregating LINKMAP vs the aggregate table"""
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"CONTRIBUTOR AGGREGATE BENCHMARK: {repos:,} repos, {runs} runs of {delta:,} changed repos")
+    print("="*70)
+    print(f"{'Run':<8} {'Contributor rows':<18} {'Re-aggregate ms':<17} {'Aggregate ms':<14} {'Match'}")
+    print("-"*70)
+
+    conn = lp.get_local_connection()
+    lp.load_synthetic_raw(conn, names, seed=0, as_of=BASE_AS_OF)
+    lp.sp_run_git_pipeline(conn, retain_batches=None)
+
+    report_every = max(runs // 5, 1)
+    for run in range(1, runs + 1):
+        lp.load_synthetic_raw(conn, names[:delta], seed=run, as_of=BASE_AS_OF + timedelta(days=run))
+        lp.sp_load_hub(conn, 'HUB_REPO_CONTRIBUTORS')
+
+        if run % report_every == 0 or run == runs:
+            conn.execute("DROP TABLE IF EXISTS temp.TEMP_ENRICH_KEYS")
+            conn.execute("CREATE TEMP TABLE TEMP_ENRICH_KEYS (FULL_NAME TEXT PRIMARY KEY)")
+            conn.executemany("INSERT INTO TEMP_ENRICH_KEYS VALUES (?)", ((name,) for name in names[:delta]))
+            legacy, legacy_elapsed = _timed(_legacy_contributor_counts, conn)
+            aggregate, aggregate_elapsed = _timed(_aggregate_contributor_counts, conn)
+            rows = conn.execute("SELECT COUNT(*) FROM LINKMAP.HUB_REPO_CONTRIBUTORS").fetchone()[0]
+            print(f"{run:<8} {rows:<18,} {legacy_elapsed*1000:<17.1f} {aggregate_elapsed*1000:<14.1f} "
+                  f"{legacy == aggregate}")
+
+    conn.close()
+    print("="*70)
+
+def _scanned_layer_metrics(conn):
+    """Every layer re-aggregated from its tables, as the monitoring view used to"""
+    return sorted(
+        row for table in layer_metrics.LAYER_METRICS
+        for row in conn.execute(layer_metrics.metric_rows_sql(table)).fetchall()
+    )
+
+def _recorded_layer_metrics(conn):
+    return sorted(conn.execute("""
+        SELECT LAYER, TABLE_NAME, DATA_SOURCE, METRIC_NAME, METRIC_VALUE, METRIC_TS
+        FROM ORCHESTRATION.LAYER_METRICS
+    """).fetchall())
+
+def bench_monitoring(repos, delta, runs):
+    """Monitoring reads: re-aggregating every layer vs the recorded layer metrics"""
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"MONITORING BENCHMARK: {repos:,} repos, {runs} runs of {delta:,} changed repos")
+    print("="*70)
+    print(f"{'Run':<6} {'Layer rows':<12} {'Tick ms':<9} {'Refresh ms':<12} {'Re-aggregate ms':<17} "
+          f"{'Metrics ms':<11} {'Match'}")
+    print("-"*70)
+
+    conn = lp.get_local_connection()
+    lp.load_synthetic_raw(conn, names, seed=0, as_of=BASE_AS_OF)
+    lp.sp_run_git_pipeline(conn)
+
+    for run in range(1, runs + 1):
+        lp.load_synthetic_raw(conn, names[:delta], seed=run, as_of=BASE_AS_OF + timedelta(days=run))
+        # an incremental tick no longer scans the layers; the scheduled refresh does, once
+        # every layer_metrics.REFRESH_MINUTES
+        _, tick_elapsed = _timed(lp.sp_run_git_pipeline, conn)
+        _, refresh_elapsed = _timed(lp.sp_refresh_layer_metrics, conn)
+
+        scanned, scan_elapsed = _timed(_scanned_layer_metrics, conn)
+        recorded, recorded_elapsed = _timed(_recorded_layer_metrics, conn)
+        rows = sum(row[4] for row in recorded if row[3] == 'RECORD_COUNT')
+        print(f"{run:<6} {int(rows):<12,} {tick_elapsed*1000:<9.1f} {refresh_elapsed*1000:<12.1f} "
+              f"{scan_elapsed*1000:<17.1f} {recorded_elapsed*1000:<11.2f} {scanned == recorded}")
+
+    conn.close()
+    print("="*70)
+
+def _scrape(url):
+    with urllib.request.urlopen(url) as response:
+        return response.read().decode('utf-8')
+
+def _sample_value(text, sample):
+    for line in text.splitlines():
+        if line.startswith(sample + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+def bench_exporter(repos, scrapes, interval):
+    """Exporter scrape latency, refresh cost, and that a new pipeline run shows up after a refresh"""
+    import pipeline_exporter
+
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"EXPORTER BENCHMARK: {repos:,} repos, {scrapes} scrapes, refresh every {interval:g}s")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        conn = lp.get_local_connection(path)
+        lp.load_synthetic_raw(conn, names, seed=0, as_of=BASE_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+
+        cache = pipeline_exporter.MetricsCache(
+            lambda: lp.get_local_connection(path), interval, clock=pipeline_exporter.local_now
+        ).start()
+        server = pipeline_exporter.create_server(cache, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+
+        def scrape_all():
+            for _ in range(scrapes):
+                text = _scrape(url)
+            return text
+
+        text, elapsed = _timed(scrape_all)
+        print(f"Scrape from cache:      {elapsed / scrapes * 1000:8.2f} ms")
+        print(f"Refresh queries:        {cache.last_duration * 1000:8.2f} ms (once per interval)")
+        print(f"Exposition size:        {len(text):8,} bytes, "
+              f"{sum(1 for line in text.splitlines() if not line.startswith('#')):,} samples")
+
+        sample = 'pipeline_table_rows{layer="CURATE",table="RISK_ANALYSIS_DATA_PRODUCT",data_source="git_hub"}'
+        before = _sample_value(text, sample)
+        lp.load_synthetic_raw(conn, lp.synthetic_repo_names(100, start=repos), seed=1, as_of=DELTA_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+        lp.sp_refresh_layer_metrics(conn)
+        time.sleep(interval * 2)
+        after = _sample_value(_scrape(url), sample)
+        print(f"CURATE rows before/after a new run: {before:,.0f} -> {after:,.0f} "
+              f"(refreshed: {after == before + 100})")
+
+        server.shutdown()
+        server.server_close()
+        cache.stop()
+        conn.close()
+
+    print("="*70)
+
+def _synthetic_archive(events):
+    """A gzipped GH Archive hour of `events` push/watch events"""
+    lines = (
+        json.dumps({
+            'type': 'PushEvent' if i % 3 else 'WatchEvent',
+            'actor': {'login': f"user{i % 5000}"},
+            'repo': {'name': f"org{i % 400}/repo-{i % 2000}"},
+            'created_at': '2025-01-01T12:00:00Z',
+            'payload': {'size': i % 7, 'ref': 'refs/heads/main'},
+        }).encode('utf-8') + b'\n'
+        for i in range(events)
+    )
+    return gzip.compress(b''.join(lines))
+
+def _parse_bare(content):
+    """The same loop without meters; batches are handed to a list in place of executemany"""
+    events = []
+    with gzip.GzipFile(fileobj=io.BytesIO(content)) as gz_file:
+        for line in gz_file:
+            events.append(json.loads(line.decode('utf-8')))
+    rows = [('git_hub', e['repo']['name'], e['actor']['login'], 0, 0) for e in events]
+    batches = []
+    for i in range(0, len(rows), 1000):
+        batches.append(rows[i:i + 1000])
+    return batches
+
+def _parse_instrumented(content):
+    """The loaders' fetch/decompress/parse loop, with its meters"""
+    events = []
+    parse = instrumentation.meter('parse')
+    with gzip.GzipFile(fileobj=io.BytesIO(content)) as gz_file:
+        for line in instrumentation.timed_iter('decompress', gz_file):
+            with parse:
+                event = json.loads(line.decode('utf-8'))
+            parse.add(1, len(line))
+            events.append(event)
+    insert = instrumentation.meter('insert.RAW.SRC_GIT_REPO_CONTRIBUTORS')
+    rows = [('git_hub', e['repo']['name'], e['actor']['login'], 0, 0) for e in events]
+    batches = []
+    for i in range(0, len(rows), 1000):
+        batch = rows[i:i + 1000]
+        insert.start()
+        batches.append(batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
+    return batches
+
+def bench_instrumentation(events, repeats):
+    """Loader parse loop: uninstrumented vs instrumentation disabled vs enabled"""
+    content = _synthetic_archive(events)
+
+    print("\n" + "="*70)
+    print(f"INSTRUMENTATION BENCHMARK: {events:,} events ({len(content) / 2**20:.1f} MiB gzipped), best of {repeats}")
+    print("="*70)
+
+    def best(func):
+        return min(_timed(func, content)[1] for _ in range(repeats))
+
+    instrumentation.disable()
+    bare = best(_parse_bare)
+    disabled = best(_parse_instrumented)
+    recorder = instrumentation.enable()
+    enabled = best(_parse_instrumented)
+    summary = recorder.summary('benchmark')
+    instrumentation.disable()
+
+    print(f"Uninstrumented:         {bare*1000:8.1f} ms")
+    print(f"Disabled:               {disabled*1000:8.1f} ms ({(disabled / bare - 1):+.1%})")
+    print(f"Enabled:                {enabled*1000:8.1f} ms ({(enabled / bare - 1):+.1%})")
+    print("-"*70)
+    print(f"{'Stage':<38} {'Rows/s':>14} {'MiB/s':>10}")
+    for name, stage in summary['stages'].items():
+        print(f"{name:<38} {stage['rows_per_sec'] or 0:>14,.0f} {(stage['bytes_per_sec'] or 0) / 2**20:>10.1f}")
+    print("="*70)
+
+def bench_trace(repos, delta):
+    """Stream-delta pipeline run with query tracing off vs on, and the traced run's costliest stages"""
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"QUERY TRACE BENCHMARK: {repos:,} repos, delta of {delta:,} repos")
+    print("="*70)
+
+    def delta_run(path=None):
+        if path:
+            query_trace.enable(path, entry_point='benchmark')
+        conn = lp.get_local_connection()
+        lp.load_synthetic_raw(conn, names, seed=0, as_of=BASE_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+        lp.load_synthetic_raw(conn, names[:delta], seed=1, as_of=DELTA_AS_OF)
+        _, elapsed = _timed(lp.sp_run_git_pipeline, conn)
+        snapshot = _curate_snapshot(conn)
+        conn.close()
+        query_trace.disable()
+        return elapsed, snapshot
+
+    with tempfile.TemporaryDirectory() as path:
+        trace_path = f"{path}/trace.jsonl"
+        untraced, untraced_snapshot = delta_run()
+        traced, traced_snapshot = delta_run(trace_path)
+        records = query_trace.load_trace(trace_path)
+
+        print(f"Untraced delta run:   {untraced*1000:8.1f} ms")
+        print(f"Traced delta run:     {traced*1000:8.1f} ms ({traced / untraced - 1:+.1%})")
+        print(f"Statements traced:    {len(records):8,}")
+        print(f"CURATE identical:     {untraced_snapshot == traced_snapshot}")
+        query_trace.print_report(records, by='stage', top=10)
+
+def _count_contributors(shards, new_counter):
+    """Per-shard distinct contributors per repo, merged across shards"""
+    merged = {}
+    for shard in shards:
+        counters = {}
+        for repo, contributor in shard:
+            counter = counters.get(repo)
+            if counter is None:
+                counter = counters[repo] = new_counter()
+            counter.add(contributor)
+        for repo, counter in counters.items():
+            if repo in merged:
+                if isinstance(counter, set):
+                    merged[repo] |= counter
+                else:
+                    merged[repo].merge(counter)
+            else:
+                merged[repo] = counter
+    return {repo: len(counter) for repo, counter in merged.items()}, merged
+
+def bench_sketch(events, repos, shards, error):
+    """Exact sets vs HyperLogLog sketches for distinct contributors per repo over an event firehose"""
+    import random
+    import tracemalloc
+    import contributor_sketch
+
+    rng = random.Random(0)
+    # heavy-tailed activity: a few repos see most of the distinct actors
+    weights = [1 / (rank + 1) for rank in range(repos)]
+    repo_names = lp.synthetic_repo_names(repos)
+    stream = [
+        (repo_names[index], f"actor_{rng.randint(1, events // (4 * (index + 1)) + 10)}")
+        for index in rng.choices(range(repos), weights, k=events)
+    ]
+    shard_size = -(-len(stream) // shards)
+    sharded = [stream[i:i + shard_size] for i in range(0, len(stream), shard_size)]
+
+    print("\n" + "="*70)
+    print(f"CONTRIBUTOR SKETCH BENCHMARK: {events:,} events, {repos:,} repos, {shards} shards, "
+          f"error bound {error:.1%}")
+    print("="*70)
+
+    results = {}
+    for mode, new_counter in (('exact', set), ('hll', lambda: contributor_sketch.HyperLogLog(error))):
+        (counts, _), elapsed = _timed(_count_contributors, sharded, new_counter)
+        # memory is measured on a second run, tracing allocations distorts the timing
+        tracemalloc.start()
+        _count_contributors(sharded, new_counter)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[mode] = counts
+        print(f"{mode:<6} {elapsed:8.2f} s   peak memory {peak / 1024 / 1024:8.1f} MiB")
+
+    exact, approx = results['exact'], results['hll']
+    errors = sorted(abs(approx[repo] - exact[repo]) / exact[repo] for repo in exact)
+    large = [repo for repo in exact if exact[repo] >= 1000]
+    large_errors = [abs(approx[repo] - exact[repo]) / exact[repo] for repo in large]
+    print("-"*70)
+    print(f"Mean relative error:        {sum(errors) / len(errors):8.3%}")
+    print(f"95th pct relative error:    {errors[int(len(errors) * 0.95)]:8.3%}")
+    print(f"Max relative error:         {errors[-1]:8.3%}")
+    if large_errors:
+        print(f"Mean error, repos >= 1000:  {sum(large_errors) / len(large_errors):8.3%} ({len(large)} repos)")
+    print(f"Repos within 2x error bound: {sum(e <= 2 * error for e in errors) / len(errors):8.1%}")
+    print("="*70)
+
+def _dashboard_sections(conn, limit):
+    """The four --all sections as separate statements, as risk_analysis ran them before"""
+    return {
+        'summary': conn.execute(risk_queries.SUMMARY_SQL).fetchone(),
+        'languages': conn.execute(risk_queries.LANGUAGES_SQL).fetchall(),
+        'risky': conn.execute(risk_queries.top_repositories_sql(limit, riskiest=True)).fetchall(),
+        'healthy': conn.execute(risk_queries.top_repositories_sql(limit, riskiest=False)).fetchall(),
+    }
+
+def bench_dashboard(repos, limit, repeats):
+    """--all dashboard: four statements vs the combined dashboard query"""
+    names = lp.synthetic_repo_names(repos)
+
+    print("\n" + "="*70)
+    print(f"DASHBOARD BENCHMARK: {repos:,} repos, top {limit}, best of {repeats}")
+    print("="*70)
+
+    conn = lp.get_local_connection()
+    lp.load_synthetic_raw(conn, names, seed=0, as_of=BASE_AS_OF)
+    lp.sp_run_git_pipeline(conn)
+
+    def combined():
+        return risk_queries.split_dashboard(conn.execute(risk_queries.dashboard_sql(limit, limit)).fetchall())
+
+    separate_elapsed = min(_timed(_dashboard_sections, conn, limit)[1] for _ in range(repeats))
+    combined_elapsed = min(_timed(combined)[1] for _ in range(repeats))
+
+    print(f"{'Mode':<24} {'Statements':<12} {'Best ms':<10}")
+    print("-"*70)
+    print(f"{'Separate queries':<24} {4:<12} {separate_elapsed*1000:<10.1f}")
+    print(f"{'Combined dashboard':<24} {1:<12} {combined_elapsed*1000:<10.1f}")
+    print("-"*70)
+    print(f"Same sections: {_dashboard_sections(conn, limit) == combined()}")
+
+    conn.close()
+    print("="*70)
+
+def _local_execute(path):
+    """execute(sql, params) against a file-backed local pipeline, one connection per call"""
+    def execute(sql, params=None):
+        conn = lp.get_local_connection(path)
+        try:
+            return conn.execute(risk_queries.local_sql(sql), params or ()).fetchall()
+        finally:
+            conn.close()
+    return execute
+
+def bench_cache(repos, delta, repeats):
+    """CLI reads: direct queries vs result-cache hits, and invalidation after a CURATE load"""
+    import result_cache
+
+    names = lp.synthetic_repo_names(repos)
+    queries = [
+        ('--summary', risk_queries.SUMMARY_SQL, None),
+        ('--languages', risk_queries.LANGUAGES_SQL, None),
+        ('--risky 20', risk_queries.top_repositories_sql(20), None),
+        ('--report', risk_queries.REPORT_SQL, (names[0],)),
+    ]
+
+    print("\n" + "="*70)
+    print(f"RESULT CACHE BENCHMARK: {repos:,} repos, best of {repeats}")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        conn = lp.get_local_connection(path)
+        lp.load_synthetic_raw(conn, names, seed=0, as_of=BASE_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+        execute = _local_execute(path)
+
+        cache = result_cache.ResultCache(f"{path}/cache.db", risk_queries.FRESHNESS_SQL, ttl=3600)
+        checked = result_cache.ResultCache(f"{path}/checked.db", risk_queries.FRESHNESS_SQL, ttl=0)
+
+        print(f"{'Query':<14} {'Direct ms':<11} {'Miss ms':<10} {'Hit ms':<10} {'Hit+check ms':<14} {'Match'}")
+        print("-"*70)
+        for label, sql, params in queries:
+            direct = execute(sql, params)
+            direct_elapsed = min(_timed(execute, sql, params)[1] for _ in range(repeats))
+            _, miss_elapsed = _timed(cache.fetch, sql, params, execute)
+            hit, hit_elapsed = min((_timed(cache.fetch, sql, params, execute) for _ in range(repeats)),
+                                   key=lambda timed: timed[1])
+            checked.fetch(sql, params, execute)
+            checked_elapsed = min(_timed(checked.fetch, sql, params, execute)[1] for _ in range(repeats))
+            print(f"{label:<14} {direct_elapsed*1000:<11.2f} {miss_elapsed*1000:<10.2f} {hit_elapsed*1000:<10.3f} "
+                  f"{checked_elapsed*1000:<14.2f} {hit == [tuple(row) for row in direct]}")
+
+        # a new CURATE load changes the freshness token, so the next read misses
+        lp.load_synthetic_raw(conn, names[:delta], seed=1, as_of=DELTA_AS_OF)
+        lp.sp_run_git_pipeline(conn)
+        before = checked.stats()
+        refreshed = checked.fetch(risk_queries.SUMMARY_SQL, None, execute)
+        after = checked.stats()
+        print("-"*70)
+        print(f"After a load of {delta:,} changed repos: "
+              f"{'miss' if after['misses'] > before['misses'] else 'hit'}, "
+              f"matches a direct query: {refreshed == [tuple(row) for row in execute(risk_queries.SUMMARY_SQL)]}")
+        print(f"Cache: {cache.stats()['entries']} entries, {cache.stats()['bytes']:,} bytes")
+
+        # the same statement under another account/database/role is a separate entry
+        other = result_cache.ResultCache(f"{path}/checked.db", risk_queries.FRESHNESS_SQL, identity='other/db/role')
+        other.fetch(risk_queries.SUMMARY_SQL, None, execute)
+        print(f"Another connection identity misses: {other.stats()['misses'] == 1}")
+        other.close()
+
+        cache.close()
+        checked.close()
+        conn.close()
+    print("="*70)
+
+def _replica_tables(conn):
+    """Both replicated tables, ordered, in the replica's column layout"""
+    import replica
+
+    return [
+        sorted(conn.execute(f"SELECT {', '.join(columns)} FROM CURATE.{table}").fetchall(), key=repr)
+        for table, columns, _, _ in replica.REPLICATED_TABLES
+    ]
+
+def bench_replica(repos, delta, repeats):
+    """Replica sync (full, incremental, deletes) and report latencies against the replica"""
+    import replica
+
+    names = lp.synthetic_repo_names(repos)
+    queries = [
+        ('--summary', risk_queries.SUMMARY_SQL, None),
+        ('--languages', risk_queries.LANGUAGES_SQL, None),
+        ('--risky 20', risk_queries.top_repositories_sql(20), None),
+        ('--all', risk_queries.dashboard_sql(), None),
+        ('--report', risk_queries.REPORT_SQL, (names[0],)),
+        ('--search', risk_queries.SEARCH_SQL, ('%repo-0001%',)),
+        ('--as-of', risk_queries.AS_OF_SUMMARY_SQL, {'as_of': DELTA_AS_OF.strftime('%Y-%m-%d')}),
+        ('--history', risk_queries.HISTORY_SQL, (names[0],)),
+    ]
+
+    print("\n" + "="*70)
+    print(f"REPLICA BENCHMARK: {repos:,} repos, delta of {delta:,} repos, best of {repeats}")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        source = lp.get_local_connection(path)
+        lp.load_synthetic_raw(source, names, seed=0, as_of=BASE_AS_OF)
+        lp.sp_run_git_pipeline(source)
+        replica_path = f"{path}/replica.db"
+
+        results, elapsed = _timed(replica.sync, source, replica_path, local_source=True)
+        copied = sum(results[table][0] for table, *_ in replica.REPLICATED_TABLES)
+        print(f"Full sync:        {copied:>9,} rows copied in {elapsed*1000:.1f} ms")
+
+        lp.load_synthetic_raw(source, names[:delta], seed=1, as_of=DELTA_AS_OF)
+        lp.sp_run_git_pipeline(source)
+        results, elapsed = _timed(replica.sync, source, replica_path, local_source=True)
+        copied = sum(results[table][0] for table, *_ in replica.REPLICATED_TABLES)
+        print(f"Incremental sync: {copied:>9,} rows copied in {elapsed*1000:.1f} ms")
+
+        source.execute("DELETE FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT WHERE FULL_NAME = ?", (names[-1],))
+        source.commit()
+        results, elapsed = _timed(replica.sync, source, replica_path, local_source=True)
+        removed = sum(results[table][1] for table, *_ in replica.REPLICATED_TABLES)
+        print(f"Sync after delete: {removed:>8,} rows removed in {elapsed*1000:.1f} ms")
+
+        conn = replica.connect(replica_path)
+        print(f"Replica matches source: {_replica_tables(conn) == _replica_tables(source)}")
+        conn.close()
+
+        print("-"*70)
+        print(f"{'Report':<14} {'Source ms':<12} {'Replica ms':<12} {'Cached ms':<12} {'Match'}")
+        print("-"*70)
+
+        def on_replica(sql, params=None):
+            conn = replica.connect(replica_path)
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+
+        # the CLI's path with --replica: the sync-keyed result cache in front of the replica
+        cache = replica.open_cache(replica_path)
+
+        def cached(sql, params):
+            return cache.fetch(sql, params, on_replica)
+
+        def on_source(sql, params):
+            return source.execute(risk_queries.local_sql(sql), params or ()).fetchall()
+
+        for label, sql, params in queries:
+            expected, source_elapsed = min((_timed(on_source, sql, params) for _ in range(repeats)),
+                                           key=lambda timed: timed[1])
+            rows, replica_elapsed = min((_timed(on_replica, sql, params) for _ in range(repeats)),
+                                        key=lambda timed: timed[1])
+            cached(sql, params)
+            cached_rows, cached_elapsed = min((_timed(cached, sql, params) for _ in range(repeats)),
+                                              key=lambda timed: timed[1])
+            print(f"{label:<14} {source_elapsed*1000:<12.2f} {replica_elapsed*1000:<12.2f} {cached_elapsed*1000:<12.2f} "
+                  f"{rows == expected and cached_rows == expected}")
+
+        cache.close()
+        source.close()
+    print("="*70)
+
+def _word_like_names(count, seed=0):
+    """Deterministic owner/name pairs built from pronounceable words, for the search benchmark"""
+    rng = random.Random(seed)
+    syllables = [consonant + vowel for consonant in 'bcdfghjklmnprstvwz' for vowel in 'aeiou'] + ['ex', 'io', 'ly', 'on']
+    words = sorted({''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(20000)})
+    names = set()
+    while len(names) < count:
+        owner = rng.choice(words) + (str(rng.randint(1, 99)) if rng.random() < 0.3 else '')
+        names.add(f"{owner}/{rng.choice(words)}-{rng.choice(words)}")
+    return sorted(names)
+
+def _typo(word, rng):
+    """The word with two neighbouring letters swapped"""
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+def bench_search(repos, delta, lookups):
+    """Repository search: LIKE scan vs the trigram index, and incremental index maintenance"""
+    import replica
+    import repo_search
+
+    names = _word_like_names(repos + delta)
+    base, added = names[:repos], names[repos:]
+    rng = random.Random(1)
+
+    print("\n" + "="*70)
+    print(f"SEARCH BENCHMARK: {repos:,} repos, {lookups} lookups per kind")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        conn = replica.connect(f"{path}/replica.db", create=True)
+        conn.execute("BEGIN")
+        _, build_elapsed = _timed(repo_search.index_repos, conn, base)
+        conn.execute("COMMIT")
+        conn.execute("BEGIN")
+        _, delta_elapsed = _timed(repo_search.index_repos, conn, added)
+        conn.execute("COMMIT")
+        print(f"Full index build:    {build_elapsed:.2f} s")
+        print(f"Index {delta:,} new repos: {delta_elapsed*1000:.1f} ms")
+        vocabulary, load_elapsed = _timed(repo_search.Vocabulary, conn, None)
+        print(f"Vocabulary in memory: {len(vocabulary.words):,} words in {load_elapsed*1000:.0f} ms "
+              f"(loaded by a process's second fuzzy lookup)")
+
+        samples = [rng.choice(names) for _ in range(lookups)]
+        terms = {
+            'substring': [name[len(name) // 3:len(name) // 3 + 6] for name in samples],
+            'prefix': [name.split('/')[0][:4] for name in samples],
+            'typo': [_typo(name.split('/')[1].split('-')[0], rng) for name in samples],
+        }
+
+        def like_scan(term):
+            return conn.execute(
+                "SELECT full_name FROM CURATE.SEARCH_REPOS WHERE UPPER(full_name) LIKE UPPER(%s) LIMIT 20",
+                (f'%{term}%',)
+            ).fetchall()
+
+        print("-"*70)
+        print(f"{'Lookup':<12} {'LIKE p50 ms':<13} {'Index p50 ms':<14} {'Index p99 ms':<14} {'Check'}")
+        print("-"*70)
+        for kind, kind_terms in terms.items():
+            scan_times = [_timed(like_scan, term)[1] for term in kind_terms[:20]]
+            if kind == 'typo':
+                # the first two fuzzy lookups read the index tables and load the vocabulary
+                repo_search.search(conn, kind_terms[0])
+                repo_search.search(conn, kind_terms[1])
+            results, index_times = zip(*(_timed(repo_search.search, conn, term) for term in kind_terms))
+            if kind == 'typo':
+                # the misspelled repository is among the matches
+                hits = sum(
+                    any(sample.split('/')[1].split('-')[0] in full_name for full_name, _, _ in matches)
+                    for sample, matches in zip(samples, results)
+                )
+                check = f"{hits / len(samples):.0%} found"
+            else:
+                # same matches as a full scan, for terms under the index's substring candidate cap
+                same = True
+                for term in kind_terms[:20]:
+                    scanned = {row[0] for row in conn.execute(
+                        "SELECT full_name FROM CURATE.SEARCH_REPOS WHERE instr(search_name, %s) > 0",
+                        (repo_search.normalize(term),)).fetchall()}
+                    if len(scanned) < repo_search.SUBSTRING_CANDIDATES:
+                        found = repo_search.search(conn, term, len(scanned) + 1, fuzzy=False)
+                        same = same and {full_name for full_name, _, _ in found} == scanned
+                check = f"matches scan: {same}"
+            print(f"{kind:<12} {_percentiles(scan_times)[0]:<13.2f} {_percentiles(index_times)[0]:<14.3f} "
+                  f"{_percentiles(index_times)[1]:<14.3f} {check}")
+
+        conn.execute("BEGIN")
+        _, remove_elapsed = _timed(repo_search.remove_repos, conn, added)
+        conn.execute("COMMIT")
+        indexed = conn.execute("SELECT COUNT(*) FROM CURATE.SEARCH_REPOS").fetchone()[0]
+        print("-"*70)
+        print(f"Remove {delta:,} repos: {remove_elapsed*1000:.1f} ms, {indexed:,} left indexed")
+        conn.close()
+    print("="*70)
+
+def _fill_data_product(conn, rows):
+    """Bulk-generate CURATE data product rows in SQL"""
+    conn.execute("""
+        WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < ?)
+        INSERT INTO CURATE.RISK_ANALYSIS_DATA_PRODUCT
+        SELECT
+            'git_hub',
+            'user' || (x % 997) || '/repo-' || x,
+            CASE x % 5 WHEN 0 THEN 'Python' WHEN 1 THEN 'Go' WHEN 2 THEN 'Rust' WHEN 3 THEN 'Java' ELSE NULL END,
+            x % 5000, x % 120, x % 15, x % 900, x % 300,
+            ROUND((x * 7919 % 10000) / 100.0, 2),
+            CASE WHEN x * 7919 % 10000 >= 7000 THEN 'HIGH' WHEN x * 7919 % 10000 >= 4000 THEN 'MEDIUM' ELSE 'LOW' END,
+            '2025-01-01 ' || printf('%02d:%02d:%02d', x % 24, x % 60, x % 59)
+        FROM seq
+    """, (rows,))
+    conn.commit()
+
+def _exported_rows(path, fmt):
+    """Rows read back from an export file"""
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    if fmt.endswith('.gz'):
+        file = gzip.open(path, 'rt', encoding='utf-8')
+    elif fmt.endswith('.zst'):
+        import zstandard
+
+        file = zstandard.open(path, 'rt', encoding='utf-8')
+    else:
+        file = open(path, encoding='utf-8')
+    with file:
+        lines = sum(1 for _ in file)
+    return lines - 1 if fmt.startswith('csv') else lines
+
+def _legacy_export(conn, path):
+    """The pre-streaming export: the whole result in one DataFrame, then CSV"""
+    import pandas as pd
+
+    df = pd.read_sql(risk_queries.EXPORT_SQL, conn)
+    df.to_csv(path, index=False)
+    return len(df)
+
+def bench_export(rows, batch_size):
+    """Whole-table DataFrame export vs the streaming export in every format"""
+    import importlib.util
+    import os
+    import sqlite3
+    import tracemalloc
+    import replica
+    import risk_export
+
+    print("\n" + "="*70)
+    print(f"EXPORT BENCHMARK: {rows:,} data product rows, batches of {batch_size:,}")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        conn = sqlite3.connect(':memory:')
+        conn.execute("ATTACH DATABASE ? AS CURATE", (f"{path}/curate.db",))
+        conn.execute(replica.REPLICA_SCHEMA[0])
+        conn.execute(replica.REPLICA_SCHEMA[1])
+        _, fill_elapsed = _timed(_fill_data_product, conn, rows)
+        expected = conn.execute("""
+            SELECT COUNT(*), AVG(RISK_SCORE), COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END)
+            FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+        """).fetchone()
+        print(f"Generated rows in {fill_elapsed:.1f} s")
+        print("-"*70)
+        print(f"{'Export':<18} {'Seconds':<9} {'Rows/s':<11} {'Peak MiB':<10} {'File MiB':<10} {'Check'}")
+        print("-"*70)
+
+        optional = {'csv.zst': 'zstandard', 'jsonl.zst': 'zstandard', 'parquet': 'pyarrow'}
+        runs = [('DataFrame csv', 'csv', lambda target: _legacy_export(conn, target))]
+        for fmt in risk_export.FORMATS:
+            runs.append((f"stream {fmt}", fmt, lambda target, fmt=fmt: risk_export.export(
+                conn, target, fmt, batch_size, progress=None).rows))
+        for label, fmt, run in runs:
+            if fmt in optional and importlib.util.find_spec(optional[fmt]) is None:
+                print(f"{label:<18} skipped, {optional[fmt]} is not installed")
+                continue
+            target = f"{path}/export.{fmt}"
+            written, elapsed = _timed(run, target)
+            # memory is measured on a second run, tracing allocations distorts the timing
+            tracemalloc.start()
+            result = run(target)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            check = written == expected[0] and _exported_rows(target, fmt) == expected[0]
+            if isinstance(result, int):
+                stats = None
+            else:
+                stats = result
+                check = check and stats.categories['HIGH'] == expected[2] and abs(stats.average_score - expected[1]) < 1e-6
+            print(f"{label:<18} {elapsed:<9.2f} {written / elapsed:<11,.0f} {peak / 2**20:<10.1f} "
+                  f"{os.path.getsize(target) / 2**20:<10.1f} {check}")
+        conn.close()
+    print("="*70)
+
+def bench_dataset(rows, changed, batch_size):
+    """Partitioned Parquet dataset: pruned reads of one slice vs the single-file export, and a delta snapshot"""
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    import replica
+    import risk_export
+
+    print("\n" + "="*70)
+    print(f"DATASET BENCHMARK: {rows:,} data product rows, {changed:,} updated for the delta snapshot")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        conn = replica.connect(f"{path}/curate.db", create=True)
+        _fill_data_product(conn, rows)
+        root = f"{path}/dataset"
+        single = f"{path}/export.parquet"
+
+        _, single_elapsed = _timed(risk_export.export, conn, single, 'parquet', batch_size, progress=None)
+        full, full_elapsed = _timed(risk_export.export_dataset, conn, root, batch_size=batch_size, progress=None)
+        print(f"Single-file export:  {single_elapsed:.2f} s")
+        print(f"Dataset snapshot:    {full_elapsed:.2f} s, {full['rows']:,} rows in {len(full['files'])} files")
+
+        # one downstream slice: high-risk Python repositories scoring at least 95
+        partitions = {'DATA_SOURCE': 'git_hub', 'RISK_CATEGORY': 'HIGH', 'LANGUAGE': 'Python'}
+        expected = conn.execute("""
+            SELECT COUNT(*) FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+            WHERE RISK_CATEGORY = 'HIGH' AND LANGUAGE = 'Python' AND RISK_SCORE >= 95
+        """).fetchone()[0]
+
+        def whole_file():
+            table = pq.read_table(single)
+            mask = ds.field('RISK_CATEGORY') == 'HIGH'
+            return table.filter(mask & (ds.field('LANGUAGE') == 'Python') & (ds.field('RISK_SCORE') >= 95)).num_rows
+
+        def hive_dataset():
+            dataset = ds.dataset(root, format='parquet', partitioning='hive')
+            return dataset.to_table(filter=(ds.field('SNAPSHOT') == full['snapshot'])
+                                    & (ds.field('RISK_CATEGORY') == 'HIGH') & (ds.field('LANGUAGE') == 'Python')
+                                    & (ds.field('RISK_SCORE') >= 95)).num_rows
+
+        def manifest_files():
+            files = risk_export.dataset_files(root, partitions=partitions, ranges={'RISK_SCORE': (95, None)})
+            return sum(pq.read_table(file, filters=[('RISK_SCORE', '>=', 95)]).num_rows for file in files)
+
+        print("-"*70)
+        print(f"{'Slice read':<22} {'ms':<10} {'Rows':<10} {'Check'}")
+        print("-"*70)
+        for label, read in (('whole single file', whole_file), ('hive partitions', hive_dataset),
+                            ('manifest pruned', manifest_files)):
+            found, elapsed = min((_timed(read) for _ in range(3)), key=lambda result: result[1])
+            print(f"{label:<22} {elapsed*1000:<10.1f} {found:<10,} {found == expected}")
+
+        conn.execute("""
+            UPDATE CURATE.RISK_ANALYSIS_DATA_PRODUCT
+            SET RISK_SCORE = MIN(RISK_SCORE + 5, 100), LAST_UPDATED = '2025-02-01 00:00:00'
+            WHERE rowid % (? / ?) = 0
+        """, (rows, changed))
+        updated = conn.execute(
+            "SELECT COUNT(*) FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT WHERE LAST_UPDATED = '2025-02-01 00:00:00'"
+        ).fetchone()[0]
+        delta, delta_elapsed = _timed(risk_export.export_dataset, conn, root, incremental=True,
+                                      batch_size=batch_size, progress=None)
+        unchanged = risk_export.export_dataset(conn, root, incremental=True, progress=None)
+        snapshots = [entry['kind'] for entry in risk_export.read_manifest(root)['snapshots']]
+        print("-"*70)
+        print(f"Delta snapshot:      {delta_elapsed:.2f} s, {delta['rows']:,} rows ({updated:,} updated) "
+              f"in {len(delta['files'])} files, base {delta['base'] == full['snapshot']}")
+        print(f"Unchanged delta:     {'skipped' if unchanged is None else 'written'}; manifest snapshots {snapshots}")
+        conn.close()
+    print("="*70)
+
+def bench_reports(rows, names, missing):
+    """--report for a dependency list: one connection and query per name vs one batch lookup"""
+    import replica
+
+    rng = random.Random(0)
+    print("\n" + "="*70)
+    print(f"BATCH REPORT BENCHMARK: {names:,} names ({missing} unknown) against {rows:,} repositories")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        replica_path = f"{path}/replica.db"
+        conn = replica.connect(replica_path, create=True)
+        _fill_data_product(conn, rows)
+        conn.close()
+        requested = [f"User{x % 997}/Repo-{x}" for x in rng.sample(range(1, rows + 1), names - missing)]
+        requested += [f"nobody/missing-{i}" for i in range(missing)]
+        rng.shuffle(requested)
+
+        def per_name():
+            found = {}
+            for name in requested:
+                conn = replica.connect(replica_path)
+                row = conn.execute(risk_queries.REPORT_SQL, (name,)).fetchone()
+                conn.close()
+                if row:
+                    found[name.upper()] = row
+            return found
+
+        def batch():
+            conn = replica.connect(replica_path)
+            found = {}
+            for start in range(0, len(requested), risk_queries.REPORT_BATCH_SIZE):
+                chunk = requested[start:start + risk_queries.REPORT_BATCH_SIZE]
+                for row in conn.execute(risk_queries.batch_report_sql(len(chunk)), chunk).fetchall():
+                    found[row[0].upper()] = row[1:]
+            conn.close()
+            return found
+
+        single, single_elapsed = _timed(per_name)
+        batched, batch_elapsed = _timed(batch)
+        print(f"Per-name queries:    {single_elapsed*1000:8.1f} ms ({len(requested)} connections and statements)")
+        print(f"Batch lookup:        {batch_elapsed*1000:8.1f} ms "
+              f"({-(-len(requested) // risk_queries.REPORT_BATCH_SIZE)} statement(s) on one connection)")
+        print(f"Found {len(batched):,}, not found {len(requested) - len(batched)}; same rows: "
+              f"{ {name: tuple(row) for name, row in single.items()} == {name: tuple(row) for name, row in batched.items()} }")
+    print("="*70)
+
+def bench_deps(manifests, deps, packages, rows):
+    """Dependency scan of a monorepo: per-dependency reports and per-manifest lookups vs one shared scan"""
+    import os
+    import dependency_scan
+    import replica
+
+    rng = random.Random(0)
+    print("\n" + "="*70)
+    print(f"DEPENDENCY SCAN BENCHMARK: {manifests} manifests x {deps} deps from {packages:,} packages, "
+          f"{rows:,} repositories")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        replica_path = f"{path}/replica.db"
+        conn = replica.connect(replica_path, create=True)
+        _fill_data_product(conn, rows)
+        conn.close()
+
+        # pypi and npm packages mapped to data product repositories (10% unknown to CURATE)
+        pool = [('pypi' if i % 2 else 'npm', f"pkg-{i}") for i in range(packages)]
+        package_map = dependency_scan.PackageMap(f"{path}/map.db", offline=True)
+        package_map.store({key: f"user{(i + 1) % 997}/repo-{i + 1}" if i % 10 else f"nobody/gone-{i}"
+                           for i, key in enumerate(pool)})
+        for m in range(manifests):
+            chosen = rng.sample(pool, deps)
+            directory = f"{path}/repo/service-{m}"
+            os.makedirs(directory)
+            with open(f"{directory}/requirements.txt", 'w') as file:
+                file.write(''.join(f"{name}>=1.0\n" for ecosystem, name in chosen if ecosystem == 'pypi'))
+            with open(f"{directory}/package.json", 'w') as file:
+                json.dump({'dependencies': {name: '^1.0' for ecosystem, name in chosen if ecosystem == 'npm'}}, file)
+
+        # pinned git URLs, editable installs and PEP 508 direct references name their repository
+        url_forms = {
+            'git+https://github.com/psf/requests.git@v2.31.0#egg=requests': ('requests', 'psf/requests'),
+            '-e git+https://github.com/psf/black.git@23.1.0#egg=black': ('black', 'psf/black'),
+            'foo @ git+https://github.com/o/foo.git@v1': ('foo', 'o/foo'),
+            'bar[cli] @ https://github.com/o/bar/archive/v1.tar.gz ; python_version >= "3.8"': ('bar', 'o/bar'),
+            'qux @ https://example.com/qux-1.0.tar.gz': ('qux', None),
+        }
+        with open(f"{path}/url-requirements.txt", 'w') as file:
+            file.write(''.join(f"{line}\n" for line in url_forms))
+        parsed = [(name, repo) for _, name, repo in dependency_scan.parse_requirements(f"{path}/url-requirements.txt")]
+        print(f"Requirement URL forms parsed: {parsed == list(url_forms.values())}")
+
+        def per_dependency():
+            # one mapping lookup, connection and report statement per dependency of every manifest
+            found = {}
+            for manifest in dependency_scan.find_manifests([f"{path}/repo"]):
+                for ecosystem, package, _ in dependency_scan.parse_manifest(manifest):
+                    repo = package_map.conn.execute(
+                        "SELECT full_name FROM package_repos WHERE ecosystem = ? AND package = ?", (ecosystem, package)
+                    ).fetchone()[0]
+                    conn = replica.connect(replica_path)
+                    row = conn.execute(risk_queries.REPORT_SQL, (repo,)).fetchone()
+                    conn.close()
+                    found[(manifest, package)] = tuple(row) if row else None
+            return found
+
+        def per_manifest():
+            found = {}
+            for manifest in dependency_scan.find_manifests([f"{path}/repo"]):
+                result = dependency_scan.scan([manifest], lambda: replica.connect(replica_path), package_map)
+                for _, _, package, repo, row in ((manifest,) + dependency for dependency in result[manifest]):
+                    found[(manifest, package)] = row
+            return found
+
+        def shared_scan():
+            result = dependency_scan.scan([f"{path}/repo"], lambda: replica.connect(replica_path), package_map)
+            return {(manifest, package): row for manifest, dependencies in result.items()
+                    for _, package, _, row in dependencies}
+
+        baseline, _ = _timed(per_dependency)
+        print(f"{'Approach':<34} {'Seconds':<10} {'Same results'}")
+        print("-"*70)
+        for label, run in (('per-dependency --report', per_dependency), ('per-manifest batch lookup', per_manifest),
+                           ('shared scan (one lookup)', shared_scan)):
+            found, elapsed = _timed(run)
+            print(f"{label:<34} {elapsed:<10.2f} {found == baseline}")
+        scored = sum(1 for row in baseline.values() if row)
+        print("-"*70)
+        print(f"{len(baseline):,} manifest dependencies, {scored:,} scored")
+        package_map.close()
+    print("="*70)
+
+def bench_service(rows, requests, clients, interval):
+    """Risk service: per-lookup connections vs keep-alive HTTP against the in-memory index, and its refresh"""
+    import http.client
+    import replica
+    import risk_service
+
+    rng = random.Random(0)
+    print("\n" + "="*70)
+    print(f"RISK SERVICE BENCHMARK: {rows:,} repositories, {requests:,} requests from {clients} clients")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        replica_path = f"{path}/replica.db"
+        conn = replica.connect(replica_path, create=True)
+        _fill_data_product(conn, rows)
+
+        service = risk_service.RiskService(lambda: replica.connect(replica_path), interval)
+        _, load_elapsed = _timed(service.refresh)
+        _, check_elapsed = _timed(service.refresh)
+        service._thread = threading.Thread(target=service._run, daemon=True)
+        service._thread.start()
+        server = risk_service.create_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Initial load:        {load_elapsed:8.2f} s")
+        print(f"Unchanged check:     {check_elapsed * 1000:8.1f} ms (watermark, count and key hash)")
+
+        names = [f"user{x % 997}/repo-{x}" for x in rng.sample(range(1, rows + 1), 1000)]
+
+        def per_lookup():
+            for name in names:
+                conn = replica.connect(replica_path)
+                conn.execute(risk_queries.REPORT_SQL, (name,)).fetchone()
+                conn.close()
+
+        _, direct_elapsed = _timed(per_lookup)
+
+        # mostly single lookups, plus batches, top-N and rollups
+        mix = ([('GET', f"/repos/{name}", None) for name in names[:70]]
+               + [('POST', '/repos', json.dumps({'repos': names[i:i + 50]})) for i in range(0, 500, 50)]
+               + [('GET', f"/top?n=25&order={order}", None) for order in ('risky', 'healthy')] * 4
+               + [('GET', '/top?n=10&language=Python', None)] * 2
+               + [('GET', '/languages', None)] * 5 + [('GET', '/summary', None)] * 5)
+        latencies, failures = [], []
+
+        def client(count, seed):
+            local_rng = random.Random(seed)
+            session = http.client.HTTPConnection('127.0.0.1', server.server_port)
+            samples = []
+            for _ in range(count):
+                method, url, body = local_rng.choice(mix)
+                start = time.perf_counter()
+                session.request(method, url, body, {'Content-Type': 'application/json'} if body else {})
+                response = session.getresponse()
+                response.read()
+                samples.append(time.perf_counter() - start)
+                if response.status != 200:
+                    failures.append((url, response.status))
+            session.close()
+            latencies.extend(samples)
+
+        threads = [threading.Thread(target=client, args=(requests // clients, i)) for i in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        p50, p90, p99 = (sorted(latencies)[min(len(latencies) - 1, len(latencies) * q // 100)] * 1000 for q in (50, 90, 99))
+        print(f"Per-lookup connect:  {direct_elapsed / len(names) * 1000:8.3f} ms per repository")
+        print(f"Service:             {len(latencies) / elapsed:8,.0f} req/s; client p50 {p50:.3f} ms, "
+              f"p90 {p90:.3f} ms, p99 {p99:.3f} ms; {len(failures)} failed")
+        print("-"*70)
+        print(f"{'Endpoint':<12} {'Count':<8} {'p50 ms':<9} {'p90 ms':<9} {'p99 ms':<9} {'max ms'}")
+        for endpoint, entry in service.stats()['endpoints'].items():
+            print(f"{endpoint:<12} {entry['count']:<8} {entry['p50_ms']:<9} {entry['p90_ms']:<9} "
+                  f"{entry['p99_ms']:<9} {entry['max_ms']}")
+        print("-"*70)
+
+        def fetch(url):
+            session = http.client.HTTPConnection('127.0.0.1', server.server_port)
+            session.request('GET', url)
+            response = session.getresponse()
+            payload = json.loads(response.read())
+            session.close()
+            return response.status, payload
+
+        def post(body):
+            session = http.client.HTTPConnection('127.0.0.1', server.server_port)
+            session.request('POST', '/repos', body, {'Content-Type': 'application/json'})
+            status = session.getresponse().status
+            session.close()
+            return status
+
+        bad_bodies = ['[]', '"user1/repo-1"', '{"repos": "user1/repo-1"}', '{"repos": [1]}', 'not json']
+        rejected = sum(1 for body in bad_bodies if post(body) == 400)
+        print(f"Malformed POST /repos bodies rejected with 400: {rejected}/{len(bad_bodies)}")
+
+        def wait_for(kind, count):
+            deadline = time.time() + interval * 10
+            while service.refreshes[kind] < count and time.time() < deadline:
+                time.sleep(interval / 10)
+
+        # rescored and added repositories come in through a delta; deleted or renamed ones force a full reload
+        updated = names[:100]
+        conn.executemany("UPDATE CURATE.RISK_ANALYSIS_DATA_PRODUCT SET RISK_SCORE = 99.99, "
+                         "LAST_UPDATED = '2025-02-01 00:00:00' WHERE DATA_SOURCE = 'git_hub' AND FULL_NAME = ?",
+                         [(name,) for name in updated])
+        conn.commit()
+        wait_for('delta', 1)
+        rescored = sum(1 for name in updated if fetch(f"/repos/{name}")[1]['risk_score'] == 99.99)
+        print(f"Delta refresh:       {service.last_duration * 1000:8.1f} ms, {rescored}/{len(updated)} rescored rows served")
+        conn.executemany("DELETE FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT WHERE DATA_SOURCE = 'git_hub' AND FULL_NAME = ?",
+                         [(name,) for name in names[100:110]])
+        conn.commit()
+        wait_for('full', 2)
+        removed = sum(1 for name in names[100:110] if fetch(f"/repos/{name}")[0] == 404)
+        print(f"Full reload:         {service.last_duration * 1000:8.1f} ms, {removed}/10 deleted rows gone")
+        conn.executemany("""
+            INSERT INTO CURATE.RISK_ANALYSIS_DATA_PRODUCT
+            SELECT data_source, full_name || '-fork', language, stars, commits_90d, active_contributors_90d,
+                   days_since_last_release, open_issues, risk_score, risk_category, '2025-03-01 00:00:00'
+            FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT WHERE data_source = 'git_hub' AND full_name = ?
+        """, [(name,) for name in names[110:120]])
+        conn.commit()
+        wait_for('delta', 2)
+        added = sum(1 for name in names[110:120] if fetch(f"/repos/{name}-fork")[0] == 200)
+        print(f"Delta with new repos: {service.last_duration * 1000:7.1f} ms, {added}/10 added rows served")
+        # a rename keeps the count and LAST_UPDATED, so only the key hash changes
+        conn.executemany("UPDATE CURATE.RISK_ANALYSIS_DATA_PRODUCT SET full_name = full_name || '-renamed' "
+                         "WHERE data_source = 'git_hub' AND full_name = ?", [(name,) for name in names[120:130]])
+        conn.commit()
+        wait_for('full', 3)
+        renamed = sum(1 for name in names[120:130] if fetch(f"/repos/{name}-renamed")[0] == 200)
+        print(f"Full reload:         {service.last_duration * 1000:8.1f} ms, {renamed}/10 renamed rows served; "
+              f"rows {fetch('/summary')[1]['total_repos']:,}; refreshes {dict(service.refreshes)}")
+
+        server.shutdown()
+        server.server_close()
+        service.stop()
+        conn.close()
+    print("="*70)
+
+def bench_startup(rows, repeats):
+    """risk_analysis.py wall time per command: eager pandas import, lazy imports (cold), and the warm daemon"""
+    import os
+    import statistics
+    import subprocess
+    import sys
+    import replica
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_analysis.py')
+    daemon_script = os.path.join(os.path.dirname(script), 'risk_daemon.py')
+    # the module as it was before its imports were deferred: pandas and numpy loaded up front
+    eager = ['-c', 'import runpy, sys, numpy, pandas; sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name="__main__")']
+
+    print("\n" + "="*70)
+    print(f"STARTUP BENCHMARK: {rows:,} repositories in the replica, median of {repeats} runs")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as path:
+        replica_path = f"{path}/replica.db"
+        conn = replica.connect(replica_path, create=True)
+        _fill_data_product(conn, rows)
+        conn.close()
+        commands = [
+            ('--help', ['--help']),
+            ('--score', ['--score', '1200', '35', '4', '120', '12']),
+            ('--report', ['--report', 'user1/repo-1', '--replica', replica_path]),
+            ('--summary', ['--summary', '--replica', replica_path]),
+            ('--all --no-cache', ['--all', '--replica', replica_path, '--no-cache']),
+        ]
+        env = dict(os.environ, RISK_ANALYSIS_DAEMON_SOCKET=f"{path}/daemon.sock", PYTHONPATH=os.path.dirname(script))
+
+        def timed_run(argv, daemon):
+            run_env = dict(env, RISK_ANALYSIS_DAEMON='1' if daemon else '0')
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable] + argv, cwd=path, env=run_env, capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            if result.returncode != 0:
+                raise RuntimeError(f"{' '.join(argv)} failed: {result.stderr or result.stdout}")
+            # the banner carries the current time
+            return elapsed, [line for line in result.stdout.splitlines() if 'Time:' not in line]
+
+        def median_run(argv, daemon):
+            runs = [timed_run(argv, daemon) for _ in range(repeats)]
+            return statistics.median(elapsed for elapsed, _ in runs), runs[-1][1]
+
+        cold = {label: median_run([script] + argv, False) for label, argv in commands}
+        before = {label: median_run(eager + [script] + argv, False) for label, argv in commands}
+        subprocess.run([sys.executable, daemon_script, 'start', '--idle-timeout', '0'], cwd=path, env=env,
+                       check=True, capture_output=True)
+        try:
+            warm = {label: median_run([script] + argv, True) for label, argv in commands}
+            # a caller pointed at another database must not get the daemon's answer
+            other = subprocess.run([sys.executable, script] + commands[2][1], cwd=path, capture_output=True, text=True,
+                                   env=dict(env, SNOWFLAKE_DATABASE='OTHER_DB', RISK_ANALYSIS_DAEMON='1'))
+            sent_back = 'SNOWFLAKE_DATABASE' in other.stderr and other.returncode == 0
+        finally:
+            subprocess.run([sys.executable, daemon_script, 'stop'], cwd=path, env=env, capture_output=True)
+
+        print(f"{'Command':<20} {'Eager ms':<10} {'Cold ms':<10} {'Warm ms':<10} {'Same output'}")
+        print("-"*70)
+        for label, _ in commands:
+            print(f"{label:<20} {before[label][0]*1000:<10.1f} {cold[label][0]*1000:<10.1f} "
+                  f"{warm[label][0]*1000:<10.1f} {warm[label][1] == cold[label][1] == before[label][1]}")
+        interpreter = statistics.median(timed_run(['-c', 'pass'], False)[0] for _ in range(repeats))
+        print("-"*70)
+        print(f"Bare interpreter start: {interpreter*1000:.1f} ms; no Snowflake login in any column "
+              f"(the daemon also saves that for non-replica commands)")
+        print(f"Caller with another SNOWFLAKE_DATABASE runs the command itself: {sent_back}")
+    print("="*70)
+
+def main():
+    parser = argparse.ArgumentParser(description='Local pipeline benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    stream_parser = subparsers.add_parser('stream', help='Full vs stream-delta pipeline run')
+    stream_parser.add_argument('--repos', type=int, default=50000, help='Repositories already loaded')
+    stream_parser.add_argument('--delta', type=int, default=500, help='Repositories in the new stream delta')
+
+    linkmap_parser = subparsers.add_parser('linkmap', help='ENRICH cost and LINKMAP size over many runs')
+    linkmap_parser.add_argument('--repos', type=int, default=20000, help='Repositories already loaded')
+    linkmap_parser.add_argument('--delta', type=int, default=500, help='Repositories changed per run')
+    linkmap_parser.add_argument('--runs', type=int, default=200, help='Pipeline runs to simulate')
+    linkmap_parser.add_argument('--retain', type=int, default=3, help='LINKMAP batches kept by retention')
+
+    graph_parser = subparsers.add_parser('graph', help='Sequential vs task-graph pipeline run')
+    graph_parser.add_argument('--repos', type=int, default=50000, help='Repositories in the backfill')
+    graph_parser.add_argument('--workers', type=int, default=4, help='Concurrent graph nodes')
+
+    stage_parser = subparsers.add_parser('stage', help='Multi-scan vs single-pass STAGE validation')
+    stage_parser.add_argument('--rows', type=int, default=10000000, help='RAW repository rows')
+
+    score_parser = subparsers.add_parser('score', help='Vectorized vs SQL risk scoring')
+    score_parser.add_argument('--rows', type=int, default=1000000, help='Rows to score')
+
+    fingerprint_parser = subparsers.add_parser('fingerprint', help='Rescore-all vs fingerprint-skipping CURATE')
+    fingerprint_parser.add_argument('--repos', type=int, default=50000, help='Repositories re-delivered')
+    fingerprint_parser.add_argument('--changed', type=int, default=500, help='Repositories with new inputs')
+
+    history_parser = subparsers.add_parser('history', help='Risk history size over many runs')
+    history_parser.add_argument('--repos', type=int, default=20000, help='Repositories re-delivered per run')
+    history_parser.add_argument('--delta', type=int, default=500, help='Repositories changed per run')
+    history_parser.add_argument('--runs', type=int, default=50, help='Pipeline runs to simulate')
+
+    contributors_parser = subparsers.add_parser('contributors', help='Re-aggregated vs maintained contributor counts')
+    contributors_parser.add_argument('--repos', type=int, default=20000, help='Repositories already loaded')
+    contributors_parser.add_argument('--delta', type=int, default=500, help='Repositories changed per run')
+    contributors_parser.add_argument('--runs', type=int, default=50, help='Contributor loads to simulate')
+
+    sketch_parser = subparsers.add_parser('sketch', help='Exact vs HyperLogLog distinct contributor counts')
+    sketch_parser.add_argument('--events', type=int, default=2000000, help='Contributor events in the firehose')
+    sketch_parser.add_argument('--repos', type=int, default=2000, help='Repositories receiving events')
+    sketch_parser.add_argument('--shards', type=int, default=8, help='Shards counted independently, then merged')
+    sketch_parser.add_argument('--error', type=float, default=0.01, help='HyperLogLog relative error bound')
+
+    monitoring_parser = subparsers.add_parser('monitoring', help='Re-aggregated vs recorded layer metrics')
+    monitoring_parser.add_argument('--repos', type=int, default=50000, help='Repositories already loaded')
+    monitoring_parser.add_argument('--delta', type=int, default=500, help='Repositories changed per run')
+    monitoring_parser.add_argument('--runs', type=int, default=3, help='Pipeline runs to simulate')
+
+    exporter_parser = subparsers.add_parser('exporter', help='Exporter scrape latency and refresh')
+    exporter_parser.add_argument('--repos', type=int, default=50000, help='Repositories in the local pipeline')
+    exporter_parser.add_argument('--scrapes', type=int, default=200, help='Scrapes to time')
+    exporter_parser.add_argument('--interval', type=float, default=0.5, help='Exporter refresh interval in seconds')
+
+    instrumentation_parser = subparsers.add_parser('instrumentation', help='Loader instrumentation overhead')
+    instrumentation_parser.add_argument('--events', type=int, default=200000, help='Events in the synthetic archive')
+    instrumentation_parser.add_argument('--repeats', type=int, default=5, help='Timed repeats (best is reported)')
+
+    trace_parser = subparsers.add_parser('trace', help='Query tracing overhead and per-stage report')
+    trace_parser.add_argument('--repos', type=int, default=50000, help='Repositories already loaded')
+    trace_parser.add_argument('--delta', type=int, default=500, help='Repositories in the new stream delta')
+
+    dashboard_parser = subparsers.add_parser('dashboard', help='Separate vs combined --all dashboard queries')
+    dashboard_parser.add_argument('--repos', type=int, default=50000, help='Repositories in CURATE')
+    dashboard_parser.add_argument('--limit', type=int, default=15, help='Riskiest and healthiest repositories shown')
+    dashboard_parser.add_argument('--repeats', type=int, default=5, help='Timed repeats (best is reported)')
+
+    cache_parser = subparsers.add_parser('cache', help='Direct vs cached CLI reads and invalidation')
+    cache_parser.add_argument('--repos', type=int, default=50000, help='Repositories in CURATE')
+    cache_parser.add_argument('--delta', type=int, default=500, help='Repositories changed by the invalidating load')
+    cache_parser.add_argument('--repeats', type=int, default=5, help='Timed repeats (best is reported)')
+
+    replica_parser = subparsers.add_parser('replica', help='Replica sync and report latency on the replica')
+    replica_parser.add_argument('--repos', type=int, default=50000, help='Repositories in CURATE')
+    replica_parser.add_argument('--delta', type=int, default=500, help='Repositories changed before the incremental sync')
+    replica_parser.add_argument('--repeats', type=int, default=5, help='Timed repeats (best is reported)')
+
+    search_parser = subparsers.add_parser('search', help='LIKE scan vs trigram-indexed repository search')
+    search_parser.add_argument('--repos', type=int, default=200000, help='Repositories in the index')
+    search_parser.add_argument('--delta', type=int, default=1000, help='Repositories added and removed incrementally')
+    search_parser.add_argument('--lookups', type=int, default=200, help='Lookups timed per kind')
+
+    export_parser = subparsers.add_parser('export', help='Whole-table DataFrame export vs streaming export formats')
+    export_parser.add_argument('--rows', type=int, default=1000000, help='Data product rows exported')
+    export_parser.add_argument('--batch-size', type=int, default=50000, help='Rows fetched per batch')
+
+    dataset_parser = subparsers.add_parser('dataset', help='Partitioned Parquet dataset reads and delta snapshots')
+    dataset_parser.add_argument('--rows', type=int, default=1000000, help='Data product rows exported')
+    dataset_parser.add_argument('--changed', type=int, default=10000, help='Rows updated before the delta snapshot')
+    dataset_parser.add_argument('--batch-size', type=int, default=50000, help='Rows fetched per batch')
+
+    reports_parser = subparsers.add_parser('reports', help='Per-name --report queries vs one batch lookup')
+    reports_parser.add_argument('--rows', type=int, default=1000000, help='Repositories in the data product')
+    reports_parser.add_argument('--names', type=int, default=500, help='Repository names requested')
+    reports_parser.add_argument('--missing', type=int, default=20, help='Requested names not in the data product')
+
+    deps_parser = subparsers.add_parser('deps', help='Dependency scan: per-dependency and per-manifest lookups vs one scan')
+    deps_parser.add_argument('--manifests', type=int, default=300, help='Services, each with a requirements.txt and package.json')
+    deps_parser.add_argument('--deps', type=int, default=40, help='Dependencies per service')
+    deps_parser.add_argument('--packages', type=int, default=2000, help='Distinct packages across the monorepo')
+    deps_parser.add_argument('--rows', type=int, default=300000, help='Repositories in the data product')
+
+    service_parser = subparsers.add_parser('service', help='Per-lookup connections vs the in-memory risk service')
+    service_parser.add_argument('--rows', type=int, default=300000, help='Repositories in the data product')
+    service_parser.add_argument('--requests', type=int, default=20000, help='Requests issued across all clients')
+    service_parser.add_argument('--clients', type=int, default=8, help='Concurrent keep-alive clients')
+    service_parser.add_argument('--interval', type=float, default=0.5, help='Seconds between watermark checks')
+
+    startup_parser = subparsers.add_parser('startup', help='risk_analysis.py startup: eager imports vs lazy imports vs the warm daemon')
+    startup_parser.add_argument('--rows', type=int, default=100000, help='Repositories in the replica')
+    startup_parser.add_argument('--repeats', type=int, default=7, help='Runs per command and mode (median reported)')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'stream':
+        bench_stream(args.repos, args.delta)
+    elif args.benchmark == 'linkmap':
+        bench_linkmap(args.repos, args.delta, args.runs, args.retain)
+    elif args.benchmark == 'graph':
+        bench_graph(args.repos, args.workers)
+    elif args.benchmark == 'stage':
+        bench_stage(args.rows)
+    elif args.benchmark == 'score':
+        bench_score(args.rows)
+    elif args.benchmark == 'fingerprint':
+        bench_fingerprint(args.repos, args.changed)
+    elif args.benchmark == 'history':
+        bench_history(args.repos, args.delta, args.runs)
+    elif args.benchmark == 'contributors':
+        bench_contributors(args.repos, args.delta, args.runs)
+    elif args.benchmark == 'sketch':
+        bench_sketch(args.events, args.repos, args.shards, args.error)
+    elif args.benchmark == 'monitoring':
+        bench_monitoring(args.repos, args.delta, args.runs)
+    elif args.benchmark == 'exporter':
+        bench_exporter(args.repos, args.scrapes, args.interval)
+    elif args.benchmark == 'instrumentation':
+        bench_instrumentation(args.events, args.repeats)
+    elif args.benchmark == 'trace':
+        bench_trace(args.repos, args.delta)
+    elif args.benchmark == 'dashboard':
+        bench_dashboard(args.repos, args.limit, args.repeats)
+    elif args.benchmark == 'cache':
+        bench_cache(args.repos, args.delta, args.repeats)
+    elif args.benchmark == 'replica':
+        bench_replica(args.repos, args.delta, args.repeats)
+    elif args.benchmark == 'search':
+        bench_search(args.repos, args.delta, args.lookups)
+    elif args.benchmark == 'export':
+        bench_export(args.rows, args.batch_size)
+    elif args.benchmark == 'dataset':
+        bench_dataset(args.rows, args.changed, args.batch_size)
+    elif args.benchmark == 'reports':
+        bench_reports(args.rows, args.names, args.missing)
+    elif args.benchmark == 'deps':
+        bench_deps(args.manifests, args.deps, args.packages, args.rows)
+    elif args.benchmark == 'service':
+        bench_service(args.rows, args.requests, args.clients, args.interval)
+    elif args.benchmark == 'startup':
+        bench_startup(args.rows, args.repeats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import profiling
+import query_trace
+import replica
+import risk_export
+import risk_queries
+
+load_dotenv()
+
+# Risk of a project's dependencies. Manifests (requirements*.txt, pyproject.toml,
+# package.json, go.mod, Cargo.toml, Gemfile) are found under the given paths and parsed
+# in parallel. Each package is resolved to its GitHub repository once per scan, however
+# many manifests use it: go modules and git URLs name the repository directly, other
+# packages go through a local SQLite mapping (package -> owner/repo) filled from the
+# package registries on a miss and reused across scans. The scores of every resolved
+# repository are then read from CURATE in one batch lookup.
+
+DEFAULT_MAP_PATH = '.dependency_map.db'
+RESOLVED_TTL_DAYS = 30
+UNRESOLVED_TTL_DAYS = 1
+DEFAULT_WORKERS = 8
+REGISTRY_TIMEOUT = 10
+
+SKIP_DIRS = {'.git', 'node_modules', 'vendor', '.venv', 'venv', '__pycache__', 'site-packages', 'target', 'dist'}
+
+MAP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS package_repos (
+        ecosystem TEXT NOT NULL,
+        package TEXT NOT NULL,
+        full_name TEXT,
+        resolved_at REAL NOT NULL,
+        PRIMARY KEY (ecosystem, package)
+    )
+    """,
+]
+
+SCAN_COLUMNS = ['MANIFEST', 'ECOSYSTEM', 'PACKAGE'] + risk_queries.REPO_COLUMNS + ['LAST_UPDATED']
+
+GITHUB_REPO = re.compile(r'github\.com[/:]([A-Za-z0-9_.-]+)/([A-Za-z0-9_.-]+?)(?:\.git)?(?:[/#?@]|$)')
+# PEP 508 direct reference: name [extras] @ url [; marker]
+DIRECT_REFERENCE = re.compile(r'([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*@\s*([^\s;]+)')
+
+def get_connection():
+    import snowflake.connector
+
+    return query_trace.traced(snowflake.connector.connect(
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        role=os.getenv("SNOWFLAKE_ROLE"),
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        database=os.getenv("SNOWFLAKE_DATABASE")
+    ))
+
+# github.com paths that are not repositories (e.g. a "Funding" project URL)
+NOT_OWNERS = {'sponsors', 'orgs', 'apps', 'marketplace', 'features', 'topics'}
+
+def github_repo(url):
+    """owner/repo of a GitHub URL, or None"""
+    match = GITHUB_REPO.search(url or '')
+    if not match or match.group(1).lower() in NOT_OWNERS:
+        return None
+    return f"{match.group(1)}/{match.group(2)}"
+
+# --- manifests ------------------------------------------------------------------------
+
+def _pypi_name(requirement):
+    """Normalized project name of a PEP 508 requirement (PEP 503: lower case, runs of -_. as -)"""
+    match = re.match(r'\s*([A-Za-z0-9][A-Za-z0-9._-]*)', requirement)
+    return re.sub(r'[-_.]+', '-', match.group(1)).lower() if match else None
+
+def parse_requirements(path, seen=None):
+    seen = seen if seen is not None else set()
+    if os.path.abspath(path) in seen:
+        return []
+    seen.add(os.path.abspath(path))
+    dependencies = []
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for line in file:
+            line = line.split(' #', 1)[0].strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith(('-r ', '--requirement ')):
+                included = os.path.join(os.path.dirname(path), line.split(None, 1)[1])
+                if os.path.exists(included):
+                    dependencies += parse_requirements(included, seen)
+                continue
+            if line.startswith('-e '):
+                line = line[3:].strip()
+            elif line.startswith('-'):
+                continue
+            direct = DIRECT_REFERENCE.match(line)
+            url = direct.group(2) if direct else line
+            if '://' in url or url.startswith('git+'):
+                # a URL: the repository comes from it, the name from `name @` or #egg= when given
+                repo = github_repo(url)
+                if direct:
+                    name = direct.group(1)
+                elif '#egg=' in url:
+                    name = re.split(r'[&\s]', url.split('#egg=', 1)[1])[0]
+                else:
+                    name = repo.split('/')[1] if repo else None
+                if name:
+                    dependencies.append(('pypi', _pypi_name(name) or name, repo))
+            else:
+                name = _pypi_name(line)
+                if name:
+                    dependencies.append(('pypi', name, None))
+    return dependencies
+
+def _load_toml(path):
+    import tomllib
+
+    with open(path, 'rb') as file:
+        return tomllib.load(file)
+
+def parse_pyproject(path):
+    data = _load_toml(path)
+    requirements = list(data.get('project', {}).get('dependencies', []))
+    for extra in data.get('project', {}).get('optional-dependencies', {}).values():
+        requirements += extra
+    poetry = data.get('tool', {}).get('poetry', {})
+    requirements += [name for name in poetry.get('dependencies', {}) if name.lower() != 'python']
+    return [('pypi', _pypi_name(requirement), None) for requirement in requirements if _pypi_name(requirement)]
+
+def parse_package_json(path):
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+    dependencies = []
+    for section in ('dependencies', 'devDependencies', 'optionalDependencies', 'peerDependencies'):
+        for name, spec in (data.get(section) or {}).items():
+            spec = spec if isinstance(spec, str) else ''
+            repo = github_repo(spec)
+            if repo is None and spec.startswith('github:'):
+                repo = spec[len('github:'):].split('#', 1)[0]
+            elif repo is None and re.fullmatch(r'[A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+(#.*)?', spec):
+                repo = spec.split('#', 1)[0]
+            dependencies.append(('npm', name, repo))
+    return dependencies
+
+# go modules hosted elsewhere whose source lives on GitHub
+GO_VANITY = [
+    (re.compile(r'golang\.org/x/([^/]+)'), 'golang/{0}'),
+    (re.compile(r'gopkg\.in/(?:([^/]+)/)?([^/.]+)\.v\d+'), None),
+    (re.compile(r'google\.golang\.org/grpc'), 'grpc/grpc-go'),
+    (re.compile(r'google\.golang\.org/protobuf'), 'protocolbuffers/protobuf-go'),
+    (re.compile(r'k8s\.io/([^/]+)'), 'kubernetes/{0}'),
+    (re.compile(r'sigs\.k8s\.io/([^/]+)'), 'kubernetes-sigs/{0}'),
+]
+
+def go_repo(module):
+    """owner/repo of a go module path, when it can be told from the path alone"""
+    if module.startswith('github.com/'):
+        parts = module.split('/')
+        return f"{parts[1]}/{parts[2]}" if len(parts) >= 3 else None
+    for pattern, template in GO_VANITY:
+        match = pattern.match(module)
+        if match and template:
+            return template.format(*match.groups())
+        if match:
+            owner, name = match.groups()
+            # gopkg.in/yaml.v3 -> go-yaml/yaml, gopkg.in/owner/name.v1 -> owner/name
+            return f"{owner}/{name}" if owner else f"go-{name}/{name}"
+    return None
+
+def parse_go_mod(path):
+    dependencies = []
+    in_require = False
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.split('//', 1)[0].strip()
+            if line.startswith('require ('):
+                in_require = True
+                continue
+            if in_require and line == ')':
+                in_require = False
+                continue
+            if line.startswith('require '):
+                line = line[len('require '):]
+            elif not in_require:
+                continue
+            parts = line.split()
+            if len(parts) >= 2:
+                dependencies.append(('go', parts[0], go_repo(parts[0])))
+    return dependencies
+
+def parse_cargo_toml(path):
+    data = _load_toml(path)
+    dependencies = []
+    for section in ('dependencies', 'dev-dependencies', 'build-dependencies'):
+        for name, spec in data.get(section, {}).items():
+            repo = github_repo(spec.get('git')) if isinstance(spec, dict) else None
+            package = spec.get('package', name) if isinstance(spec, dict) else name
+            dependencies.append(('crates', package, repo))
+    return dependencies
+
+def parse_gemfile(path):
+    dependencies = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            match = re.match(r"""\s*gem\s+['"]([^'"]+)['"](.*)""", line)
+            if match:
+                repo = re.search(r"""github:\s*['"]([^'"]+)['"]""", match.group(2))
+                dependencies.append(('rubygems', match.group(1), repo.group(1) if repo else None))
+    return dependencies
+
+def manifest_parser(filename):
+    """The parser for a manifest file name, or None"""
+    if re.fullmatch(r'requirements.*\.txt', filename):
+        return parse_requirements
+    return {
+        'pyproject.toml': parse_pyproject,
+        'package.json': parse_package_json,
+        'go.mod': parse_go_mod,
+        'Cargo.toml': parse_cargo_toml,
+        'Gemfile': parse_gemfile,
+    }.get(filename)
+
+def find_manifests(paths):
+    """Manifest files among paths (files, or directories searched recursively)"""
+    manifests = []
+    for path in paths:
+        if os.path.isfile(path):
+            manifests.append(path)
+            continue
+        for directory, subdirectories, filenames in os.walk(path):
+            subdirectories[:] = sorted(name for name in subdirectories if name not in SKIP_DIRS)
+            manifests += [os.path.join(directory, name) for name in sorted(filenames) if manifest_parser(name)]
+    return manifests
+
+def parse_manifest(path):
+    """[(ecosystem, package, owner/repo or None)] of one manifest, without duplicates"""
+    parser = manifest_parser(os.path.basename(path))
+    if parser is None:
+        raise ValueError(f"Not a supported manifest: {path}")
+    return list(dict.fromkeys(parser(path)))
+
+# --- package -> repository mapping ----------------------------------------------------
+
+def _http_json(url):
+    import requests
+
+    response = requests.get(url, timeout=REGISTRY_TIMEOUT, headers={'User-Agent': 'risk-dependency-scan'})
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+def _first_repo(*urls):
+    for url in urls:
+        repo = github_repo(url) if isinstance(url, str) else None
+        if repo:
+            return repo
+    return None
+
+def registry_repo(ecosystem, package):
+    """owner/repo a package registry lists as the package's source, or None"""
+    if ecosystem == 'pypi':
+        info = (_http_json(f"https://pypi.org/pypi/{package}/json") or {}).get('info') or {}
+        return _first_repo(*(info.get('project_urls') or {}).values(), info.get('home_page'))
+    if ecosystem == 'npm':
+        data = _http_json(f"https://registry.npmjs.org/{package}") or {}
+        repository = data.get('repository')
+        url = repository.get('url') if isinstance(repository, dict) else repository
+        return _first_repo(url, data.get('homepage'))
+    if ecosystem == 'crates':
+        crate = (_http_json(f"https://crates.io/api/v1/crates/{package}") or {}).get('crate') or {}
+        return _first_repo(crate.get('repository'), crate.get('homepage'))
+    if ecosystem == 'rubygems':
+        gem = _http_json(f"https://rubygems.org/api/v1/gems/{package}.json") or {}
+        return _first_repo(gem.get('source_code_uri'), gem.get('homepage_uri'))
+    if ecosystem == 'go':
+        return go_repo(package)
+    return None
+
+class PackageMap:
+    """Package -> GitHub repository mapping cached in SQLite; misses are resolved from the registries"""
+
+    def __init__(self, path=DEFAULT_MAP_PATH, offline=False, workers=DEFAULT_WORKERS):
+        self.path = path
+        self.offline = offline
+        self.workers = workers
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for statement in MAP_SCHEMA:
+            self.conn.execute(statement)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.resolved = 0
+        self.failed = 0
+
+    def close(self):
+        self.conn.close()
+
+    def _cached(self, packages):
+        now = time.time()
+        cached = {}
+        for ecosystem in sorted({ecosystem for ecosystem, _ in packages}):
+            names = [package for package_ecosystem, package in packages if package_ecosystem == ecosystem]
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                rows = self.conn.execute(f"""
+                    SELECT package, full_name, resolved_at FROM package_repos
+                    WHERE ecosystem = ? AND package IN ({', '.join('?' for _ in chunk)})
+                """, [ecosystem] + chunk).fetchall()
+                for package, full_name, resolved_at in rows:
+                    ttl = RESOLVED_TTL_DAYS if full_name else UNRESOLVED_TTL_DAYS
+                    if self.offline or now - resolved_at < ttl * 86400:
+                        cached[(ecosystem, package)] = full_name
+        return cached
+
+    def store(self, mapping):
+        """Record {(ecosystem, package): owner/repo or None}"""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("""
+                INSERT INTO package_repos (ecosystem, package, full_name, resolved_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (ecosystem, package) DO UPDATE SET
+                    full_name = excluded.full_name, resolved_at = excluded.resolved_at
+            """, [(ecosystem, package, full_name, time.time()) for (ecosystem, package), full_name in mapping.items()])
+            self.conn.execute("COMMIT")
+
+    def _resolve(self, key):
+        try:
+            return key, registry_repo(*key), True
+        except Exception:
+            # a registry outage must not be cached as "no repository"
+            return key, None, False
+
+    def resolve(self, packages):
+        """{(ecosystem, package): owner/repo or None} for every package, each looked up at most once"""
+        packages = sorted(set(packages))
+        mapping = self._cached(packages)
+        self.hits += len(mapping)
+        missing = [key for key in packages if key not in mapping]
+        if missing and not self.offline:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(self._resolve, missing))
+            found = {key: full_name for key, full_name, ok in results if ok}
+            self.store(found)
+            self.resolved += sum(1 for full_name in found.values() if full_name)
+            self.failed += len(missing) - len(found)
+            mapping.update(found)
+        return mapping
+
+    def import_csv(self, path):
+        """Seed the mapping from ecosystem,package,owner/repo lines; returns how many were read"""
+        import csv
+
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = [row for row in csv.reader(file) if len(row) >= 3 and not row[0].startswith('#')]
+        self.store({(ecosystem.strip(), package.strip()): full_name.strip() or None
+                    for ecosystem, package, full_name, *_ in rows})
+        return len(rows)
+
+# --- scan -----------------------------------------------------------------------------
+
+def lookup_scores(conn, repos):
+    """{UPPER(owner/repo): product row} for every repository found, one statement per batch"""
+    repos = sorted(set(repos))
+    scores = {}
+    cursor = conn.cursor()
+    for start in range(0, len(repos), risk_queries.REPORT_BATCH_SIZE):
+        chunk = repos[start:start + risk_queries.REPORT_BATCH_SIZE]
+        cursor.execute(risk_queries.batch_report_sql(len(chunk)), tuple(chunk))
+        for row in cursor.fetchall():
+            scores[row[0].upper()] = tuple(row[1:])
+    return scores
+
+def scan(paths, conn_factory, package_map, workers=DEFAULT_WORKERS):
+    """{manifest: [(ecosystem, package, owner/repo or None, product row or None)]} for the manifests under paths"""
+    manifests = find_manifests(paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parsed = dict(zip(manifests, pool.map(_parse_or_empty, manifests)))
+
+    # every package once, whichever manifests use it
+    packages = {(ecosystem, package) for dependencies in parsed.values()
+                for ecosystem, package, repo in dependencies if repo is None}
+    mapping = package_map.resolve(packages)
+    repos = {repo or mapping.get((ecosystem, package)) for dependencies in parsed.values()
+             for ecosystem, package, repo in dependencies}
+    repos.discard(None)
+
+    scores = {}
+    if repos:
+        conn = conn_factory()
+        try:
+            scores = lookup_scores(conn, repos)
+        finally:
+            conn.close()
+
+    results = {}
+    for manifest, dependencies in parsed.items():
+        results[manifest] = []
+        for ecosystem, package, repo in dependencies:
+            repo = repo or mapping.get((ecosystem, package))
+            results[manifest].append((ecosystem, package, repo, scores.get(repo.upper()) if repo else None))
+    return results
+
+def _parse_or_empty(path):
+    try:
+        return parse_manifest(path)
+    except Exception as e:
+        print(f"  skipped {path}: {e}", file=sys.stderr)
+        return []
+
+def print_scan(results, show=20):
+    print("\n" + "="*100)
+    print(f"DEPENDENCY RISK: {len(results)} manifests")
+    print("="*100)
+    print(f"{'Manifest':<50} {'Deps':<6} {'Scored':<7} {'High':<6} {'Medium':<7} {'Low':<6} {'Max score'}")
+    print("-"*100)
+    everything = {}
+    for manifest, dependencies in results.items():
+        scored = [row for _, _, _, row in dependencies if row]
+        categories = Counter(row[8] for row in scored)
+        highest = max((row[7] for row in scored), default=None)
+        name = manifest if len(manifest) <= 50 else '..' + manifest[-48:]
+        print(f"{name:<50} {len(dependencies):<6} {len(scored):<7} {categories['HIGH']:<6} "
+              f"{categories['MEDIUM']:<7} {categories['LOW']:<6} {'' if highest is None else f'{highest:.1f}'}")
+        for ecosystem, package, repo, row in dependencies:
+            everything.setdefault((ecosystem, package), (repo, row))
+
+    risky = sorted(((key, repo, row) for key, (repo, row) in everything.items() if row),
+                   key=lambda item: -item[2][7])
+    unresolved = sorted(key for key, (repo, _) in everything.items() if repo is None)
+    unscored = sorted(key for key, (repo, row) in everything.items() if repo and row is None)
+    print("="*100)
+    print(f"{len(everything)} distinct dependencies: {len(risky)} scored, {len(unscored)} not in CURATE, "
+          f"{len(unresolved)} without a known repository")
+
+    if risky:
+        print("\n" + "-"*100)
+        print(f"RISKIEST DEPENDENCIES (top {min(show, len(risky))})")
+        print("-"*100)
+        print(f"{'Package':<30} {'Repository':<40} {'Score':<8} {'Risk'}")
+        for (ecosystem, package), repo, row in risky[:show]:
+            print(f"{(ecosystem + ':' + package)[:29]:<30} {repo[:39]:<40} {row[7]:<8.1f} {row[8]}")
+    if unresolved:
+        print(f"\nWithout a known repository: {', '.join(f'{e}:{p}' for e, p in unresolved[:show])}"
+              + (f" (+{len(unresolved) - show} more)" if len(unresolved) > show else ""))
+    print("="*100)
+
+def scan_rows(results):
+    """Rows shaped like SCAN_COLUMNS, one per manifest dependency"""
+    blank = (None,) * (len(risk_queries.REPO_COLUMNS) + 1)
+    return [
+        (manifest, ecosystem, package) + (row if row else (repo,) + blank[1:])
+        for manifest, dependencies in results.items()
+        for ecosystem, package, repo, row in dependencies
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Risk of the dependencies declared in project manifests')
+    parser.add_argument('paths', nargs='*', default=['.'], help='Manifests, or directories searched for them (default: .)')
+    parser.add_argument('--replica', type=str, nargs='?', const=os.getenv("RISK_ANALYSIS_REPLICA", replica.DEFAULT_PATH),
+                        help='Read scores from the local replica instead of Snowflake')
+    parser.add_argument('--map', type=str, default=os.getenv("DEPENDENCY_MAP", DEFAULT_MAP_PATH),
+                        help=f'Package to repository mapping cache (default: DEPENDENCY_MAP or {DEFAULT_MAP_PATH})')
+    parser.add_argument('--import-map', type=str, metavar='CSV', help='Seed the mapping from ecosystem,package,owner/repo lines')
+    parser.add_argument('--offline', action='store_true', help='Only use the cached mapping, never query package registries')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Parallel manifest parsers and registry lookups')
+    parser.add_argument('--output', type=str, metavar='FILE', help='Also write one row per dependency to a CSV, JSONL or Parquet file')
+    parser.add_argument('--show', type=int, default=20, help='Riskiest dependencies listed')
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+
+    package_map = PackageMap(args.map, offline=args.offline, workers=args.workers)
+    try:
+        if args.import_map:
+            print(f"Imported {package_map.import_csv(args.import_map):,} mappings from '{args.import_map}'")
+        conn_factory = (lambda: replica.connect(args.replica)) if args.replica else get_connection
+        start = time.perf_counter()
+        results = scan(args.paths, conn_factory, package_map, args.workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        package_map.close()
+
+    print_scan(results, args.show)
+    print(f"Scanned in {elapsed:.2f}s: {package_map.hits:,} packages from the mapping cache, "
+          f"{package_map.resolved:,} resolved from registries, {package_map.failed:,} registry errors")
+    if args.output:
+        risk_export.write_rows(args.output, SCAN_COLUMNS, scan_rows(results))
+        print(f"✓ Wrote {sum(len(d) for d in results.values()):,} dependency rows to '{args.output}'")
+
+if __name__ == "__main__":
+    profiling.run_main(main, 'dependency_scan')
@@ -0,0 +1,163 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Per-stage timers, row counters and byte meters for the loaders. Off by default:
+# PIPELINE_INSTRUMENT=1 prints one JSON summary per run, PIPELINE_INSTRUMENT_FILE=path
+# appends it to a JSON-lines file instead. While disabled every meter is a shared no-op
+# object, so instrumented code pays one attribute lookup and an empty call per use.
+
+class StageMeter:
+    """Wall time, calls, rows and bytes of one stage; time it with `with meter:` or start()/stop()"""
+    __slots__ = ('name', 'calls', 'seconds', 'rows', 'bytes', '_start')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self._start
+        self.calls += 1
+        return False
+
+    def add(self, rows=0, nbytes=0):
+        self.rows += rows
+        self.bytes += nbytes
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self, rows=0, nbytes=0):
+        self.seconds += time.perf_counter() - self._start
+        self.calls += 1
+        self.rows += rows
+        self.bytes += nbytes
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'seconds': round(self.seconds, 6),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'rows_per_sec': round(self.rows / self.seconds, 1) if self.seconds else None,
+            'bytes_per_sec': round(self.bytes / self.seconds, 1) if self.seconds else None,
+        }
+
+class _NullMeter:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, rows=0, nbytes=0):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self, rows=0, nbytes=0):
+        pass
+
+NULL_METER = _NullMeter()
+
+class Recorder:
+    """Meters of one run, in the order their stages first ran"""
+
+    def __init__(self, output=None):
+        self.output = output
+        self.meters = {}
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+
+    def meter(self, name):
+        meter = self.meters.get(name)
+        if meter is None:
+            meter = self.meters[name] = StageMeter(name)
+        return meter
+
+    def summary(self, run):
+        return {
+            'run': run,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self._start, 6),
+            'stages': {name: meter.summary() for name, meter in self.meters.items()},
+        }
+
+_recorder = None
+
+def enable(output=None):
+    """Start recording; output is a JSON-lines path, or None to print the summary"""
+    global _recorder
+    _recorder = Recorder(output)
+    return _recorder
+
+def disable():
+    global _recorder
+    _recorder = None
+
+def enabled():
+    return _recorder is not None
+
+def meter(name):
+    """The stage's meter, or the shared no-op meter while disabled"""
+    if _recorder is None:
+        return NULL_METER
+    return _recorder.meter(name)
+
+def timed_iter(name, iterable, nbytes=len):
+    """Charge the time spent producing each item (e.g. decompressing lines) to a stage"""
+    if _recorder is None:
+        return iterable
+    return _timed_iter(_recorder.meter(name), iterable, nbytes)
+
+def _timed_iter(stage, iterable, nbytes):
+    iterator = iter(iterable)
+    stage.calls += 1
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            stage.seconds += time.perf_counter() - start
+            return
+        stage.seconds += time.perf_counter() - start
+        stage.rows += 1
+        stage.bytes += nbytes(item)
+        yield item
+
+def payload_bytes(rows):
+    """Approximate bytes of a batch of insert rows (only computed while enabled)"""
+    if _recorder is None:
+        return 0
+    return sum(len(str(value)) for row in rows for value in row if value is not None)
+
+def emit_summary(run):
+    """Write the run's JSON summary, if instrumentation is enabled"""
+    if _recorder is None:
+        return None
+    summary = _recorder.summary(run)
+    if _recorder.output:
+        with open(_recorder.output, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    return summary
+
+if os.getenv("PIPELINE_INSTRUMENT_FILE"):
+    enable(os.getenv("PIPELINE_INSTRUMENT_FILE"))
+elif os.getenv("PIPELINE_INSTRUMENT", "").lower() in ('1', 'true', 'yes'):
+    enable()
@@ -0,0 +1,192 @@
+import textwrap
+
+# Table-level counters behind CURATE.VW_RISK_ANALYSIS_PIPELINE_STATUS, kept in
+# ORCHESTRATION.LAYER_METRICS (one current row per layer, table, data source and metric), so
+# the monitoring view reads a handful of rows instead of re-aggregating every layer on every
+# query. Refreshing them takes one aggregate scan per table, so they are refreshed by their
+# own task every REFRESH_MINUTES rather than by the pipeline steps: an incremental tick then
+# costs only its delta. The same specs render the Snowflake procedures and the local
+# backend's upserts.
+
+REFRESH_MINUTES = 30
+
+# {table: (layer, source table, {metric: value expression}, {metric: timestamp expression})}
+LAYER_METRICS = {
+    'SRC_GIT_REPOSITORIES': ('RAW', 'RAW.SRC_GIT_REPOSITORIES', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {
+        'OLDEST_RECORD': "MIN(CREATED_AT)",
+        'NEWEST_RECORD': "MAX(CREATED_AT)",
+    }),
+    'SRC_GIT_REPO_CONTRIBUTORS': ('RAW', 'RAW.SRC_GIT_REPO_CONTRIBUTORS', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {}),
+    'SRC_GIT_REPO_COMMITS': ('RAW', 'RAW.SRC_GIT_REPO_COMMITS', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {}),
+    'SRC_GIT_REPO_ISSUES': ('RAW', 'RAW.SRC_GIT_REPO_ISSUES', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {}),
+    'SRC_GIT_REPO_RELEASES': ('RAW', 'RAW.SRC_GIT_REPO_RELEASES', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {}),
+    'STG_REPOSITORIES': ('STAGE', 'STAGE.STG_REPOSITORIES', {
+        'RECORD_COUNT': "COUNT(*)",
+        'VALID_RECORDS': "SUM(CASE WHEN VALID_FLAG = TRUE THEN 1 ELSE 0 END)",
+        'INVALID_RECORDS': "SUM(CASE WHEN VALID_FLAG = FALSE THEN 1 ELSE 0 END)",
+    }, {
+        'OLDEST_RECORD': "MIN(CREATED_AT)",
+        'NEWEST_RECORD': "MAX(CREATED_AT)",
+        'LAST_LOAD': "MAX(LOAD_TIMESTAMP)",
+    }),
+    'HUB_REPO_CONTRIBUTORS': ('LINKMAP', 'LINKMAP.HUB_REPO_CONTRIBUTORS', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {
+        'LAST_LOAD': "MAX(LOAD_TIMESTAMP)",
+    }),
+    'HUB_REPO_COMMITS': ('LINKMAP', 'LINKMAP.HUB_REPO_COMMITS', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {
+        'OLDEST_RECORD': "MIN(LAST_COMMIT_DATE)",
+        'NEWEST_RECORD': "MAX(LAST_COMMIT_DATE)",
+        'LAST_LOAD': "MAX(LOAD_TIMESTAMP)",
+    }),
+    'HUB_REPO_ISSUES': ('LINKMAP', 'LINKMAP.HUB_REPO_ISSUES', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {
+        'LAST_LOAD': "MAX(LOAD_TIMESTAMP)",
+    }),
+    'HUB_REPO_RELEASES': ('LINKMAP', 'LINKMAP.HUB_REPO_RELEASES', {
+        'RECORD_COUNT': "COUNT(*)",
+    }, {
+        'OLDEST_RECORD': "MIN(LAST_RELEASE_DATE)",
+        'NEWEST_RECORD': "MAX(LAST_RELEASE_DATE)",
+        'LAST_LOAD': "MAX(LOAD_TIMESTAMP)",
+    }),
+    'REPO_ENTRYLINE': ('ENRICH', 'ENRICH.REPO_ENTRYLINE', {
+        'RECORD_COUNT': "COUNT(*)",
+        'NO_RECENT_COMMITS': "SUM(CASE WHEN COMMITS_90D = 0 THEN 1 ELSE 0 END)",
+        'NO_ACTIVE_CONTRIBUTORS': "SUM(CASE WHEN ACTIVE_CONTRIBUTORS_90D = 0 THEN 1 ELSE 0 END)",
+        'NO_RELEASES': "SUM(CASE WHEN RELEASE_COUNT = 0 THEN 1 ELSE 0 END)",
+    }, {
+        'OLDEST_RECORD': "MIN(CREATED_AT)",
+        'NEWEST_RECORD': "MAX(CREATED_AT)",
+        'LAST_LOAD': "MAX(ENRICHED_AT)",
+    }),
+    'RISK_ANALYSIS_DATA_PRODUCT': ('CURATE', 'CURATE.RISK_ANALYSIS_DATA_PRODUCT', {
+        'RECORD_COUNT': "COUNT(*)",
+        'HIGH_RISK': "SUM(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 ELSE 0 END)",
+        'MEDIUM_RISK': "SUM(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 ELSE 0 END)",
+        'LOW_RISK': "SUM(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 ELSE 0 END)",
+        'AVG_RISK_SCORE': "ROUND(AVG(RISK_SCORE), 2)",
+    }, {
+        'OLDEST_RECORD': "MIN(LAST_UPDATED)",
+        'NEWEST_RECORD': "MAX(LAST_UPDATED)",
+        'LAST_LOAD': "MAX(LAST_UPDATED)",
+    }),
+}
+
+# RAW tables have no step of their own; they are recorded by the step that consumes them
+RAW_SOURCES = {
+    'STG_REPOSITORIES': 'SRC_GIT_REPOSITORIES',
+    'HUB_REPO_CONTRIBUTORS': 'SRC_GIT_REPO_CONTRIBUTORS',
+    'HUB_REPO_COMMITS': 'SRC_GIT_REPO_COMMITS',
+    'HUB_REPO_ISSUES': 'SRC_GIT_REPO_ISSUES',
+    'HUB_REPO_RELEASES': 'SRC_GIT_REPO_RELEASES',
+}
+
+def metric_rows_sql(table, null_timestamp='NULL'):
+    """One aggregate scan of `table`, unpivoted to (layer, table, source, metric, value, ts) rows"""
+    layer, source, values, timestamps = LAYER_METRICS[table]
+    aggregates = ',\n                '.join(
+        f"{expression} AS {name}" for name, expression in {**values, **timestamps}.items()
+    )
+    columns = [(name, name, null_timestamp) for name in values] + [(name, 'NULL', name) for name in timestamps]
+    rows = [
+        f"SELECT '{layer}' AS LAYER, '{table}' AS TABLE_NAME, DATA_SOURCE, '{name}' AS METRIC_NAME, "
+        f"{value} AS METRIC_VALUE, {ts} AS METRIC_TS FROM agg"
+        if i == 0 else
+        f"UNION ALL SELECT '{layer}', '{table}', DATA_SOURCE, '{name}', {value}, {ts} FROM agg"
+        for i, (name, value, ts) in enumerate(columns)
+    ]
+    union = '\n        '.join(rows)
+    return f"""
+        WITH agg AS (
+            SELECT
+                DATA_SOURCE,
+                {aggregates}
+            FROM {source}
+            GROUP BY DATA_SOURCE
+        )
+        {union}
+    """
+
+def snowflake_merge_sql(table):
+    """MERGE refreshing one table's rows in ORCHESTRATION.LAYER_METRICS"""
+    return f"""
+    MERGE INTO ORCHESTRATION.LAYER_METRICS tgt
+    USING ({metric_rows_sql(table, 'CAST(NULL AS TIMESTAMP_NTZ)')}) src
+    ON tgt.LAYER = src.LAYER AND tgt.TABLE_NAME = src.TABLE_NAME
+       AND tgt.DATA_SOURCE = src.DATA_SOURCE AND tgt.METRIC_NAME = src.METRIC_NAME
+    WHEN MATCHED THEN UPDATE SET
+        METRIC_VALUE = src.METRIC_VALUE, METRIC_TS = src.METRIC_TS, RECORDED_AT = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (LAYER, TABLE_NAME, DATA_SOURCE, METRIC_NAME, METRIC_VALUE, METRIC_TS, RECORDED_AT)
+        VALUES (src.LAYER, src.TABLE_NAME, src.DATA_SOURCE, src.METRIC_NAME, src.METRIC_VALUE, src.METRIC_TS,
+                CURRENT_TIMESTAMP());"""
+
+def snowflake_procedure_sql():
+    """ORCHESTRATION.SP_RECORD_LAYER_METRICS(P_TABLE): refresh one table (and its RAW source)"""
+    branches = []
+    for table in LAYER_METRICS:
+        if table in RAW_SOURCES.values():
+            continue
+        statements = snowflake_merge_sql(table)
+        if table in RAW_SOURCES:
+            statements = snowflake_merge_sql(RAW_SOURCES[table]) + '\n' + statements
+        keyword = 'IF' if not branches else 'ELSEIF'
+        branches.append(f"    {keyword} (P_TABLE = '{table}') THEN{textwrap.indent(statements, '    ')}")
+    return f"""
+CREATE OR REPLACE PROCEDURE ORCHESTRATION.SP_RECORD_LAYER_METRICS(P_TABLE VARCHAR)
+RETURNS VARCHAR
+LANGUAGE SQL
+AS
+$$
+BEGIN
+{chr(10).join(branches)}
+    ELSE
+        RETURN 'ERROR: No layer metrics defined for ' || P_TABLE;
+    END IF;
+
+    RETURN 'SUCCESS: Recorded layer metrics for ' || P_TABLE;
+END;
+$$;
+"""
+
+def local_upsert_sql(table):
+    """SQLite upsert refreshing one table's rows in ORCHESTRATION.LAYER_METRICS"""
+    return f"""
+    INSERT INTO ORCHESTRATION.LAYER_METRICS (LAYER, TABLE_NAME, DATA_SOURCE, METRIC_NAME, METRIC_VALUE, METRIC_TS, RECORDED_AT)
+    SELECT *, ? FROM ({metric_rows_sql(table)}) WHERE true
+    ON CONFLICT (LAYER, TABLE_NAME, DATA_SOURCE, METRIC_NAME) DO UPDATE SET
+        METRIC_VALUE = excluded.METRIC_VALUE, METRIC_TS = excluded.METRIC_TS, RECORDED_AT = excluded.RECORDED_AT
+    """
+
+def snowflake_refresh_procedure_sql():
+    """ORCHESTRATION.SP_REFRESH_LAYER_METRICS(): refresh every table, run by its own scheduled task"""
+    calls = '\n'.join(
+        f"    CALL ORCHESTRATION.SP_RECORD_LAYER_METRICS('{table}');"
+        for table in LAYER_METRICS if table not in RAW_SOURCES.values()
+    )
+    return f"""
+CREATE OR REPLACE PROCEDURE ORCHESTRATION.SP_REFRESH_LAYER_METRICS()
+RETURNS VARCHAR
+LANGUAGE SQL
+AS
+$$
+BEGIN
+{calls}
+
+    RETURN 'SUCCESS: Refreshed layer metrics';
+END;
+$$;
+"""
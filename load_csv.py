@@ -7,6 +7,9 @@ from datetime import datetime, timedelta
 import io
 import time
 
+import contributor_sketch
+import profiling
+
 def download_gh_archive_data():
     """
     Download real GitHub data from GH Archive
@@ -126,7 +129,7 @@ def process_events_to_repositories(events):
         if repo_name not in repos_dict:
             repos_dict[repo_name] = {
                 'events': [],
-                'contributors': set(),
+                'contributors': contributor_sketch.new_contributor_set(),
                 'last_event': event['created_at'],
                 'event_types': set()
             }
@@ -306,7 +309,7 @@ if __name__ == "__main__":
     print("📊 OPEN SOURCE RISK DATA COLLECTION")
     print("="*60)
     
-    df = generate_complete_dataset()
+    df = profiling.run_main(generate_complete_dataset, 'load_csv')
     
     print("\n" + "="*60)
     print("📈 DATASET SUMMARY:")
@@ -9,6 +9,11 @@ from dotenv import load_dotenv
 import snowflake.connector
 import time
 
+import contributor_sketch
+import instrumentation
+import profiling
+import query_trace
+
 load_dotenv()
 
 
@@ -16,14 +21,14 @@ GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
 def get_connection():
 
-    return snowflake.connector.connect(
+    return query_trace.traced(snowflake.connector.connect(
         user=os.getenv("SNOWFLAKE_USER"),
         password=os.getenv("SNOWFLAKE_PASSWORD"),
         role=os.getenv("SNOWFLAKE_ROLE"),
         account=os.getenv("SNOWFLAKE_ACCOUNT"),
         warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
         database=os.getenv("SNOWFLAKE_DATABASE")
-    )
+    ))
 
 def get_fallback_data():
     repos = []
@@ -70,7 +75,10 @@ def get_fallback_data():
         url = f"https://api.github.com/search/repositories?q={query}&sort=stars&order=desc&per_page={per_page}&page={page}"
         
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            with instrumentation.meter('fetch.github_api') as fetch:
+                response = requests.get(url, headers=headers, timeout=10)
+                content = response.content
+            fetch.add(1, len(content))
             
             if response.status_code == 200:
                 data = response.json()
@@ -154,14 +162,20 @@ def get_gh_archive_data():
         date_str = yesterday.strftime("%Y-%m-%d")
         url = f"https://data.gharchive.org/{date_str}-12.json.gz"
         
-        response = requests.get(url, stream=True, timeout=10)
-        response.raise_for_status()
+        with instrumentation.meter('fetch') as fetch:
+            response = requests.get(url, stream=True, timeout=10)
+            response.raise_for_status()
+            content = response.content
+        fetch.add(1, len(content))
         
         events = []
-        with gzip.GzipFile(fileobj=io.BytesIO(response.content)) as gz_file:
-            for line in gz_file:
+        parse = instrumentation.meter('parse')
+        with gzip.GzipFile(fileobj=io.BytesIO(content)) as gz_file:
+            for line in instrumentation.timed_iter('decompress', gz_file):
                 try:
-                    event = json.loads(line.decode('utf-8'))
+                    with parse:
+                        event = json.loads(line.decode('utf-8'))
+                    parse.add(1, len(line))
                     events.append(event)
                     if len(events) >= 1000:  # Just get a sample
                         break
@@ -185,7 +199,7 @@ def process_events_to_repositories(events):
         if repo_name not in repos_dict:
             repos_dict[repo_name] = {
                 'events': [],
-                'contributors': set(),
+                'contributors': contributor_sketch.new_contributor_set(),
                 'last_event': event['created_at']
             }
         
@@ -233,7 +247,9 @@ def get_repositories():
 
     # Try GH Archive
     events = get_gh_archive_data()
-    gh_archive_repos = process_events_to_repositories(events)
+    with instrumentation.meter('aggregate') as aggregate:
+        gh_archive_repos = process_events_to_repositories(events)
+    aggregate.add(len(events))
     
     # Try GitHub API
     needed = 5000 - len(gh_archive_repos)
@@ -256,12 +272,15 @@ def get_repositories():
 
 def load_to_stage(repositories):
     """Load data to STAGE.GIT_REPOSITORIES"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with instrumentation.meter('connect'):
+        conn = get_connection()
+        cursor = conn.cursor()
     
     # Clear existing data
     cursor.execute("TRUNCATE TABLE STAGE.GIT_REPOSITORIES")
     
+    build = instrumentation.meter('build.GIT_REPOSITORIES')
+    build.start()
     records = []
     for repo in repositories:
         created_str = repo['created_at'].strftime('%Y-%m-%d %H:%M:%S')
@@ -279,25 +298,31 @@ def load_to_stage(repositories):
             created_str,
             updated_str
         ))
+    build.stop(len(records))
     
     # Insert in batches
+    insert = instrumentation.meter('insert.STAGE.GIT_REPOSITORIES')
     batch_size = 1000
     for i in range(0, len(records), batch_size):
         batch = records[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO STAGE.GIT_REPOSITORIES 
             (id, name, full_name, owner, language, stars, forks, html_url, created_at, updated_at)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
-    conn.commit()
+    with instrumentation.meter('commit'):
+        conn.commit()
     cursor.close()
     conn.close()
 
 def load_to_linkmap(repositories):
     """Load data to LINKMAP tables"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    with instrumentation.meter('connect'):
+        conn = get_connection()
+        cursor = conn.cursor()
     
     # Clear existing data
     cursor.execute("DELETE FROM LINKMAP.GIT_REPO_CONTRIBUTORS")
@@ -306,6 +331,8 @@ def load_to_linkmap(repositories):
     cursor.execute("DELETE FROM LINKMAP.GIT_REPO_RELEASES")
     
     # Contributors
+    build = instrumentation.meter('build.GIT_REPO_CONTRIBUTORS')
+    build.start()
     contributors_data = []
     for repo in repositories:
         for i in range(repo['total_contributors']):
@@ -319,18 +346,24 @@ def load_to_linkmap(repositories):
                 total_commits,
                 recent_commits
             ))
+    build.stop(len(contributors_data))
     
     # contributors
+    insert = instrumentation.meter('insert.LINKMAP.GIT_REPO_CONTRIBUTORS')
     batch_size = 1000
     for i in range(0, len(contributors_data), batch_size):
         batch = contributors_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO LINKMAP.GIT_REPO_CONTRIBUTORS 
             (repo_full_name, contributor, total_commits, recent_90_days_commits)
             VALUES (%s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
     # Commits
+    build = instrumentation.meter('build.GIT_REPO_COMMITS')
+    build.start()
     commits_data = []
     for repo in repositories:
         if repo['commits_90d'] > 0:
@@ -349,16 +382,22 @@ def load_to_linkmap(repositories):
             commits_180d,
             last_commit.strftime('%Y-%m-%d %H:%M:%S')
         ))
+    build.stop(len(commits_data))
     
+    insert = instrumentation.meter('insert.LINKMAP.GIT_REPO_COMMITS')
     for i in range(0, len(commits_data), batch_size):
         batch = commits_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO LINKMAP.GIT_REPO_COMMITS 
             (repo, commits_30d, commits_90d, commits_180d, last_commit_date)
             VALUES (%s, %s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
     # Issues
+    build = instrumentation.meter('build.GIT_REPO_ISSUES')
+    build.start()
     issues_data = []
     for repo in repositories:
         if repo['open_issues'] + repo['closed_issues'] > 0:
@@ -372,16 +411,22 @@ def load_to_linkmap(repositories):
             repo['closed_issues'],
             issues_last_90d
         ))
+    build.stop(len(issues_data))
     
+    insert = instrumentation.meter('insert.LINKMAP.GIT_REPO_ISSUES')
     for i in range(0, len(issues_data), batch_size):
         batch = issues_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO LINKMAP.GIT_REPO_ISSUES 
             (repo, open_issues, closed_issues, issues_last_90d)
             VALUES (%s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
     # Releases
+    build = instrumentation.meter('build.GIT_REPO_RELEASES')
+    build.start()
     releases_data = []
     for repo in repositories:
         last_release_str = repo['last_release_date'].strftime('%Y-%m-%d %H:%M:%S')
@@ -394,16 +439,21 @@ def load_to_linkmap(repositories):
             last_release_str,
             days_since
         ))
+    build.stop(len(releases_data))
     
+    insert = instrumentation.meter('insert.LINKMAP.GIT_REPO_RELEASES')
     for i in range(0, len(releases_data), batch_size):
         batch = releases_data[i:i + batch_size]
+        insert.start()
         cursor.executemany("""
             INSERT INTO LINKMAP.GIT_REPO_RELEASES 
             (repo, release_count, last_release_date, days_since_last_release)
             VALUES (%s, %s, %s, %s)
         """, batch)
+        insert.stop(len(batch), instrumentation.payload_bytes(batch))
     
-    conn.commit()
+    with instrumentation.meter('commit'):
+        conn.commit()
     cursor.close()
     conn.close()
 
@@ -416,6 +466,7 @@ def main():
     load_to_linkmap(repositories)
     
     print("Data loaded to stage and linkmap tables")
+    instrumentation.emit_summary('load_data_direct')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_main(main, 'load_data_direct')
\ No newline at end of file
@@ -0,0 +1,318 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+import query_trace
+
+load_dotenv()
+
+# Serves pipeline health in the Prometheus text exposition format. The metrics are read
+# from ORCHESTRATION.PIPELINE_LOG, PIPELINE_METRICS and LAYER_METRICS on a refresh
+# interval and cached, so scrapes never query the warehouse. --db points it at a
+# file-backed local pipeline instead of Snowflake. Ages are measured against the clock
+# the timestamps were written with: Snowflake's CURRENT_TIMESTAMP() as TIMESTAMP_NTZ in
+# the session timezone, or host local time for the local pipeline.
+
+DEFAULT_PORT = 9108
+DEFAULT_INTERVAL = 30
+
+def get_connection():
+    import snowflake.connector
+
+    return query_trace.traced(snowflake.connector.connect(
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        role=os.getenv("SNOWFLAKE_ROLE"),
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        database=os.getenv("SNOWFLAKE_DATABASE")
+    ))
+
+def get_local_db_connection(path):
+    import local_pipeline as lp
+
+    return lp.get_local_connection(path)
+
+WAREHOUSE_NOW_SQL = "SELECT CURRENT_TIMESTAMP()::TIMESTAMP_NTZ"
+
+def warehouse_now(conn):
+    """Snowflake's current time in the same NTZ form PIPELINE_LOG and LAYER_METRICS store"""
+    return _fetchall(conn, WAREHOUSE_NOW_SQL)[0][0]
+
+def local_now(conn):
+    """The local pipeline stamps host local time (local_pipeline._now)"""
+    return datetime.now()
+
+STAGE_DURATIONS_SQL = """
+    SELECT l.stage, l.status, l.start_time, l.end_time
+    FROM ORCHESTRATION.PIPELINE_LOG l
+    JOIN (
+        SELECT stage, MAX(log_id) AS log_id
+        FROM ORCHESTRATION.PIPELINE_LOG
+        WHERE end_time IS NOT NULL
+        GROUP BY stage
+    ) latest ON latest.log_id = l.log_id
+"""
+
+RUN_COUNTS_SQL = """
+    SELECT stage, status, COUNT(*)
+    FROM ORCHESTRATION.PIPELINE_LOG
+    WHERE stage IN ('FULL_PIPELINE', 'CHECK_STREAM')
+    GROUP BY stage, status
+"""
+
+LAST_SUCCESS_SQL = """
+    SELECT MAX(end_time)
+    FROM ORCHESTRATION.PIPELINE_LOG
+    WHERE stage = 'FULL_PIPELINE' AND status = 'COMPLETED'
+"""
+
+STAGE_METRICS_SQL = """
+    SELECT m.stage, m.metric_name, m.metric_value
+    FROM ORCHESTRATION.PIPELINE_METRICS m
+    JOIN (
+        SELECT stage, MAX(recorded_at) AS recorded_at
+        FROM ORCHESTRATION.PIPELINE_METRICS
+        GROUP BY stage
+    ) latest ON latest.stage = m.stage AND latest.recorded_at = m.recorded_at
+"""
+
+LAYER_METRICS_SQL = """
+    SELECT LAYER, TABLE_NAME, DATA_SOURCE, METRIC_NAME, METRIC_VALUE, METRIC_TS
+    FROM ORCHESTRATION.LAYER_METRICS
+"""
+
+RISK_CATEGORIES = {'HIGH_RISK': 'HIGH', 'MEDIUM_RISK': 'MEDIUM', 'LOW_RISK': 'LOW'}
+
+def _as_datetime(value):
+    """PIPELINE_LOG timestamps come back as datetimes from Snowflake and as text locally"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def _format_value(value):
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricFamily:
+    """One metric name with its HELP/TYPE header and labelled samples"""
+
+    def __init__(self, name, help_text, metric_type='gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.samples = []
+
+    def add(self, value, **labels):
+        if value is not None:
+            self.samples.append((labels, float(value)))
+        return self
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        for labels, value in self.samples:
+            label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            sample = f"{self.name}{{{label_text}}}" if label_text else self.name
+            lines.append(f"{sample} {_format_value(value)}")
+        return '\n'.join(lines)
+
+def _fetchall(conn, sql):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def collect_metrics(conn, now=None):
+    """Query the orchestration tables once and build every exported metric family"""
+    now = now or warehouse_now(conn)
+
+    durations = MetricFamily('pipeline_stage_duration_seconds', 'Duration of the latest finished run of each pipeline node')
+    failed = MetricFamily('pipeline_stage_failed', 'Whether the latest finished run of each pipeline node failed')
+    for stage, status, start_time, end_time in _fetchall(conn, STAGE_DURATIONS_SQL):
+        start_time, end_time = _as_datetime(start_time), _as_datetime(end_time)
+        if start_time is not None:
+            durations.add((end_time - start_time).total_seconds(), stage=stage)
+        failed.add(status == 'ERROR', stage=stage)
+
+    runs = MetricFamily('pipeline_runs_total', 'Pipeline runs by outcome', 'counter')
+    for stage, status, count in _fetchall(conn, RUN_COUNTS_SQL):
+        runs.add(count, stage=stage, status=status)
+
+    last_success = MetricFamily('pipeline_last_success_age_seconds', 'Seconds since the last successful pipeline run')
+    last_success_time = _as_datetime(_fetchall(conn, LAST_SUCCESS_SQL)[0][0])
+    if last_success_time is not None:
+        last_success.add((now - last_success_time).total_seconds())
+
+    stage_rows = MetricFamily('pipeline_stage_rows', 'Rows processed by the latest run of each stage')
+    for stage, metric_name, value in _fetchall(conn, STAGE_METRICS_SQL):
+        stage_rows.add(value, stage=stage, metric=metric_name.lower())
+
+    table_rows = MetricFamily('pipeline_table_rows', 'Rows in each pipeline table')
+    invalid_ratio = MetricFamily('pipeline_invalid_row_ratio', 'Share of STAGE rows that failed validation')
+    load_age = MetricFamily('pipeline_table_last_load_age_seconds', 'Seconds since each table was last loaded, as of the last layer metrics refresh')
+    risk = MetricFamily('pipeline_risk_repositories', 'Repositories per risk category')
+    avg_risk = MetricFamily('pipeline_risk_score_avg', 'Average repository risk score')
+
+    by_table = {}
+    for layer, table, data_source, metric_name, value, metric_ts in _fetchall(conn, LAYER_METRICS_SQL):
+        by_table.setdefault((layer, table, data_source), {})[metric_name] = (value, metric_ts)
+
+    for (layer, table, data_source), metrics in sorted(by_table.items()):
+        labels = {'layer': layer, 'table': table, 'data_source': data_source}
+        record_count = metrics.get('RECORD_COUNT', (None, None))[0]
+        table_rows.add(record_count, **labels)
+        if 'INVALID_RECORDS' in metrics and record_count:
+            invalid_ratio.add(metrics['INVALID_RECORDS'][0] / record_count, **labels)
+        if 'LAST_LOAD' in metrics and metrics['LAST_LOAD'][1] is not None:
+            load_age.add((now - _as_datetime(metrics['LAST_LOAD'][1])).total_seconds(), **labels)
+        for metric_name, category in RISK_CATEGORIES.items():
+            if metric_name in metrics:
+                risk.add(metrics[metric_name][0], data_source=data_source, category=category)
+        if 'AVG_RISK_SCORE' in metrics:
+            avg_risk.add(metrics['AVG_RISK_SCORE'][0], data_source=data_source)
+
+    return [durations, failed, runs, last_success, stage_rows, table_rows, invalid_ratio, load_age, risk, avg_risk]
+
+class MetricsCache:
+    """Exposition text rebuilt every `interval` seconds by a background thread"""
+
+    def __init__(self, connect, interval=DEFAULT_INTERVAL, clock=warehouse_now):
+        self.connect = connect
+        self.interval = interval
+        self.clock = clock
+        self.conn = None
+        self.body = ''
+        self.text = ''
+        self.refreshes = 0
+        self.failures = 0
+        self.last_success = None
+        self.last_duration = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = self.connect()
+            families = collect_metrics(self.conn, self.clock(self.conn))
+            succeeded = True
+        except Exception as e:
+            print(f"Error refreshing pipeline metrics: {e}")
+            # reconnect on the next refresh, and keep serving the last good metrics
+            self.conn = None
+            families = None
+            succeeded = False
+        self.last_duration = time.perf_counter() - start
+        self.refreshes += 1
+
+        with self._lock:
+            if succeeded:
+                self.last_success = time.time()
+                self.body = '\n'.join(family.render() for family in families)
+            else:
+                self.failures += 1
+            exporter = [
+                MetricFamily('pipeline_exporter_refresh_success', 'Whether the latest metrics refresh succeeded').add(succeeded),
+                MetricFamily('pipeline_exporter_refresh_duration_seconds', 'Duration of the latest metrics refresh')
+                    .add(self.last_duration),
+                MetricFamily('pipeline_exporter_refresh_failures_total', 'Failed metrics refreshes', 'counter')
+                    .add(self.failures),
+                MetricFamily('pipeline_exporter_last_success_timestamp_seconds', 'Unix time of the last good refresh')
+                    .add(self.last_success),
+            ]
+            parts = [self.body] + [family.render() for family in exporter]
+            self.text = '\n'.join(part for part in parts if part) + '\n'
+        return succeeded
+
+    def get(self):
+        with self._lock:
+            return self.text
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        """Refresh once now, then keep refreshing in the background"""
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name='metrics-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    cache = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404, 'Metrics are served on /metrics')
+            return
+        body = self.cache.get().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def create_server(cache, host='127.0.0.1', port=DEFAULT_PORT):
+    """HTTP server answering /metrics from the cache (port 0 picks a free port)"""
+    handler = type('CachedMetricsHandler', (MetricsHandler,), {'cache': cache})
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Prometheus exporter for the risk analysis pipeline')
+    parser.add_argument('--db', type=str, help='Directory of a file-backed local pipeline (default: Snowflake)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='Seconds between metric refreshes')
+    parser.add_argument('--once', action='store_true', help='Print the metrics once and exit')
+
+    args = parser.parse_args()
+
+    if args.db:
+        cache = MetricsCache(lambda: get_local_db_connection(args.db), args.interval, clock=local_now)
+    else:
+        cache = MetricsCache(get_connection, args.interval)
+
+    if args.once:
+        cache.refresh()
+        print(cache.get(), end='')
+        cache.stop()
+        return
+
+    cache.start()
+    server = create_server(cache, args.host, args.port)
+    source = f"local pipeline {args.db}" if args.db else "Snowflake"
+    print(f"Serving {source} metrics on http://{args.host}:{server.server_port}/metrics "
+          f"(refresh every {args.interval:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        cache.stop()
+
+if __name__ == "__main__":
+    main()
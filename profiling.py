@@ -0,0 +1,118 @@
+import cProfile
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+# Shared --profile option for the scripts' entry points. `--profile` (or --profile=DIR)
+# runs the entry point under cProfile and tracemalloc and writes, per run:
+#   <name>-<timestamp>.prof         cProfile stats (open with pstats or snakeviz)
+#   <name>-<timestamp>-memory.txt   top allocations by line, current and peak memory
+#   <name>-<timestamp>-wall.txt     wall-clock breakdown per function called by the entry point
+# DIR defaults to PIPELINE_PROFILE_DIR, or ./profiles. run_main() takes the flag off sys.argv before
+# the script parses it; scripts with an argparse parser also register it with add_argument() so it
+# shows in their --help.
+
+DEFAULT_DIR = 'profiles'
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 20
+
+def _pop_profile_flag(argv):
+    """Remove --profile[=DIR] from argv so the script's own parsing never sees it"""
+    for i, arg in enumerate(argv[1:], 1):
+        if arg == '--profile':
+            del argv[i]
+            return os.getenv('PIPELINE_PROFILE_DIR', DEFAULT_DIR)
+        if arg.startswith('--profile='):
+            del argv[i]
+            return arg.split('=', 1)[1]
+    return None
+
+def add_argument(parser):
+    """List --profile[=DIR] in the parser's --help (run_main() has already removed it from argv)"""
+    parser.add_argument('--profile', type=str, nargs='?', const=DEFAULT_DIR, metavar='DIR',
+                        help=f'Write cProfile, tracemalloc and wall-clock reports to DIR '
+                             f'(default: PIPELINE_PROFILE_DIR or ./{DEFAULT_DIR})')
+
+def run_main(entry, name, *args, **kwargs):
+    """Call entry(*args, **kwargs), profiled when the command line has --profile"""
+    output_dir = _pop_profile_flag(sys.argv)
+    if output_dir is None:
+        return entry(*args, **kwargs)
+    return profile_call(entry, name, output_dir, *args, **kwargs)
+
+def _label(key):
+    filename, line, function = key
+    if filename == '~':
+        return function
+    return f"{os.path.basename(filename)}:{line}({function})"
+
+def wall_breakdown(stats, entry):
+    """(label, calls, seconds) for the entry point's own time and each function it called"""
+    entry_key = next(
+        (key for key in stats.stats if key[0] == entry.__code__.co_filename and key[2] == entry.__code__.co_name
+         and key[1] == entry.__code__.co_firstlineno),
+        None,
+    )
+    if entry_key is None:
+        return []
+
+    rows = [(f"{_label(entry_key)} [self]", stats.stats[entry_key][1], stats.stats[entry_key][2])]
+    for key, (_, _, _, _, callers) in stats.stats.items():
+        if entry_key in callers:
+            _, calls, _, cumulative = callers[entry_key]
+            rows.append((_label(key), calls, cumulative))
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+def profile_call(entry, name, output_dir, *args, **kwargs):
+    """Run one entry point under cProfile and tracemalloc and write the three reports"""
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.join(output_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        return entry(*args, **kwargs)
+    finally:
+        profiler.disable()
+        wall = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        write_reports(stem, entry, profiler, snapshot, current, peak, wall)
+
+def write_reports(stem, entry, profiler, snapshot, current, peak, wall):
+    profiler.dump_stats(f"{stem}.prof")
+
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ])
+    with open(f"{stem}-memory.txt", 'w') as f:
+        f.write(f"Peak traced memory:    {peak / 2**20:10.2f} MiB\n")
+        f.write(f"Traced memory at exit: {current / 2**20:10.2f} MiB\n\n")
+        f.write(f"Top {TOP_ALLOCATIONS} allocations still held at exit, by line:\n")
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            frame = stat.traceback[0]
+            f.write(f"{stat.size / 2**10:12.1f} KiB {stat.count:10,} blocks  {frame.filename}:{frame.lineno}\n")
+
+    breakdown = wall_breakdown(pstats.Stats(profiler), entry)
+    lines = [f"{'Function':<60} {'Calls':>8} {'Seconds':>10} {'% wall':>7}"]
+    for label, calls, seconds in breakdown[:TOP_FUNCTIONS]:
+        lines.append(f"{label[:60]:<60} {calls:>8,} {seconds:>10.3f} {seconds / wall * 100 if wall else 0:>6.1f}%")
+    with open(f"{stem}-wall.txt", 'w') as f:
+        f.write(f"Wall clock: {wall:.3f} s\n\n" + '\n'.join(lines) + '\n')
+
+    print("\n" + "="*70)
+    print(f"PROFILE: {wall:.3f} s wall, {peak / 2**20:.1f} MiB peak traced memory")
+    print("="*70)
+    for line in lines[:11]:
+        print(line)
+    print("-"*70)
+    print(f"Reports: {stem}.prof, {stem}-memory.txt, {stem}-wall.txt")
+    print("="*70)
@@ -0,0 +1,310 @@
+import argparse
+import atexit
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Per-statement tracing of warehouse calls. PIPELINE_QUERY_TRACE=path makes traced()
+# wrap a connection so every execute is recorded to a JSON-lines trace file with its
+# entry point, stage, query id, elapsed time, rows returned or affected and bytes
+# fetched. The stage is the innermost `with stage(...)` block, or else the function
+# that issued the statement. On Snowflake the session QUERY_TAG follows the stage, so
+# the statements run inside a procedure this session calls can be attributed in
+# QUERY_HISTORY too; procedures run by the task graph are tagged 'pipeline:<node>' by
+# their task instead (setup_stream_pipeline.py).
+# Without PIPELINE_QUERY_TRACE, traced() returns the connection untouched.
+
+MAX_PENDING = 256
+STATEMENT_CHARS = 2000
+
+def _entry_point():
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+def _normalize(statement):
+    return re.sub(r'\s+', ' ', statement).strip()
+
+def _row_bytes(rows):
+    return sum(len(str(value)) for row in rows for value in row if value is not None)
+
+class QueryTracer:
+    """Collects query records and appends them to a JSON-lines trace file"""
+
+    def __init__(self, path, entry_point=None):
+        self.path = path
+        self.entry_point = entry_point or _entry_point()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        atexit.register(self.flush)
+
+    @property
+    def current_stage(self):
+        return getattr(self._local, 'stage', None)
+
+    @current_stage.setter
+    def current_stage(self, value):
+        self._local.stage = value
+
+    def begin(self, statement, stage, query_id=None):
+        record = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'entry_point': self.entry_point,
+            'stage': stage,
+            'query_id': query_id,
+            'statement': _normalize(statement)[:STATEMENT_CHARS],
+            'execute_ms': 0.0,
+            'fetch_ms': 0.0,
+            'rows': None,
+            'rows_fetched': 0,
+            'bytes_fetched': 0,
+        }
+        with self._lock:
+            record['seq'] = next(self._ids)
+            self._pending[record['seq']] = record
+            if len(self._pending) > MAX_PENDING:
+                self._write([self._pending.pop(min(self._pending))])
+        return record
+
+    def finish(self, record):
+        with self._lock:
+            if self._pending.pop(record['seq'], None) is not None:
+                self._write([record])
+
+    def flush(self):
+        """Write every record still waiting for its fetches"""
+        with self._lock:
+            records = [self._pending[seq] for seq in sorted(self._pending)]
+            self._pending.clear()
+            self._write(records)
+
+    def _write(self, records):
+        if not records:
+            return
+        with open(self.path, 'a') as f:
+            for record in records:
+                record['elapsed_ms'] = round(record['execute_ms'] + record['fetch_ms'], 3)
+                record['execute_ms'] = round(record['execute_ms'], 3)
+                record['fetch_ms'] = round(record['fetch_ms'], 3)
+                f.write(json.dumps(record, default=str) + '\n')
+
+class TracedCursor:
+    """DB-API cursor wrapper recording each execute and the fetches that follow it"""
+
+    def __init__(self, cursor, tracer, connection=None):
+        self._cursor = cursor
+        self._tracer = tracer
+        self._connection = connection
+        self._record = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _stage(self, depth):
+        return self._tracer.current_stage or sys._getframe(depth + 1).f_code.co_name
+
+    def _run(self, method, statement, params, stage):
+        if self._record is not None:
+            self._tracer.finish(self._record)
+        if self._connection is not None:
+            self._connection._tag(stage)
+
+        record = self._record = self._tracer.begin(statement, stage)
+        start = time.perf_counter()
+        try:
+            result = method(statement, params) if params is not None else method(statement)
+        finally:
+            record['execute_ms'] += (time.perf_counter() - start) * 1000
+            record['query_id'] = getattr(self._cursor, 'sfqid', None) or f"local-{record['seq']}"
+            rowcount = getattr(self._cursor, 'rowcount', -1)
+            record['rows'] = rowcount if rowcount is not None and rowcount >= 0 else None
+        # statements without a result set have nothing left to fetch
+        if getattr(self._cursor, 'description', None) is None:
+            self._tracer.finish(record)
+            self._record = None
+        return self if result is self._cursor else result
+
+    def execute(self, statement, params=None):
+        return self._run(self._cursor.execute, statement, params, self._stage(1))
+
+    def executemany(self, statement, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        self._run(self._cursor.executemany, statement, seq_of_params, self._stage(1))
+        return self
+
+    def _fetched(self, rows, elapsed, done):
+        record = self._record
+        if record is None:
+            return
+        record['fetch_ms'] += elapsed * 1000
+        record['rows_fetched'] += len(rows)
+        record['bytes_fetched'] += _row_bytes(rows)
+        if done:
+            self._tracer.finish(record)
+            self._record = None
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched([row] if row is not None else [], time.perf_counter() - start, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(rows, time.perf_counter() - start, not rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(rows, time.perf_counter() - start, True)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        if self._record is not None:
+            self._tracer.finish(self._record)
+            self._record = None
+        return self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class TracedConnection:
+    """Connection wrapper handing out traced cursors (and tracing sqlite's conn.execute)"""
+
+    def __init__(self, conn, tracer):
+        self._conn = conn
+        self._tracer = tracer
+        self._tag_sessions = type(conn).__module__.startswith('snowflake')
+        self._session_tag = None
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def _tag(self, stage):
+        """Keep the Snowflake QUERY_TAG on entry point and stage, so procedure statements inherit it"""
+        tag = f"{self._tracer.entry_point}:{stage}"
+        if not self._tag_sessions or tag == self._session_tag:
+            return
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute("ALTER SESSION SET QUERY_TAG = %s", (tag,))
+        finally:
+            cursor.close()
+        self._session_tag = tag
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self._conn.cursor(*args, **kwargs), self._tracer, self)
+
+    def execute(self, statement, params=None):
+        cursor = TracedCursor(self._conn.cursor(), self._tracer, self)
+        cursor._run(cursor._cursor.execute, statement, params, cursor._stage(1))
+        return cursor
+
+    def executemany(self, statement, seq_of_params):
+        cursor = TracedCursor(self._conn.cursor(), self._tracer, self)
+        cursor._run(cursor._cursor.executemany, statement, list(seq_of_params), cursor._stage(1))
+        return cursor
+
+    def close(self):
+        self._tracer.flush()
+        return self._conn.close()
+
+_tracer = None
+
+def enable(path, entry_point=None):
+    global _tracer
+    _tracer = QueryTracer(path, entry_point)
+    return _tracer
+
+def disable():
+    global _tracer
+    if _tracer is not None:
+        _tracer.flush()
+    _tracer = None
+
+def traced(conn):
+    """The connection wrapped for tracing, or unchanged while tracing is off"""
+    if _tracer is None or isinstance(conn, TracedConnection):
+        return conn
+    return TracedConnection(conn, _tracer)
+
+@contextmanager
+def stage(name):
+    """Attribute the statements run inside the block to `name`"""
+    if _tracer is None:
+        yield
+        return
+    previous = _tracer.current_stage
+    _tracer.current_stage = name
+    try:
+        yield
+    finally:
+        _tracer.current_stage = previous
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize(records, by='statement'):
+    """Totals per (entry point, stage[, statement]), most expensive first"""
+    groups = {}
+    for record in records:
+        key = (record['entry_point'], record['stage'])
+        if by == 'statement':
+            key += (record['statement'],)
+        group = groups.setdefault(key, {'calls': 0, 'elapsed_ms': 0.0, 'rows': 0, 'bytes_fetched': 0})
+        group['calls'] += 1
+        group['elapsed_ms'] += record['elapsed_ms']
+        group['rows'] += record['rows_fetched'] or record['rows'] or 0
+        group['bytes_fetched'] += record['bytes_fetched']
+    return sorted(groups.items(), key=lambda item: item[1]['elapsed_ms'], reverse=True)
+
+def print_report(records, by='statement', top=20):
+    total = sum(record['elapsed_ms'] for record in records) or 1.0
+    summary = summarize(records, by)
+
+    print("\n" + "="*70)
+    print(f"QUERY TRACE: {len(records):,} statements, {total / 1000:.3f} s in the warehouse")
+    print("="*70)
+    print(f"{'Elapsed ms':>11} {'%':>6} {'Calls':>7} {'Rows':>10} {'Bytes':>11}  Entry point / stage")
+    print("-"*70)
+    for key, group in summary[:top]:
+        print(f"{group['elapsed_ms']:>11.1f} {group['elapsed_ms'] / total * 100:>5.1f}% {group['calls']:>7,} "
+              f"{group['rows']:>10,} {group['bytes_fetched']:>11,}  {key[0]} / {key[1]}")
+        if by == 'statement':
+            print(f"{'':>50}{key[2][:100]}")
+    print("="*70)
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a query trace file, most expensive first')
+    parser.add_argument('trace', type=str, help='JSON-lines trace written with PIPELINE_QUERY_TRACE')
+    parser.add_argument('--by', choices=['statement', 'stage'], default='statement', help='Grouping of the report')
+    parser.add_argument('--top', type=int, default=20, help='Rows to show')
+
+    args = parser.parse_args()
+    print_report(load_trace(args.trace), args.by, args.top)
+
+if os.getenv("PIPELINE_QUERY_TRACE"):
+    enable(os.getenv("PIPELINE_QUERY_TRACE"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from dotenv import load_dotenv
+
+import query_trace
+import repo_search
+import result_cache
+import risk_queries
+
+load_dotenv()
+
+# Local read replica of the CURATE data product. `python replica.py sync` copies the
+# rows of CURATE.RISK_ANALYSIS_DATA_PRODUCT and CURATE.RISK_SCORE_HISTORY changed since
+# the last sync into an SQLite file, using LAST_UPDATED (and VALID_FROM/VALID_TO for the
+# history) as the watermark. connect() opens the replica under the CURATE schema name,
+# so the CLI's Snowflake statements run against it unchanged: `risk_analysis.py
+# --replica` reads from it without a warehouse. The replica only changes when it is
+# synced, so its results are cached per sync, and the aggregate reports are computed
+# into that cache at the end of each sync. Each sync also keeps the repository search
+# index (repo_search.py) in step with the data product.
+
+DEFAULT_PATH = 'risk_replica.db'
+BATCH_SIZE = 10000
+
+PRODUCT_COLUMNS = ['DATA_SOURCE'] + risk_queries.REPO_COLUMNS + ['LAST_UPDATED']
+HISTORY_COLUMNS = ['DATA_SOURCE', 'FULL_NAME', 'RISK_SCORE', 'RISK_CATEGORY', 'MODEL_VERSION', 'VALID_FROM', 'VALID_TO']
+
+# (table, columns, key columns, watermark columns): a row is copied again once any of
+# its watermark columns reaches the watermark, e.g. a history row closed by VALID_TO
+REPLICATED_TABLES = [
+    ('RISK_ANALYSIS_DATA_PRODUCT', PRODUCT_COLUMNS, ['DATA_SOURCE', 'FULL_NAME'], ['LAST_UPDATED']),
+    ('RISK_SCORE_HISTORY', HISTORY_COLUMNS, ['DATA_SOURCE', 'FULL_NAME', 'VALID_FROM'], ['VALID_FROM', 'VALID_TO']),
+]
+
+# Cheap freshness token of the replica for the result cache: one row per table
+FRESHNESS_SQL = """
+    SELECT MAX(synced_at), SUM(row_count)
+    FROM CURATE.REPLICA_SYNC
+"""
+
+# Reports that scan the whole data product, answered from the cache right after a sync
+WARM_QUERIES = [
+    risk_queries.SUMMARY_SQL,
+    risk_queries.LANGUAGES_SQL,
+    risk_queries.dashboard_sql(),
+    risk_queries.top_repositories_sql(10, riskiest=True),
+    risk_queries.top_repositories_sql(10, riskiest=False),
+]
+
+REPLICA_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.RISK_ANALYSIS_DATA_PRODUCT (
+        data_source TEXT, full_name TEXT, language TEXT,
+        stars INTEGER, commits_90d INTEGER, active_contributors_90d INTEGER,
+        days_since_last_release INTEGER, open_issues INTEGER,
+        risk_score REAL, risk_category TEXT, last_updated TEXT,
+        PRIMARY KEY (data_source, full_name)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS CURATE.IX_PRODUCT_SCORE ON RISK_ANALYSIS_DATA_PRODUCT (data_source, risk_score, full_name)",
+    "CREATE INDEX IF NOT EXISTS CURATE.IX_PRODUCT_NAME ON RISK_ANALYSIS_DATA_PRODUCT (data_source, UPPER(full_name))",
+    # covers the summary and language rollups, so they scan the index instead of the table
+    """
+    CREATE INDEX IF NOT EXISTS CURATE.IX_PRODUCT_LANGUAGE
+    ON RISK_ANALYSIS_DATA_PRODUCT (data_source, language, risk_category, risk_score, last_updated)
+    """,
+    "CREATE INDEX IF NOT EXISTS CURATE.IX_PRODUCT_UPDATED ON RISK_ANALYSIS_DATA_PRODUCT (last_updated)",
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.RISK_SCORE_HISTORY (
+        data_source TEXT, full_name TEXT, risk_score REAL, risk_category TEXT, model_version TEXT,
+        valid_from TEXT, valid_to TEXT,
+        PRIMARY KEY (data_source, full_name, valid_from)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS CURATE.IX_HISTORY_NAME ON RISK_SCORE_HISTORY (data_source, UPPER(full_name), valid_from)",
+    """
+    CREATE INDEX IF NOT EXISTS CURATE.IX_HISTORY_VALID
+    ON RISK_SCORE_HISTORY (data_source, valid_from, valid_to, risk_score, risk_category)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.REPLICA_SYNC (
+        table_name TEXT PRIMARY KEY,
+        watermark TEXT,
+        synced_at TEXT,
+        rows_copied INTEGER,
+        row_count INTEGER
+    )
+    """,
+]
+
+def get_connection():
+    import snowflake.connector
+
+    return query_trace.traced(snowflake.connector.connect(
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        role=os.getenv("SNOWFLAKE_ROLE"),
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        database=os.getenv("SNOWFLAKE_DATABASE")
+    ))
+
+def get_local_db_connection(path):
+    import local_pipeline as lp
+
+    return lp.get_local_connection(path)
+
+class ReplicaCursor:
+    """sqlite cursor accepting the Snowflake connector's %s / %(name)s parameters"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, statement, params=None):
+        if params is None:
+            self._cursor.execute(risk_queries.local_sql(statement))
+        else:
+            self._cursor.execute(risk_queries.local_sql(statement), params)
+        return self
+
+    def executemany(self, statement, seq_of_params):
+        self._cursor.executemany(risk_queries.local_sql(statement), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+class ReplicaConnection:
+    """The replica opened under the CURATE schema name, with Snowflake-style parameters"""
+
+    def __init__(self, conn, path):
+        self._conn = conn
+        self.path = path
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return ReplicaCursor(self._conn.cursor())
+
+    def execute(self, statement, params=None):
+        return self.cursor().execute(statement, params)
+
+    def executemany(self, statement, seq_of_params):
+        return self.cursor().executemany(statement, seq_of_params)
+
+def connect(path=DEFAULT_PATH, create=False):
+    """Open the replica; it must already exist unless create is set"""
+    if not create and not os.path.exists(path):
+        raise FileNotFoundError(f"No replica at '{path}' - run: python replica.py sync --replica {path}")
+    conn = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+    conn.execute("ATTACH DATABASE ? AS CURATE", (path,))
+    conn.create_aggregate('HASH_AGG', 1, risk_queries.HashAgg)
+    for statement in REPLICA_SCHEMA + repo_search.SEARCH_SCHEMA:
+        conn.execute(statement)
+    return query_trace.traced(ReplicaConnection(conn, path))
+
+def open_cache(path=DEFAULT_PATH):
+    """The result cache of the replica at `path`, checked against the last sync on every read"""
+    return result_cache.ResultCache(
+        f"{path}.cache",
+        FRESHNESS_SQL,
+        max_bytes=int(float(os.getenv("RISK_ANALYSIS_CACHE_MB", result_cache.DEFAULT_MAX_MB)) * 2**20),
+        ttl=0,
+    )
+
+def warm(path=DEFAULT_PATH, queries=WARM_QUERIES):
+    """Compute the whole-table reports into the replica's result cache"""
+    conn = connect(path)
+    cache = open_cache(path)
+
+    def execute(sql, params=None):
+        return conn.execute(sql, params).fetchall()
+
+    try:
+        for query in queries:
+            cache.fetch(query, None, execute)
+    finally:
+        cache.close()
+        conn.close()
+
+def _value(value):
+    """Snowflake values as stored in the replica (timestamps in the local pipeline's text format)"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _source_rows(source, statement, params, local_source, batch_size):
+    cursor = source.cursor()
+    try:
+        if local_source:
+            cursor.execute(risk_queries.local_sql(statement), params)
+        else:
+            cursor.execute(statement, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [tuple(_value(value) for value in row) for row in rows]
+    finally:
+        cursor.close()
+
+def _source_scalar(source, statement, local_source):
+    batches = _source_rows(source, statement, {}, local_source, 1)
+    try:
+        return next(batches)[0][0]
+    finally:
+        batches.close()
+
+def _reconcile_deletes(source, replica, table, key, local_source, batch_size):
+    """Drop replica rows whose keys are gone from the source; returns the rows removed"""
+    replica.execute(f"CREATE TEMP TABLE source_keys ({', '.join(key)}, PRIMARY KEY ({', '.join(key)}))")
+    try:
+        statement = f"SELECT {', '.join(key)} FROM CURATE.{table}"
+        for rows in _source_rows(source, statement, {}, local_source, batch_size):
+            replica.executemany(
+                f"INSERT OR IGNORE INTO temp.source_keys VALUES ({', '.join('%s' for _ in key)})", rows
+            )
+        match = ' AND '.join(f"s.{column} = {table}.{column}" for column in key)
+        removed = replica.execute(f"""
+            DELETE FROM CURATE.{table}
+            WHERE NOT EXISTS (SELECT 1 FROM temp.source_keys s WHERE {match})
+        """).rowcount
+    finally:
+        replica.execute("DROP TABLE temp.source_keys")
+    return removed
+
+def sync_table(source, replica, table, columns, key, watermark_columns, full=False, local_source=False,
+               batch_size=BATCH_SIZE):
+    """Copy one table's rows changed since its watermark; returns (rows copied, rows removed)"""
+    state = replica.execute("SELECT watermark FROM CURATE.REPLICA_SYNC WHERE table_name = %s", (table,)).fetchone()
+    watermark = None if full or state is None else state[0]
+    if full:
+        replica.execute(f"DELETE FROM CURATE.{table}")
+
+    statement = f"SELECT {', '.join(columns)} FROM CURATE.{table}"
+    params = {}
+    if watermark is not None:
+        # each load stamps its rows with one timestamp and loads run one at a time, so every
+        # row written after the last sync is strictly newer than the watermark
+        statement += " WHERE " + " OR ".join(f"{column} > %(watermark)s" for column in watermark_columns)
+        params = {'watermark': watermark}
+
+    update = ', '.join(f"{column} = excluded.{column}" for column in columns if column not in key)
+    upsert = f"""
+        INSERT INTO CURATE.{table} ({', '.join(columns)}) VALUES ({', '.join('%s' for _ in columns)})
+        ON CONFLICT ({', '.join(key)}) DO UPDATE SET {update}
+    """
+    positions = [columns.index(column) for column in watermark_columns]
+    copied = 0
+    for rows in _source_rows(source, statement, params, local_source, batch_size):
+        replica.executemany(upsert, rows)
+        copied += len(rows)
+        batch_max = max((row[i] for row in rows for i in positions if row[i] is not None), default=None)
+        if batch_max is not None and (watermark is None or batch_max > watermark):
+            watermark = batch_max
+
+    source_count = _source_scalar(source, f"SELECT COUNT(*) FROM CURATE.{table}", local_source)
+    replica_count = replica.execute(f"SELECT COUNT(*) FROM CURATE.{table}").fetchone()[0]
+    removed = 0
+    if replica_count != source_count:
+        removed = _reconcile_deletes(source, replica, table, key, local_source, batch_size)
+
+    replica.execute("""
+        INSERT INTO CURATE.REPLICA_SYNC (table_name, watermark, synced_at, rows_copied, row_count)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (table_name) DO UPDATE SET
+            watermark = excluded.watermark, synced_at = excluded.synced_at,
+            rows_copied = excluded.rows_copied, row_count = excluded.row_count
+    """, (table, watermark, datetime.now().isoformat(sep=' '), copied, source_count))
+    return copied, removed
+
+def sync(source, path=DEFAULT_PATH, full=False, local_source=False, batch_size=BATCH_SIZE, warm_cache=True):
+    """Bring the replica at `path` up to date with the source's CURATE tables"""
+    replica = connect(path, create=True)
+    results = {}
+    try:
+        for table, columns, key, watermark_columns in REPLICATED_TABLES:
+            start = time.perf_counter()
+            with query_trace.stage(f"sync.{table}"):
+                replica.execute("BEGIN")
+                try:
+                    previous = replica.execute(
+                        "SELECT watermark FROM CURATE.REPLICA_SYNC WHERE table_name = %s", (table,)
+                    ).fetchone()
+                    copied, removed = sync_table(source, replica, table, columns, key, watermark_columns,
+                                                 full, local_source, batch_size)
+                    results[table] = (copied, removed, time.perf_counter() - start)
+                    if table == 'RISK_ANALYSIS_DATA_PRODUCT':
+                        start = time.perf_counter()
+                        # a replica synced before it had a search index gets it built in full
+                        indexed = replica.execute("SELECT 1 FROM CURATE.SEARCH_REPOS LIMIT 1").fetchone()
+                        since = None if full or previous is None or indexed is None else previous[0]
+                        added, dropped = repo_search.update_index(replica, since, removed_rows=full or removed > 0)
+                        results['SEARCH_INDEX'] = (added, dropped, time.perf_counter() - start)
+                    replica.execute("COMMIT")
+                except Exception:
+                    replica.execute("ROLLBACK")
+                    raise
+    finally:
+        replica.close()
+    if warm_cache:
+        warm(path)
+    return results
+
+def status(path=DEFAULT_PATH):
+    replica = connect(path)
+    try:
+        return replica.execute("""
+            SELECT table_name, watermark, synced_at, rows_copied, row_count
+            FROM CURATE.REPLICA_SYNC
+            ORDER BY table_name
+        """).fetchall()
+    finally:
+        replica.close()
+
+def print_status(rows):
+    print("\n" + "="*70)
+    print("REPLICA STATUS")
+    print("="*70)
+    for table, watermark, synced_at, copied, count in rows:
+        print(f"{table}: {count:,} rows, watermark {watermark}")
+        print(f"  last sync {synced_at}, {copied:,} rows copied")
+    print("="*70)
+
+def main():
+    parser = argparse.ArgumentParser(description='Local read replica of the CURATE data product')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sync_parser = subparsers.add_parser('sync', help='Copy rows changed since the last sync')
+    sync_parser.add_argument('--full', action='store_true', help='Recopy everything instead of the changes')
+    sync_parser.add_argument('--db', type=str, help='Sync from a file-backed local pipeline instead of Snowflake')
+    status_parser = subparsers.add_parser('status', help='Show the watermark and size of each replicated table')
+    for command_parser in (sync_parser, status_parser):
+        command_parser.add_argument('--replica', type=str, default=os.getenv("RISK_ANALYSIS_REPLICA", DEFAULT_PATH),
+                                    help=f'Replica file (default: RISK_ANALYSIS_REPLICA or {DEFAULT_PATH})')
+
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        print_status(status(args.replica))
+        return
+
+    source = get_local_db_connection(args.db) if args.db else get_connection()
+    try:
+        results = sync(source, args.replica, full=args.full, local_source=bool(args.db))
+    finally:
+        source.close()
+
+    print("\n" + "="*70)
+    print(f"REPLICA SYNC: {args.replica}")
+    print("="*70)
+    for table, (copied, removed, elapsed) in results.items():
+        print(f"{table}: {copied:,} rows in, {removed:,} removed in {elapsed:.2f}s")
+    print("="*70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+import heapq
+import re
+import threading
+from collections import Counter, defaultdict
+
+import risk_queries
+
+# Trigram index over repository full names, kept in the local replica next to the data
+# product it searches. Every repository is indexed under the trigrams of its lower-cased
+# full name, and every distinct word of the indexed names (owner and name split on
+# punctuation) under its space-padded trigrams. A lookup reads exact and prefix matches
+# from the name indexes first; substring matches come from the postings of the query's
+# rarest trigram, intersected with the second rarest, while fewer than `limit` matches
+# were found. Only a query matching nothing that way (a typo) falls back to fuzzy
+# matching: each query word is corrected against the word vocabulary, which is far
+# smaller than the repository list, and the repositories containing the corrected words
+# are ranked by similarity. replica.sync() indexes new repositories and drops removed
+# ones after each sync. A process that corrects words more than once against the same
+# replica (the risk daemon, a benchmark) keeps the vocabulary and its trigram postings in
+# memory, reloaded whenever SEARCH_VERSION shows the vocabulary changed; a one-off lookup
+# keeps reading them from the index tables.
+
+SUBSTRING_CANDIDATES = 1000
+FUZZY_WORD_CANDIDATES = 50
+MAX_CORRECTIONS = 3
+FUZZY_CANDIDATES = 200
+MIN_SIMILARITY = 0.6
+
+# match kinds, best first
+EXACT, PREFIX, SUBSTRING, FUZZY = 'exact', 'prefix', 'substring', 'fuzzy'
+KIND_ORDER = {EXACT: 0, PREFIX: 1, SUBSTRING: 2, FUZZY: 3}
+
+SEARCH_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.SEARCH_REPOS (
+        repo_key INTEGER PRIMARY KEY,
+        full_name TEXT NOT NULL UNIQUE,
+        search_name TEXT NOT NULL,
+        owner TEXT NOT NULL,
+        name TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS CURATE.IX_SEARCH_NAME ON SEARCH_REPOS (search_name)",
+    "CREATE INDEX IF NOT EXISTS CURATE.IX_SEARCH_OWNER ON SEARCH_REPOS (owner)",
+    "CREATE INDEX IF NOT EXISTS CURATE.IX_SEARCH_REPO_NAME ON SEARCH_REPOS (name)",
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.SEARCH_GRAMS (
+        gram TEXT NOT NULL,
+        repo_key INTEGER NOT NULL,
+        PRIMARY KEY (gram, repo_key)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.SEARCH_GRAM_COUNTS (
+        gram TEXT PRIMARY KEY,
+        repos INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.SEARCH_WORDS (
+        word TEXT PRIMARY KEY,
+        repos INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.SEARCH_WORD_GRAMS (
+        gram TEXT NOT NULL,
+        word TEXT NOT NULL,
+        PRIMARY KEY (gram, word)
+    ) WITHOUT ROWID
+    """,
+    # a random token replaced on every vocabulary change, so a rebuilt replica never reuses one
+    """
+    CREATE TABLE IF NOT EXISTS CURATE.SEARCH_VERSION (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """,
+]
+
+def normalize(text):
+    return text.strip().lower()
+
+def name_parts(full_name):
+    """(owner, name) of a normalized full name"""
+    owner, _, name = full_name.partition('/')
+    return owner, name
+
+def substring_grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def fuzzy_grams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def words(text):
+    return [word for word in re.split(r'[^a-z0-9]+', text) if word]
+
+def _placeholders(values):
+    return ', '.join('%s' for _ in values)
+
+def _gram_counts(conn, grams):
+    grams = list(grams)
+    if not grams:
+        return {}
+    return dict(conn.execute(
+        f"SELECT gram, repos FROM CURATE.SEARCH_GRAM_COUNTS WHERE gram IN ({_placeholders(grams)})", grams
+    ).fetchall())
+
+def _add_counts(conn, counts, sign):
+    conn.executemany("""
+        INSERT INTO CURATE.SEARCH_GRAM_COUNTS (gram, repos) VALUES (%s, %s)
+        ON CONFLICT (gram) DO UPDATE SET repos = repos + excluded.repos
+    """, [(gram, sign * count) for gram, count in counts.items()])
+    if sign < 0:
+        conn.execute("DELETE FROM CURATE.SEARCH_GRAM_COUNTS WHERE repos <= 0")
+
+def _add_words(conn, counts, sign):
+    """Adjust the vocabulary's repository counts; new words get their grams, unused ones lose them"""
+    if not counts:
+        return
+    if sign > 0:
+        known = set()
+        vocabulary = list(counts)
+        for start in range(0, len(vocabulary), 500):
+            chunk = vocabulary[start:start + 500]
+            known.update(row[0] for row in conn.execute(
+                f"SELECT word FROM CURATE.SEARCH_WORDS WHERE word IN ({_placeholders(chunk)})", chunk
+            ).fetchall())
+        conn.executemany("INSERT INTO CURATE.SEARCH_WORD_GRAMS (gram, word) VALUES (%s, %s)", [
+            (gram, word) for word in vocabulary if word not in known for gram in fuzzy_grams(word)
+        ])
+    conn.executemany("""
+        INSERT INTO CURATE.SEARCH_WORDS (word, repos) VALUES (%s, %s)
+        ON CONFLICT (word) DO UPDATE SET repos = repos + excluded.repos
+    """, [(word, sign * count) for word, count in counts.items()])
+    if sign < 0:
+        unused = [row[0] for row in conn.execute("SELECT word FROM CURATE.SEARCH_WORDS WHERE repos <= 0").fetchall()]
+        conn.executemany("DELETE FROM CURATE.SEARCH_WORD_GRAMS WHERE gram = %s AND word = %s", [
+            (gram, word) for word in unused for gram in fuzzy_grams(word)
+        ])
+        conn.execute("DELETE FROM CURATE.SEARCH_WORDS WHERE repos <= 0")
+    conn.execute("INSERT OR REPLACE INTO CURATE.SEARCH_VERSION (id, version) VALUES (1, random())")
+
+def index_repos(conn, full_names):
+    """Add repositories not yet in the index; returns how many were added"""
+    names = list(dict.fromkeys(full_names))
+    existing = set()
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        existing.update(row[0] for row in conn.execute(
+            f"SELECT full_name FROM CURATE.SEARCH_REPOS WHERE full_name IN ({_placeholders(chunk)})", chunk
+        ).fetchall())
+
+    rows = []
+    for full_name in names:
+        if full_name not in existing:
+            search_name = normalize(full_name)
+            rows.append((full_name, search_name) + name_parts(search_name))
+    if not rows:
+        return 0
+
+    next_key = conn.execute("SELECT COALESCE(MAX(repo_key), 0) + 1 FROM CURATE.SEARCH_REPOS").fetchone()[0]
+    keyed = [(next_key + i,) + row for i, row in enumerate(rows)]
+    conn.executemany("""
+        INSERT INTO CURATE.SEARCH_REPOS (repo_key, full_name, search_name, owner, name)
+        VALUES (%s, %s, %s, %s, %s)
+    """, keyed)
+
+    counts = Counter()
+    postings = []
+    for repo_key, _, search_name, _, _ in keyed:
+        grams = substring_grams(search_name)
+        counts.update(grams)
+        postings.extend((gram, repo_key) for gram in grams)
+    conn.executemany("INSERT INTO CURATE.SEARCH_GRAMS (gram, repo_key) VALUES (%s, %s)", postings)
+    _add_counts(conn, counts, 1)
+    _add_words(conn, Counter(word for row in keyed for word in set(words(row[2]))), 1)
+    return len(rows)
+
+def remove_repos(conn, full_names):
+    """Drop repositories from the index; returns how many were removed"""
+    removed = 0
+    names = list(full_names)
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        rows = conn.execute(f"""
+            SELECT repo_key, search_name FROM CURATE.SEARCH_REPOS WHERE full_name IN ({_placeholders(chunk)})
+        """, chunk).fetchall()
+        counts = Counter()
+        word_counts = Counter()
+        for repo_key, search_name in rows:
+            grams = substring_grams(search_name)
+            counts.update(grams)
+            word_counts.update(set(words(search_name)))
+            conn.executemany("DELETE FROM CURATE.SEARCH_GRAMS WHERE gram = %s AND repo_key = %s",
+                             [(gram, repo_key) for gram in grams])
+        conn.executemany("DELETE FROM CURATE.SEARCH_REPOS WHERE repo_key = %s", [(row[0],) for row in rows])
+        _add_counts(conn, counts, -1)
+        _add_words(conn, word_counts, -1)
+        removed += len(rows)
+    return removed
+
+def update_index(conn, since=None, removed_rows=False):
+    """Index the data product's repositories updated after `since` (all when None), and drop
+    indexed repositories that left the data product when rows were removed"""
+    statement = "SELECT FULL_NAME FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT WHERE DATA_SOURCE = 'git_hub'"
+    params = None
+    if since is not None:
+        statement += " AND LAST_UPDATED > %s"
+        params = (since,)
+    added = index_repos(conn, [row[0] for row in conn.execute(statement, params).fetchall()])
+
+    removed = 0
+    if removed_rows:
+        missing = conn.execute("""
+            SELECT s.full_name FROM CURATE.SEARCH_REPOS s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT p
+                WHERE p.DATA_SOURCE = 'git_hub' AND p.FULL_NAME = s.full_name
+            )
+        """).fetchall()
+        removed = remove_repos(conn, [row[0] for row in missing])
+    return added, removed
+
+def _kind(term, search_name, owner, name):
+    if term in (search_name, owner, name):
+        return EXACT
+    if search_name.startswith(term) or owner.startswith(term) or name.startswith(term):
+        return PREFIX
+    return SUBSTRING
+
+def _prefix_candidates(conn, term, limit):
+    """Exact and prefix matches on the full name, owner or name, read from the name indexes"""
+    upper = term + '\U0010ffff'
+    rows = []
+    for column in ('search_name', 'owner', 'name'):
+        rows += conn.execute(f"""
+            SELECT full_name, search_name, owner, name FROM CURATE.SEARCH_REPOS
+            WHERE {column} >= %s AND {column} < %s
+            ORDER BY {column}
+            LIMIT {int(limit)}
+        """, (term, upper)).fetchall()
+    return rows
+
+def _substring_candidates(conn, term, limit=SUBSTRING_CANDIDATES):
+    grams = substring_grams(term)
+    if not grams:
+        # shorter than a trigram: nothing to look up, so a bounded scan
+        return conn.execute(f"""
+            SELECT full_name, search_name, owner, name FROM CURATE.SEARCH_REPOS
+            WHERE instr(search_name, %s) > 0
+            LIMIT {int(limit)}
+        """, (term,)).fetchall()
+
+    counts = _gram_counts(conn, grams)
+    if len(counts) < len(grams):
+        return []
+    rarest = sorted(grams, key=lambda gram: (counts[gram], gram))
+    statement = """
+        SELECT s.full_name, s.search_name, s.owner, s.name
+        FROM CURATE.SEARCH_GRAMS g
+        JOIN CURATE.SEARCH_REPOS s ON s.repo_key = g.repo_key
+        WHERE g.gram = %s
+    """
+    params = [rarest[0]]
+    if len(rarest) > 1:
+        statement += """
+          AND EXISTS (SELECT 1 FROM CURATE.SEARCH_GRAMS g2 WHERE g2.gram = %s AND g2.repo_key = g.repo_key)
+        """
+        params.append(rarest[1])
+    statement += f" AND instr(s.search_name, %s) > 0 LIMIT {int(limit)}"
+    params.append(term)
+    return conn.execute(statement, params).fetchall()
+
+def edit_similarity(a, b):
+    """1 - optimal string alignment distance / longer length; a swap of neighbours is one edit"""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        char, before = a[i - 1], a[i - 2] if i > 1 else None
+        current = [i] + [0] * len(b)
+        left = i
+        for j in range(1, len(b) + 1):
+            best = min(previous[j], left) + 1
+            diagonal = previous[j - 1] + (char != b[j - 1])
+            if diagonal < best:
+                best = diagonal
+            if before is not None and j > 1 and char == b[j - 2] and before == b[j - 1] and previous2[j - 2] + 1 < best:
+                best = previous2[j - 2] + 1
+            current[j] = left = best
+        previous2, previous = previous, current
+    return 1 - previous[-1] / max(len(a), len(b), 1)
+
+def _edit_variants(word):
+    """The word with two neighbouring letters swapped or one letter dropped"""
+    swaps = {word[:i] + word[i + 1] + word[i] + word[i + 2:] for i in range(len(word) - 1)}
+    drops = {word[:i] + word[i + 1:] for i in range(len(word))}
+    return (swaps | drops) - {word, ''}
+
+def _best_corrections(word, candidates):
+    # the length difference alone is a lower bound on the distance
+    scored = [(candidate, edit_similarity(word, candidate)) for candidate in candidates
+              if 1 - abs(len(word) - len(candidate)) / max(len(word), len(candidate)) >= MIN_SIMILARITY]
+    scored = [(candidate, score) for candidate, score in scored if score >= MIN_SIMILARITY]
+    return sorted(scored, key=lambda item: (-item[1], item[0]))[:MAX_CORRECTIONS]
+
+class Vocabulary:
+    """The indexed words and their trigram postings, in memory"""
+
+    def __init__(self, conn, version):
+        self.version = version
+        self.words = {row[0] for row in conn.execute("SELECT word FROM CURATE.SEARCH_WORDS").fetchall()}
+        postings = defaultdict(list)
+        for word in self.words:
+            for gram in fuzzy_grams(word):
+                postings[gram].append(word)
+        self.postings = dict(postings)
+
+    def candidates(self, word):
+        """The same candidates as the index tables give: edit variants, then the most shared trigrams"""
+        candidates = self.words.intersection(_edit_variants(word))
+        shared = Counter()
+        for gram in fuzzy_grams(word):
+            shared.update(self.postings.get(gram, ()))
+        if len(shared) <= FUZZY_WORD_CANDIDATES:
+            return candidates.union(shared)
+        # the words sharing more trigrams than the last one kept, then the first of its ties by name
+        cutoff = heapq.nlargest(FUZZY_WORD_CANDIDATES, shared.values())[-1]
+        above = [candidate for candidate, count in shared.items() if count > cutoff]
+        ties = [candidate for candidate, count in shared.items() if count == cutoff]
+        candidates.update(above)
+        candidates.update(heapq.nsmallest(FUZZY_WORD_CANDIDATES - len(above), ties))
+        return candidates
+
+_vocabularies = {}
+_first_lookups = {}
+_vocabulary_lock = threading.Lock()
+
+def _vocabulary(conn):
+    """The in-memory vocabulary of the connection's replica, or None for its first lookup"""
+    path = getattr(conn, 'path', None)
+    if path is None:
+        return None
+    row = conn.execute("SELECT version FROM CURATE.SEARCH_VERSION WHERE id = 1").fetchone()
+    version = row[0] if row else None
+    with _vocabulary_lock:
+        vocabulary = _vocabularies.get(path)
+        if vocabulary is not None and vocabulary.version == version:
+            return vocabulary
+        if path not in _first_lookups or _first_lookups[path] != version:
+            # a one-off lookup reads the index tables; the next one loads the vocabulary
+            _first_lookups[path] = version
+            return None
+        vocabulary = _vocabularies[path] = Vocabulary(conn, version)
+        return vocabulary
+
+def corrections(conn, word):
+    """[(vocabulary word, similarity)] closest to a possibly misspelled word, best first"""
+    vocabulary = _vocabulary(conn)
+    if vocabulary is not None:
+        return _best_corrections(word, vocabulary.candidates(word))
+
+    # swapped and extra letters break most of a short word's trigrams, so those
+    # variants are looked up directly; other edits are found by shared trigrams
+    variants = list(_edit_variants(word))
+    candidates = {row[0] for row in conn.execute(
+        f"SELECT word FROM CURATE.SEARCH_WORDS WHERE word IN ({_placeholders(variants)})", variants
+    ).fetchall()} if variants else set()
+    grams = list(fuzzy_grams(word))
+    candidates.update(row[0] for row in conn.execute(f"""
+        SELECT word FROM CURATE.SEARCH_WORD_GRAMS
+        WHERE gram IN ({_placeholders(grams)})
+        GROUP BY word
+        ORDER BY COUNT(*) DESC, word
+        LIMIT {FUZZY_WORD_CANDIDATES}
+    """, grams).fetchall())
+    return _best_corrections(word, candidates)
+
+def _fuzzy_matches(conn, term):
+    """{full_name: (score, search_name)} of repositories containing corrections of every query word"""
+    corrected = [dict(corrections(conn, word)) for word in words(term)]
+    if not corrected or not all(corrected):
+        return {}
+
+    # candidates come from the corrections of the query word with the fewest alternatives
+    anchor = min(corrected, key=len)
+    candidates = {}
+    for correction in anchor:
+        for full_name, search_name, _, _ in _substring_candidates(conn, correction, FUZZY_CANDIDATES):
+            candidates[full_name] = search_name
+
+    matches = {}
+    for full_name, search_name in candidates.items():
+        repo_words = set(words(search_name))
+        scores = [max((score for word, score in options.items() if word in repo_words), default=0)
+                  for options in corrected]
+        if min(scores) > 0:
+            matches[full_name] = (sum(scores) / len(scores), search_name)
+    return matches
+
+def search(conn, term, limit=20, fuzzy=True):
+    """[(full_name, kind, score)] best matches first: exact, prefix, substring, then fuzzy"""
+    term = normalize(term)
+    if not term:
+        return []
+
+    matches = {}
+    for full_name, search_name, owner, name in _prefix_candidates(conn, term, limit):
+        matches[full_name] = (_kind(term, search_name, owner, name), len(term) / len(search_name), search_name)
+
+    if len(matches) < limit:
+        for full_name, search_name, owner, name in _substring_candidates(conn, term):
+            if full_name not in matches:
+                kind = _kind(term, search_name, owner, name)
+                matches[full_name] = (kind, len(term) / len(search_name), search_name)
+
+    if fuzzy and not matches:
+        for full_name, (score, search_name) in _fuzzy_matches(conn, term).items():
+            matches[full_name] = (FUZZY, score, search_name)
+
+    ranked = sorted(matches.items(), key=lambda item: (KIND_ORDER[item[1][0]], -item[1][1], item[1][2]))
+    return [(full_name, kind, round(score, 3)) for full_name, (kind, score, _) in ranked[:limit]]
+
+def search_rows(conn, term, limit=20, fuzzy=True):
+    """[(row, kind, score)] for the best matches, rows shaped like risk_queries.SEARCH_SQL"""
+    matches = search(conn, term, limit, fuzzy)
+    if not matches:
+        return []
+    names = [full_name for full_name, _, _ in matches]
+    rows = conn.execute(f"""
+        SELECT {', '.join(risk_queries.REPO_COLUMNS)}, LAST_UPDATED
+        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+        WHERE DATA_SOURCE = 'git_hub'
+          AND FULL_NAME IN ({_placeholders(names)})
+    """, names).fetchall()
+    by_name = {row[0]: row for row in rows}
+    return [(by_name[full_name], kind, score) for full_name, kind, score in matches if full_name in by_name]
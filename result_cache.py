@@ -0,0 +1,153 @@
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import time
+
+# On-disk cache of read-query results, kept in a SQLite file. Entries are keyed by the
+# connection identity (account, database, role), the normalized statement and its
+# parameters, and tagged with a freshness token, the result of a cheap statement over
+# the source table (MAX(LAST_UPDATED), COUNT(*)). When an identity's token changes its
+# entries are stale and dropped. By default the token is re-checked on every call; a
+# `ttl` above 0 trusts it for that many seconds, so a warm call inside the window answers
+# without a connection but may miss a load that landed meanwhile.
+# Least recently used entries are evicted past `max_bytes`.
+
+DEFAULT_PATH = '.risk_analysis_cache.db'
+DEFAULT_MAX_MB = 64
+DEFAULT_TTL = 0
+
+# bumped when the tables change; a cache file of another version is emptied and rebuilt
+SCHEMA_VERSION = 2
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        identity TEXT NOT NULL,
+        freshness TEXT NOT NULL,
+        payload BLOB NOT NULL,
+        bytes INTEGER NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used)",
+    """
+    CREATE TABLE IF NOT EXISTS freshness (
+        identity TEXT PRIMARY KEY,
+        token TEXT NOT NULL,
+        checked_at REAL NOT NULL
+    )
+    """,
+]
+
+def cache_key(query, params=None, identity=''):
+    statement = re.sub(r'\s+', ' ', query).strip()
+    return hashlib.sha256(f"{identity}\0{statement}\0{params!r}".encode('utf-8')).hexdigest()
+
+def connection_identity():
+    """The Snowflake account, database and role the CLI connects as"""
+    return '/'.join(os.getenv(name) or '' for name in ('SNOWFLAKE_ACCOUNT', 'SNOWFLAKE_DATABASE', 'SNOWFLAKE_ROLE'))
+
+class ResultCache:
+    """Size-bounded LRU of query results, invalidated when the freshness token changes"""
+
+    def __init__(self, path=DEFAULT_PATH, freshness_sql=None, max_bytes=DEFAULT_MAX_MB * 2**20, ttl=DEFAULT_TTL,
+                 identity=''):
+        self.path = path
+        self.freshness_sql = freshness_sql
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.identity = identity
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS entries")
+            self.conn.execute("DROP TABLE IF EXISTS freshness")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+
+    def close(self):
+        self.conn.close()
+
+    def freshness(self, execute, force=False):
+        """The freshness token, re-checked with execute(freshness_sql) once it is older than ttl"""
+        row = self.conn.execute(
+            "SELECT token, checked_at FROM freshness WHERE identity = ?", (self.identity,)
+        ).fetchone()
+        if row is not None and not force and time.time() - row[1] < self.ttl:
+            return row[0]
+
+        token = repr(tuple(execute(self.freshness_sql)[0]))
+        if row is None or row[0] != token:
+            self.conn.execute("DELETE FROM entries WHERE identity = ? AND freshness <> ?", (self.identity, token))
+        self.conn.execute("""
+            INSERT INTO freshness (identity, token, checked_at) VALUES (?, ?, ?)
+            ON CONFLICT (identity) DO UPDATE SET token = excluded.token, checked_at = excluded.checked_at
+        """, (self.identity, token, time.time()))
+        return token
+
+    def get(self, key, freshness):
+        row = self.conn.execute("SELECT freshness, payload FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != freshness:
+            return None
+        self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[1])
+
+    def put(self, key, freshness, rows):
+        payload = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        self.conn.execute("""
+            INSERT INTO entries (key, identity, freshness, payload, bytes, last_used) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                freshness = excluded.freshness, payload = excluded.payload,
+                bytes = excluded.bytes, last_used = excluded.last_used
+        """, (key, self.identity, freshness, payload, len(payload), time.time()))
+        self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, bytes FROM entries ORDER BY last_used").fetchall():
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def fetch(self, query, params, execute, refresh=False):
+        """Rows of the query from the cache, or from execute(query, params) on a miss"""
+        freshness = self.freshness(execute, force=refresh)
+        key = cache_key(query, params, self.identity)
+        rows = None if refresh else self.get(key, freshness)
+        if rows is not None:
+            self.hits += 1
+            return rows
+
+        self.misses += 1
+        rows = [tuple(row) for row in execute(query, params)]
+        self.put(key, freshness, rows)
+        return rows
+
+    def clear(self):
+        self.conn.execute("DELETE FROM entries")
+        self.conn.execute("DELETE FROM freshness")
+
+    def stats(self):
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries").fetchone()
+        return {'entries': entries, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
+
+def from_env(freshness_sql):
+    """The cache configured by RISK_ANALYSIS_CACHE, RISK_ANALYSIS_CACHE_MB and RISK_ANALYSIS_CACHE_TTL"""
+    return ResultCache(
+        os.getenv("RISK_ANALYSIS_CACHE", DEFAULT_PATH),
+        freshness_sql,
+        max_bytes=int(float(os.getenv("RISK_ANALYSIS_CACHE_MB", DEFAULT_MAX_MB)) * 2**20),
+        ttl=float(os.getenv("RISK_ANALYSIS_CACHE_TTL", DEFAULT_TTL)),
+        identity=connection_identity(),
+    )
@@ -1,178 +1,364 @@
-import snowflake.connector
 import os
+import sys
+
+import risk_daemon
+
+# A running risk_daemon.py answers the command before this process imports anything else
+if __name__ == "__main__":
+    _daemon_code = risk_daemon.forward(sys.argv[1:])
+    if _daemon_code is not None:
+        sys.exit(_daemon_code)
+
 from dotenv import load_dotenv
-import pandas as pd
 import argparse
 from datetime import datetime
-import sys
+
+import profiling
+import query_trace
+import replica
+import repo_search
+import result_cache
+import risk_export
+import risk_queries
 
 load_dotenv()
 
+# pandas, numpy (risk_scoring) and the Snowflake connector are imported by the code paths that use
+# them: together they are most of the startup time of a --report or --summary that reads one row
+
+# Replica file the reports read from instead of Snowflake, set up by main() with --replica
+_replica_path = None
+
+def use_replica(path):
+    global _replica_path
+    _replica_path = path
+
 def get_connection():
+    if _replica_path is not None:
+        return replica.connect(_replica_path)
+    if _session is not None:
+        return _session.connection()
+    return snowflake_connection()
+
+def snowflake_connection(**options):
+    import snowflake.connector
 
-    return snowflake.connector.connect(
+    return query_trace.traced(snowflake.connector.connect(
         user=os.getenv("SNOWFLAKE_USER"),
         password=os.getenv("SNOWFLAKE_PASSWORD"),
         role=os.getenv("SNOWFLAKE_ROLE"),
         account=os.getenv("SNOWFLAKE_ACCOUNT"),
         warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
-        database=os.getenv("SNOWFLAKE_DATABASE")
-    )
+        database=os.getenv("SNOWFLAKE_DATABASE"),
+        **options
+    ))
+
+# Long-lived connection handed out instead of logging in per command, set by risk_daemon.py
+_session = None
+
+def use_session(session):
+    global _session
+    _session = session
+
+# Result cache for the read reports, set up by main() unless --no-cache is given
+_cache = None
+
+def use_cache(cache):
+    global _cache
+    _cache = cache
+
+def _fetch(query, params=None, one=False):
+    """Run one read query, answered from the result cache while CURATE is unchanged"""
+    conn = None
+
+    def execute(sql, sql_params=None):
+        nonlocal conn
+        if conn is None:
+            conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            if sql_params is None:
+                cursor.execute(sql)
+            else:
+                cursor.execute(sql, sql_params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    try:
+        rows = execute(query, params) if _cache is None else _cache.fetch(query, params, execute)
+    finally:
+        if conn is not None:
+            conn.close()
+    if one:
+        return rows[0] if rows else None
+    return rows
+
+def print_summary(result):
+    print("\n" + "="*70)
+    print("RISK ANALYSIS SUMMARY")
+    print("="*70)
+    print(f"Total Repositories: {result[0]}")
+    print(f"Average Risk Score: {result[1]}/100")
+    print(f"\nRisk Distribution:")
+    print(f"  High Risk:   {result[2]} ({result[2]/result[0]*100:.1f}%)")
+    print(f"  Medium Risk: {result[3]} ({result[3]/result[0]*100:.1f}%)")
+    print(f"  Low Risk:    {result[4]} ({result[4]/result[0]*100:.1f}%)")
+    print(f"\nLast Updated: {result[5]}")
+    print("="*70)
+
+def print_repositories(title, results):
+    print("\n" + "="*100)
+    print(title)
+    print("="*100)
+    print(f"{'Repository':<40} {'Lang':<10} {'Stars':<8} {'Commits':<8} {'Contrib':<8} {'Last Rel':<10} {'Issues':<8} {'Score':<8} {'Risk'}")
+    print("-"*100)
+
+    for row in results:
+        full_name = row[0][:38] + ".." if len(row[0]) > 40 else row[0]
+        print(f"{full_name:<40} {row[1] or 'N/A':<10} {row[2]:<8} {row[3]:<8} {row[4]:<8} {row[5]:<10} {row[6]:<8} {row[7]:<8.1f} {row[8]}")
+
+    print("="*100)
+
+def print_by_language(results):
+    print("\n" + "="*90)
+    print("RISK ANALYSIS BY PROGRAMMING LANGUAGE")
+    print("="*90)
+    print(f"{'Language':<15} {'Repos':<8} {'Avg Score':<10} {'High':<8} {'Medium':<8} {'Low':<8}")
+    print("-"*90)
+
+    for row in results:
+        print(f"{row[0][:14]:<15} {row[1]:<8} {row[2]:<10.1f} {row[3]:<8} {row[4]:<8} {row[5]:<8}")
+
+    print("="*90)
 
 def show_summary():
     """Show summary statistics of risk analysis"""
+    print_summary(_fetch(risk_queries.SUMMARY_SQL, one=True))
+
+def show_top_risky(limit=10):
+    """Show top N most risky repositories"""
+    results = _fetch(risk_queries.top_repositories_sql(limit, riskiest=True))
+    print_repositories(f"TOP {limit} MOST RISKY REPOSITORIES", results)
+
+def show_healthiest(limit=10):
+    """Show top N healthiest repositories"""
+    results = _fetch(risk_queries.top_repositories_sql(limit, riskiest=False))
+    print_repositories(f"TOP {limit} HEALTHIEST REPOSITORIES (LOWEST RISK)", results)
+
+def show_by_language():
+    """Show risk analysis by programming language"""
+    print_by_language(_fetch(risk_queries.LANGUAGES_SQL))
+
+def show_dashboard(limit=15):
+    """Show summary, languages, riskiest and healthiest repositories from one query"""
+    sections = risk_queries.split_dashboard(_fetch(risk_queries.dashboard_sql(limit, limit)))
+
+    print_summary(sections['summary'])
+    print_by_language(sections['languages'])
+    print_repositories(f"TOP {limit} MOST RISKY REPOSITORIES", sections['risky'])
+    print_repositories(f"TOP {limit} HEALTHIEST REPOSITORIES (LOWEST RISK)", sections['healthy'])
+
+def search_repository(search_term):
+    """Search for specific repository"""
     conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        # Get overall summary
-        query = """
-        SELECT 
-            COUNT(*) as total_repos,
-            ROUND(AVG(RISK_SCORE), 2) as avg_risk_score,
-            COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END) as high_risk_count,
-            COUNT(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 END) as medium_risk_count,
-            COUNT(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 END) as low_risk_count,
-            MAX(LAST_UPDATED) as last_updated
-        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
-        WHERE DATA_SOURCE = 'git_hub'
-        """
+        if _replica_path is not None:
+            # the replica's trigram index: ranked substring, prefix and typo-tolerant matches
+            matches = repo_search.search_rows(conn, search_term, limit=20)
+            results = [row for row, _, _ in matches]
+            kinds = [kind for _, kind, _ in matches]
+        else:
+            cursor.execute(risk_queries.SEARCH_SQL, (f'%{search_term}%',))
+            results = cursor.fetchall()
+            kinds = [None] * len(results)
         
-        cursor.execute(query)
-        result = cursor.fetchone()
+        if not results:
+            print(f"\nNo repositories found matching: '{search_term}'")
+            return
         
-        print("\n" + "="*70)
-        print("RISK ANALYSIS SUMMARY")
-        print("="*70)
-        print(f"Total Repositories: {result[0]}")
-        print(f"Average Risk Score: {result[1]}/100")
-        print(f"\nRisk Distribution:")
-        print(f"  High Risk:   {result[2]} ({result[2]/result[0]*100:.1f}%)")
-        print(f"  Medium Risk: {result[3]} ({result[3]/result[0]*100:.1f}%)")
-        print(f"  Low Risk:    {result[4]} ({result[4]/result[0]*100:.1f}%)")
-        print(f"\nLast Updated: {result[5]}")
-        print("="*70)
+        print(f"\n" + "="*120)
+        print(f"SEARCH RESULTS FOR: '{search_term}' ({len(results)} repositories found)")
+        print("="*120)
+        
+        for row, kind in zip(results, kinds):
+            print(f"\nRepository: {row[0]}" + (f" ({kind} match)" if kind else ""))
+            print(f"Language: {row[1] or 'N/A'}")
+            print(f"Stars: {row[2]:,} | Recent Commits: {row[3]} | Active Contributors: {row[4]}")
+            print(f"Days since last release: {row[5]} | Open Issues: {row[6]}")
+            print(f"Risk Score: {row[7]:.1f}/100 ({row[8]} RISK)")
+            print(f"Last Analyzed: {row[9]}")
+            print("-"*60)
+        
+        print("="*120)
         
     finally:
         cursor.close()
         conn.close()
 
-def show_top_risky(limit=10):
-    """Show top N most risky repositories"""
+def export_data(filename="risk_analysis_export.csv", fmt=None):
+    """Stream the risk analysis data to a CSV, JSONL or Parquet file"""
+    fmt = fmt or risk_export.format_for(filename)
     conn = get_connection()
-    cursor = conn.cursor()
     
     try:
-        query = f"""
-        SELECT 
-            FULL_NAME,
-            LANGUAGE,
-            STARS,
-            COMMITS_90D,
-            ACTIVE_CONTRIBUTORS_90D,
-            DAYS_SINCE_LAST_RELEASE,
-            OPEN_ISSUES,
-            RISK_SCORE,
-            RISK_CATEGORY
-        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
-        WHERE DATA_SOURCE = 'git_hub'
-        ORDER BY RISK_SCORE DESC
-        LIMIT {limit}
-        """
+        # sys.stderr as it is now: risk_daemon.py captures it per command
+        stats = risk_export.export(conn, filename, fmt, progress=sys.stderr)
         
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        print("\n" + "="*100)
-        print(f"TOP {limit} MOST RISKY REPOSITORIES")
-        print("="*100)
-        print(f"{'Repository':<40} {'Lang':<10} {'Stars':<8} {'Commits':<8} {'Contrib':<8} {'Last Rel':<10} {'Issues':<8} {'Score':<8} {'Risk'}")
-        print("-"*100)
+        print(f"\n✓ Exported {stats.rows:,} records to '{filename}' ({fmt})")
+        print(f"  Columns exported: {', '.join(risk_queries.EXPORT_COLUMNS)}")
         
-        for row in results:
-            full_name = row[0][:38] + ".." if len(row[0]) > 40 else row[0]
-            print(f"{full_name:<40} {row[1] or 'N/A':<10} {row[2]:<8} {row[3]:<8} {row[4]:<8} {row[5]:<10} {row[6]:<8} {row[7]:<8.1f} {row[8]}")
-        
-        print("="*100)
+        # Summary accumulated while streaming
+        print(f"\n  Export Summary:")
+        print(f"  - Total records: {stats.rows:,}")
+        print(f"  - Average risk score: {stats.average_score:.1f}")
+        print(f"  - High risk: {stats.categories['HIGH']:,}")
+        print(f"  - Medium risk: {stats.categories['MEDIUM']:,}")
+        print(f"  - Low risk: {stats.categories['LOW']:,}")
         
     finally:
-        cursor.close()
         conn.close()
 
-def show_healthiest(limit=10):
-    """Show top N healthiest repositories"""
+def export_dataset(directory, incremental=False):
+    """Append a Hive-partitioned Parquet snapshot of the data product to a dataset directory"""
     conn = get_connection()
-    cursor = conn.cursor()
     
     try:
-        query = f"""
-        SELECT 
-            FULL_NAME,
-            LANGUAGE,
-            STARS,
-            COMMITS_90D,
-            ACTIVE_CONTRIBUTORS_90D,
-            DAYS_SINCE_LAST_RELEASE,
-            OPEN_ISSUES,
-            RISK_SCORE,
-            RISK_CATEGORY
-        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
-        WHERE DATA_SOURCE = 'git_hub'
-        ORDER BY RISK_SCORE ASC
-        LIMIT {limit}
-        """
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        print("\n" + "="*100)
-        print(f"TOP {limit} HEALTHIEST REPOSITORIES (LOWEST RISK)")
-        print("="*100)
-        print(f"{'Repository':<40} {'Lang':<10} {'Stars':<8} {'Commits':<8} {'Contrib':<8} {'Last Rel':<10} {'Issues':<8} {'Score':<8} {'Risk'}")
-        print("-"*100)
-        
-        for row in results:
-            full_name = row[0][:38] + ".." if len(row[0]) > 40 else row[0]
-            print(f"{full_name:<40} {row[1] or 'N/A':<10} {row[2]:<8} {row[3]:<8} {row[4]:<8} {row[5]:<10} {row[6]:<8} {row[7]:<8.1f} {row[8]}")
+        entry = risk_export.export_dataset(conn, directory, incremental=incremental, progress=sys.stderr)
+        if entry is None:
+            print(f"\n✓ No repositories updated since the last snapshot in '{directory}'")
+            return
         
-        print("="*100)
+        partitions = {file['path'].rsplit('/', 1)[0] for file in entry['files']}
+        print(f"\n✓ Exported {entry['rows']:,} records to '{directory}' as {entry['kind']} snapshot {entry['snapshot']}")
+        print(f"  Partitioned by: {', '.join(risk_export.DATASET_PARTITIONS)} "
+              f"({len(partitions)} partitions, {len(entry['files'])} files)")
+        if entry['kind'] == 'delta':
+            print(f"  Rows updated after {entry['since']}, on top of snapshot {entry['base']}")
+        print(f"  Manifest: {os.path.join(directory, risk_export.MANIFEST)}")
+        print(f"  - High risk: {entry['categories'].get('HIGH', 0):,}")
+        print(f"  - Medium risk: {entry['categories'].get('MEDIUM', 0):,}")
+        print(f"  - Low risk: {entry['categories'].get('LOW', 0):,}")
         
     finally:
-        cursor.close()
         conn.close()
 
-def show_by_language():
-    """Show risk analysis by programming language"""
+def print_detailed_report(result):
+    print("\n" + "="*70)
+    print("DETAILED RISK ANALYSIS REPORT")
+    print("="*70)
+    print(f"Repository: {result[0]}")
+    print(f"Language: {result[1] or 'N/A'}")
+    print(f"Last Updated: {result[9]}")
+    print("\n" + "-"*70)
+    print("METRICS:")
+    print(f"  • Stars: {result[2]:,}")
+    print(f"  • Commits (last 90 days): {result[3]}")
+    print(f"  • Active Contributors (last 90 days): {result[4]}")
+    print(f"  • Days since last release: {result[5]}")
+    print(f"  • Open Issues: {result[6]}")
+    print("\n" + "-"*70)
+    print("RISK ASSESSMENT:")
+    print(f"  • Risk Score: {result[7]:.1f}/100")
+    print(f"  • Risk Category: {result[8]}")
+    print("\n" + "-"*70)
+    print("INTERPRETATION:")
+    
+    if result[8] == 'HIGH':
+        print("  ⚠️  HIGH RISK: This repository shows significant risk factors.")
+        print("     Consider finding alternatives or closely monitoring usage.")
+    elif result[8] == 'MEDIUM':
+        print("  ⚠️  MEDIUM RISK: Some concerns identified.")
+        print("     Monitor regularly and have contingency plans.")
+    else:
+        print("  ✅ LOW RISK: Repository appears healthy and well-maintained.")
+        print("     Suitable for production use with standard monitoring.")
+    
+    print("="*70)
+
+def show_detailed_report(repo_name):
+    """Show detailed risk analysis for a specific repository"""
+    result = _fetch(risk_queries.REPORT_SQL, (repo_name,), one=True)
+
+    if not result:
+        print(f"\nRepository not found: '{repo_name}'")
+        print("Try searching with a partial name using: python risk_analysis_cli.py --search <term>")
+        return
+
+    print_detailed_report(result)
+
+def read_repo_names(path):
+    """Repository names from a file, one per line; blank lines and # comments are skipped"""
+    with open(path, encoding='utf-8') as file:
+        lines = [line.split('#', 1)[0].strip() for line in file]
+    return [line for line in lines if line]
+
+def show_batch_report(repo_names, output=None):
+    """Show the risk of many repositories, looked up together, and the names not found"""
+    unique = {}
+    for name in repo_names:
+        unique.setdefault(name.strip().upper(), name.strip())
+    names = [name for name in unique.values() if name]
+    
+    rows = []
+    for start in range(0, len(names), risk_queries.REPORT_BATCH_SIZE):
+        chunk = names[start:start + risk_queries.REPORT_BATCH_SIZE]
+        rows += _fetch(risk_queries.batch_report_sql(len(chunk)), tuple(chunk))
+    
+    found = {row[0].upper(): row for row in rows}
+    missing = [name for name in names if name.upper() not in found]
+    results = sorted((found[name.upper()][1:] for name in names if name.upper() in found), key=lambda row: -row[7])
+    
+    if results:
+        print_repositories(f"RISK REPORT FOR {len(names)} REPOSITORIES ({len(results)} found)", results)
+        categories = [row[8] for row in results]
+        print(f"High risk: {categories.count('HIGH')} | Medium risk: {categories.count('MEDIUM')} | "
+              f"Low risk: {categories.count('LOW')}")
+    
+    if missing:
+        print(f"\nRepositories not found ({len(missing)}):")
+        for name in missing:
+            print(f"  - {name}")
+        print("Try searching with a partial name using: python risk_analysis_cli.py --search <term>")
+    
+    if output:
+        blank = (None,) * (len(risk_queries.REPORT_BATCH_COLUMNS) - 1)
+        export_rows = [found[name.upper()] for name in names if name.upper() in found]
+        export_rows += [(name,) + blank for name in missing]
+        risk_export.write_rows(output, risk_queries.REPORT_BATCH_COLUMNS, export_rows)
+        print(f"\n✓ Exported {len(export_rows)} records to '{output}' (repositories not found have empty metrics)")
+
+def show_as_of(as_of, limit=10):
+    """Show the risk distribution and top N risky repositories as of a past date"""
     conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        query = """
-        SELECT 
-            COALESCE(LANGUAGE, 'Unknown') as language,
-            COUNT(*) as repo_count,
-            ROUND(AVG(RISK_SCORE), 2) as avg_risk_score,
-            COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END) as high_risk,
-            COUNT(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 END) as medium_risk,
-            COUNT(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 END) as low_risk
-        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
-        WHERE DATA_SOURCE = 'git_hub'
-        GROUP BY LANGUAGE
-        ORDER BY repo_count DESC
-        LIMIT 15
-        """
+        cursor.execute(risk_queries.AS_OF_SUMMARY_SQL, {'as_of': as_of})
+        summary = cursor.fetchone()
+        
+        if not summary[0]:
+            print(f"\nNo risk history recorded as of: '{as_of}'")
+            return
         
-        cursor.execute(query)
+        cursor.execute(risk_queries.as_of_top_sql(limit), {'as_of': as_of})
         results = cursor.fetchall()
         
         print("\n" + "="*90)
-        print("RISK ANALYSIS BY PROGRAMMING LANGUAGE")
+        print(f"RISK AS OF {as_of}")
         print("="*90)
-        print(f"{'Language':<15} {'Repos':<8} {'Avg Score':<10} {'High':<8} {'Medium':<8} {'Low':<8}")
+        print(f"Total Repositories: {summary[0]}")
+        print(f"Average Risk Score: {summary[1]}/100")
+        print(f"High Risk: {summary[2]} | Medium Risk: {summary[3]} | Low Risk: {summary[4]}")
+        print("\n" + "-"*90)
+        print(f"{'Repository':<40} {'Score':<8} {'Risk':<8} {'Model':<8} {'Scored Since'}")
         print("-"*90)
         
         for row in results:
-            print(f"{row[0][:14]:<15} {row[1]:<8} {row[2]:<10.1f} {row[3]:<8} {row[4]:<8} {row[5]:<8}")
+            full_name = row[0][:38] + ".." if len(row[0]) > 40 else row[0]
+            print(f"{full_name:<40} {row[1]:<8.1f} {row[2]:<8} {row[3]:<8} {row[4]}")
         
         print("="*90)
         
@@ -180,176 +366,124 @@ def show_by_language():
         cursor.close()
         conn.close()
 
-def search_repository(search_term):
-    """Search for specific repository"""
+def show_history(repo_name):
+    """Show every recorded risk score change for a specific repository"""
     conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        query = """
-        SELECT 
-            FULL_NAME,
-            LANGUAGE,
-            STARS,
-            COMMITS_90D,
-            ACTIVE_CONTRIBUTORS_90D,
-            DAYS_SINCE_LAST_RELEASE,
-            OPEN_ISSUES,
-            RISK_SCORE,
-            RISK_CATEGORY,
-            LAST_UPDATED
-        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
-        WHERE DATA_SOURCE = 'git_hub'
-          AND UPPER(FULL_NAME) LIKE UPPER(%s)
-        ORDER BY RISK_SCORE DESC
-        LIMIT 20
-        """
-        
-        cursor.execute(query, (f'%{search_term}%',))
+        cursor.execute(risk_queries.HISTORY_SQL, (repo_name,))
         results = cursor.fetchall()
         
         if not results:
-            print(f"\nNo repositories found matching: '{search_term}'")
+            print(f"\nNo risk history found for: '{repo_name}'")
             return
         
-        print(f"\n" + "="*120)
-        print(f"SEARCH RESULTS FOR: '{search_term}' ({len(results)} repositories found)")
-        print("="*120)
+        print("\n" + "="*90)
+        print(f"RISK HISTORY: {results[0][0]} ({len(results)} score changes)")
+        print("="*90)
+        print(f"{'Valid From':<28} {'Valid To':<28} {'Score':<8} {'Risk':<8} {'Model'}")
+        print("-"*90)
         
+        previous = None
         for row in results:
-            print(f"\nRepository: {row[0]}")
-            print(f"Language: {row[1] or 'N/A'}")
-            print(f"Stars: {row[2]:,} | Recent Commits: {row[3]} | Active Contributors: {row[4]}")
-            print(f"Days since last release: {row[5]} | Open Issues: {row[6]}")
-            print(f"Risk Score: {row[7]:.1f}/100 ({row[8]} RISK)")
-            print(f"Last Analyzed: {row[9]}")
-            print("-"*60)
+            trend = "" if previous is None else f" ({row[1] - previous:+.1f})"
+            print(f"{str(row[4]):<28} {str(row[5] or 'current'):<28} {row[1]:<8.1f} {row[2]:<8} {row[3]}{trend}")
+            previous = row[1]
         
-        print("="*120)
+        print("="*90)
         
     finally:
         cursor.close()
         conn.close()
 
-def export_to_csv(filename="risk_analysis_export.csv"):
-    """Export risk analysis data to CSV"""
+def score_metrics(stars, commits_90d, active_contributors_90d, days_since_last_release, open_issues):
+    """Score a repository from its metrics locally, without querying Snowflake"""
+    import risk_scoring
+
+    score = int(risk_scoring.risk_scores(
+        [stars], [commits_90d], [active_contributors_90d], [days_since_last_release], [open_issues]
+    )[0])
+    category = risk_scoring.risk_categories([score])[0]
+
+    print("\n" + "="*70)
+    print("LOCAL RISK SCORE")
+    print("="*70)
+    print(f"  • Stars: {stars:,}")
+    print(f"  • Commits (last 90 days): {commits_90d}")
+    print(f"  • Active Contributors (last 90 days): {active_contributors_90d}")
+    print(f"  • Days since last release: {days_since_last_release}")
+    print(f"  • Open Issues: {open_issues}")
+    print("-"*70)
+    print(f"  • Risk Score: {score:.1f}/100")
+    print(f"  • Risk Category: {category}")
+    print("="*70)
+
+def what_if_rescoring(candidate, baseline=None):
+    """Rescore the ENRICH snapshot under two risk model versions and show category migrations"""
+    import pandas as pd
+    import risk_scoring
+
     conn = get_connection()
     
     try:
-        query = """
-        SELECT 
-            DATA_SOURCE,
-            FULL_NAME,
-            LANGUAGE,
-            STARS,
-            COMMITS_90D,
-            ACTIVE_CONTRIBUTORS_90D,
-            DAYS_SINCE_LAST_RELEASE,
-            OPEN_ISSUES,
-            RISK_SCORE,
-            RISK_CATEGORY,
-            LAST_UPDATED
-        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+        query = f"""
+        SELECT {', '.join(risk_scoring.SCORING_COLUMNS)}
+        FROM ENRICH.REPO_ENTRYLINE
         WHERE DATA_SOURCE = 'git_hub'
-        ORDER BY RISK_SCORE DESC
         """
         
         df = pd.read_sql(query, conn)
-        df.to_csv(filename, index=False)
-        
-        print(f"\n✓ Exported {len(df)} records to '{filename}'")
-        print(f"  Columns exported: {', '.join(df.columns)}")
-        
-        # Show quick summary of exported data
-        print(f"\n  Export Summary:")
-        print(f"  - Total records: {len(df)}")
-        print(f"  - Average risk score: {df['RISK_SCORE'].mean():.1f}")
-        print(f"  - High risk: {(df['RISK_CATEGORY'] == 'HIGH').sum()}")
-        print(f"  - Medium risk: {(df['RISK_CATEGORY'] == 'MEDIUM').sum()}")
-        print(f"  - Low risk: {(df['RISK_CATEGORY'] == 'LOW').sum()}")
         
     finally:
         conn.close()
-
-def show_detailed_report(repo_name):
-    """Show detailed risk analysis for a specific repository"""
-    conn = get_connection()
-    cursor = conn.cursor()
     
-    try:
-        query = """
-        SELECT 
-            FULL_NAME,
-            LANGUAGE,
-            STARS,
-            COMMITS_90D,
-            ACTIVE_CONTRIBUTORS_90D,
-            DAYS_SINCE_LAST_RELEASE,
-            OPEN_ISSUES,
-            RISK_SCORE,
-            RISK_CATEGORY,
-            LAST_UPDATED
-        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
-        WHERE DATA_SOURCE = 'git_hub'
-          AND UPPER(FULL_NAME) = UPPER(%s)
-        """
-        
-        cursor.execute(query, (repo_name,))
-        result = cursor.fetchone()
-        
-        if not result:
-            print(f"\nRepository not found: '{repo_name}'")
-            print("Try searching with a partial name using: python risk_analysis_cli.py --search <term>")
-            return
-        
-        print("\n" + "="*70)
-        print("DETAILED RISK ANALYSIS REPORT")
-        print("="*70)
-        print(f"Repository: {result[0]}")
-        print(f"Language: {result[1] or 'N/A'}")
-        print(f"Last Updated: {result[9]}")
-        print("\n" + "-"*70)
-        print("METRICS:")
-        print(f"  • Stars: {result[2]:,}")
-        print(f"  • Commits (last 90 days): {result[3]}")
-        print(f"  • Active Contributors (last 90 days): {result[4]}")
-        print(f"  • Days since last release: {result[5]}")
-        print(f"  • Open Issues: {result[6]}")
-        print("\n" + "-"*70)
-        print("RISK ASSESSMENT:")
-        print(f"  • Risk Score: {result[7]:.1f}/100")
-        print(f"  • Risk Category: {result[8]}")
-        print("\n" + "-"*70)
-        print("INTERPRETATION:")
-        
-        if result[8] == 'HIGH':
-            print("  ⚠️  HIGH RISK: This repository shows significant risk factors.")
-            print("     Consider finding alternatives or closely monitoring usage.")
-        elif result[8] == 'MEDIUM':
-            print("  ⚠️  MEDIUM RISK: Some concerns identified.")
-            print("     Monitor regularly and have contingency plans.")
-        else:
-            print("  ✅ LOW RISK: Repository appears healthy and well-maintained.")
-            print("     Suitable for production use with standard monitoring.")
-        
-        print("="*70)
-        
-    finally:
-        cursor.close()
-        conn.close()
+    baseline_model = risk_scoring.load_model(baseline)
+    candidate_model = risk_scoring.load_model(candidate)
+    columns = {column: df[column].to_numpy(dtype='float64') for column in risk_scoring.SCORING_COLUMNS}
+    
+    start = datetime.now()
+    result = risk_scoring.what_if(columns, baseline_model, candidate_model)
+    elapsed = (datetime.now() - start).total_seconds()
+    risk_scoring.print_what_if(result, baseline_model, candidate_model, elapsed)
 
 def main():
-    parser = argparse.ArgumentParser(description='GitHub Repository Risk Analysis CLI')
+    parser = argparse.ArgumentParser(
+        description='GitHub Repository Risk Analysis CLI',
+        epilog='With a risk_daemon.py running, commands other than --export and --profile are answered by it, '
+               'one at a time; after RISK_ANALYSIS_DAEMON_TIMEOUT seconds without a reply the command runs here.',
+    )
     parser.add_argument('--summary', action='store_true', help='Show summary statistics')
     parser.add_argument('--risky', type=int, nargs='?', const=10, help='Show top N risky repositories (default: 10)')
     parser.add_argument('--healthy', type=int, nargs='?', const=10, help='Show top N healthiest repositories (default: 10)')
     parser.add_argument('--languages', action='store_true', help='Show risk analysis by programming language')
     parser.add_argument('--search', type=str, help='Search for repositories by name')
-    parser.add_argument('--export', type=str, nargs='?', const='risk_analysis.csv', help='Export data to CSV file')
-    parser.add_argument('--report', type=str, help='Show detailed report for specific repository')
-    parser.add_argument('--all', action='store_true', help='Run all reports (summary, languages, top risky/healthy)')
+    parser.add_argument('--export', type=str, nargs='?', const='risk_analysis.csv',
+                        help='Export data to a file; the format follows the extension (.csv, .csv.gz, .csv.zst, .jsonl, .parquet)')
+    parser.add_argument('--export-format', type=str, choices=risk_export.FORMATS, help='Export format, overriding the file extension')
+    parser.add_argument('--export-dataset', type=str, metavar='DIR',
+                        help='Append a snapshot to a Parquet dataset partitioned by data source, risk category and language')
+    parser.add_argument('--incremental', action='store_true', help='With --export-dataset, only rows updated since the last snapshot')
+    parser.add_argument('--report', type=str, nargs='+', metavar='REPO', help='Show detailed report for one or more repositories')
+    parser.add_argument('--report-file', type=str, metavar='FILE', help='Report on the repositories listed in a file, one per line')
+    parser.add_argument('--report-output', type=str, metavar='FILE', help='Also write the --report results to a CSV, JSONL or Parquet file')
+    parser.add_argument('--all', action='store_true', help='Run all reports (summary, languages, top risky/healthy) from one query')
+    parser.add_argument('--score', type=int, nargs=5, metavar=('STARS', 'COMMITS_90D', 'CONTRIBUTORS_90D', 'DAYS_SINCE_RELEASE', 'OPEN_ISSUES'),
+                        help='Score a repository from its metrics without querying Snowflake')
+    parser.add_argument('--what-if', type=str, metavar='VERSION', help='Rescore ENRICH under a risk model version from risk_models.json')
+    parser.add_argument('--baseline', type=str, metavar='VERSION', help='Baseline model version for --what-if (default: active version)')
+    parser.add_argument('--as-of', type=str, metavar='DATE', help='Show risk scores as they were at a date, e.g. 2025-01-31')
+    parser.add_argument('--history', type=str, metavar='REPO', help='Show the risk score history of a specific repository')
+    parser.add_argument('--replica', type=str, nargs='?', const=os.getenv("RISK_ANALYSIS_REPLICA", replica.DEFAULT_PATH),
+                        help='Read from the local replica written by replica.py sync instead of Snowflake (not with --what-if)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the local result cache and run every query')
+    parser.add_argument('--clear-cache', action='store_true', help='Empty the local result cache before running')
+    profiling.add_argument(parser)
     
     args = parser.parse_args()
+    if args.what_if and args.replica:
+        # the replica holds CURATE only; --what-if rescores the ENRICH snapshot
+        parser.error("--what-if reads ENRICH from Snowflake and cannot run with --replica")
     
     # If no arguments provided, show help
     if len(sys.argv) == 1:
@@ -359,19 +493,41 @@ def main():
         print("  python risk_analysis_cli.py --risky 20")
         print("  python risk_analysis_cli.py --search django")
         print("  python risk_analysis_cli.py --report facebook/react")
+        print("  python risk_analysis_cli.py --report-file dependencies.txt --report-output report.csv")
         print("  python risk_analysis_cli.py --all")
+        print("  python risk_analysis_cli.py --score 1200 35 4 120 12")
+        print("  python risk_analysis_cli.py --what-if v2")
+        print("  python risk_analysis_cli.py --as-of 2025-01-31")
+        print("  python risk_analysis_cli.py --history facebook/react")
+        print("  python risk_analysis_cli.py --summary --no-cache")
+        print("  python risk_analysis_cli.py --all --replica")
+        print("  python risk_analysis_cli.py --export risk_analysis.parquet")
+        print("  python risk_analysis_cli.py --export-dataset risk_dataset --incremental")
+        print("  python risk_analysis_cli.py --summary --profile")
         return
     
+    if args.score:
+        score_metrics(*args.score)
+        return
+    
+    if not args.no_cache:
+        if args.replica:
+            use_cache(replica.open_cache(args.replica))
+        else:
+            use_cache(result_cache.from_env(risk_queries.FRESHNESS_SQL))
+        if args.clear_cache:
+            _cache.clear()
+    if args.replica:
+        use_replica(args.replica)
+    
     try:
         print(f"\n📊 GitHub Repository Risk Analysis")
-        print(f"   Data Source: git_hub | Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        source = f"git_hub (replica {_replica_path})" if _replica_path else "git_hub"
+        print(f"   Data Source: {source} | Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"   " + "-"*50)
         
         if args.all:
-            show_summary()
-            show_by_language()
-            show_top_risky(15)
-            show_healthiest(15)
+            show_dashboard(15)
         else:
             if args.summary:
                 show_summary()
@@ -389,10 +545,25 @@ def main():
                 search_repository(args.search)
             
             if args.export:
-                export_to_csv(args.export)
+                export_data(args.export, args.export_format)
+            
+            if args.export_dataset:
+                export_dataset(args.export_dataset, args.incremental)
+            
+            report_names = (args.report or []) + (read_repo_names(args.report_file) if args.report_file else [])
+            if len(report_names) == 1 and not args.report_file and not args.report_output:
+                show_detailed_report(report_names[0])
+            elif report_names:
+                show_batch_report(report_names, args.report_output)
+            
+            if args.what_if:
+                what_if_rescoring(args.what_if, args.baseline)
+            
+            if args.as_of:
+                show_as_of(args.as_of)
             
-            if args.report:
-                show_detailed_report(args.report)
+            if args.history:
+                show_history(args.history)
                 
     except Exception as e:
         print(f"\n❌ Error: {e}")
@@ -400,4 +571,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profiling.run_main(main, 'risk_analysis')
\ No newline at end of file
@@ -0,0 +1,352 @@
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+# Optional warm process for risk_analysis.py. A short command (--report, --summary) otherwise spends
+# most of its time starting Python, importing its dependencies and logging in to Snowflake; the daemon
+# keeps the modules imported and one Snowflake session open (client_session_keep_alive), and runs each
+# command it receives on a local Unix socket as if it were `python risk_analysis.py ARGS` in the
+# caller's directory, returning the output and exit code. risk_analysis.py forwards to the daemon
+# whenever its socket answers, and runs the command itself otherwise (or with RISK_ANALYSIS_DAEMON=0).
+# Commands run one at a time (main() uses module-level state, sys.argv and the working directory)
+# and with the daemon's environment, so the caller sends the variables a result depends on
+# (FORWARDED_ENV) and runs the command itself when they differ from the daemon's. A caller waits at most RISK_ANALYSIS_DAEMON_TIMEOUT seconds for its
+# reply, queueing included, then runs the command itself; the daemon drops a queued command whose
+# caller has given up. --profile and the exports, which are bound by the transfer rather than the
+# startup, always run in the caller.
+# risk_analysis.py imports this module before anything else, so only what forward() needs is imported
+# at the top; the server side imports the rest where it is used.
+#
+#   python risk_daemon.py start        (or `serve` in the foreground)
+#   python risk_daemon.py status
+#   python risk_daemon.py stop
+
+DEFAULT_IDLE_TIMEOUT = 3600
+START_TIMEOUT = 30
+FORWARD_TIMEOUT = 120
+LOCAL_OPTIONS = ('--profile', '--export')
+
+# Connection, replica and cache settings; both processes compare them as set before .env is loaded
+FORWARDED_ENV = (
+    'SNOWFLAKE_ACCOUNT', 'SNOWFLAKE_DATABASE', 'SNOWFLAKE_ROLE', 'SNOWFLAKE_USER', 'SNOWFLAKE_WAREHOUSE',
+    'RISK_ANALYSIS_REPLICA', 'RISK_ANALYSIS_CACHE', 'RISK_ANALYSIS_CACHE_MB', 'RISK_ANALYSIS_CACHE_TTL',
+)
+
+def default_socket():
+    """Per-user socket: $XDG_RUNTIME_DIR/risk_analysis.sock, else /tmp/risk_analysis-<uid>.sock"""
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'risk_analysis.sock')
+    return os.path.join('/tmp', f'risk_analysis-{os.getuid()}.sock')
+
+DEFAULT_SOCKET = default_socket()
+
+def socket_path():
+    return os.path.abspath(os.getenv("RISK_ANALYSIS_DAEMON_SOCKET", DEFAULT_SOCKET))
+
+def forwarded_env():
+    return {name: os.environ.get(name) for name in FORWARDED_ENV}
+
+def request(message, path=None, timeout=None):
+    """Send one JSON message to the daemon and return its JSON reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError("The risk daemon closed the connection without replying")
+    return json.loads(line)
+
+def forward(argv, path=None):
+    """Run a risk_analysis.py command in the daemon; the exit code, or None to run it in this process"""
+    path = path or socket_path()
+    if os.getenv("RISK_ANALYSIS_DAEMON", "1") == "0" or any(arg.startswith(LOCAL_OPTIONS) for arg in argv):
+        return None
+    try:
+        # only a daemon of this user answers its commands
+        if os.stat(path).st_uid != os.getuid():
+            return None
+    except FileNotFoundError:
+        return None
+    timeout = float(os.getenv("RISK_ANALYSIS_DAEMON_TIMEOUT", FORWARD_TIMEOUT))
+    message = {'command': 'run', 'argv': argv, 'cwd': os.getcwd(), 'deadline': time.time() + timeout,
+               'env': forwarded_env()}
+    try:
+        reply = request(message, path, timeout)
+    except (ConnectionRefusedError, FileNotFoundError):
+        # stale socket file of a daemon that is gone
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Risk daemon on {path} did not answer ({e or type(e).__name__}); running the command here",
+              file=sys.stderr)
+        return None
+    if reply.get('expired'):
+        return None
+    if reply.get('env_mismatch'):
+        print(f"Risk daemon on {path} runs with a different {', '.join(reply['env_mismatch'])}; "
+              "running the command here", file=sys.stderr)
+        return None
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    return reply['code']
+
+class Session:
+    """One Snowflake connection reused by every command; the commands' close() leaves it open"""
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.conn = None
+        self.opened = None
+
+    def connection(self):
+        if self.conn is None or getattr(self.conn, 'is_closed', lambda: False)():
+            self.conn = self.connect()
+            self.opened = time.time()
+        return KeptConnection(self.conn)
+
+    def reset(self):
+        """Drop the connection, e.g. after a failed command, so the next one logs in again"""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
+        self.opened = None
+
+class KeptConnection:
+    """The session's connection as handed to a command"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        pass
+
+class Daemon:
+    """Runs risk_analysis.main() for each request, with the caller's arguments and directory"""
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        # taken before risk_analysis loads .env, like the callers' forwarded_env()
+        self.env = forwarded_env()
+
+        import risk_analysis
+
+        self.risk_analysis = risk_analysis
+        self.session = Session(lambda: risk_analysis.snowflake_connection(client_session_keep_alive=True))
+        self.idle_timeout = idle_timeout
+        self.started = time.time()
+        self.last_request = time.time()
+        self.commands = 0
+        self.failures = 0
+        self.expired = 0
+        self.mismatched = 0
+        self._lock = threading.Lock()
+
+    def run(self, argv, cwd, deadline=None, env=None):
+        import traceback
+        from contextlib import redirect_stderr, redirect_stdout
+
+        if env != self.env:
+            # the caller runs the command itself, with its own settings
+            self.mismatched += 1
+            env = env or {}
+            return {'env_mismatch': [name for name in FORWARDED_ENV if env.get(name) != self.env[name]]}
+
+        ra = self.risk_analysis
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with self._lock:
+            self.last_request = time.time()
+            if deadline is not None and time.time() > deadline:
+                # the caller stopped waiting and runs the command itself
+                self.expired += 1
+                return {'expired': True}
+            # module state left by the previous command's main()
+            ra.use_replica(None)
+            ra.use_cache(None)
+            ra.use_session(self.session)
+            previous_argv, previous_cwd = sys.argv, os.getcwd()
+            sys.argv = ['risk_analysis.py'] + list(argv)
+            try:
+                os.chdir(cwd)
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    try:
+                        ra.main()
+                        code = 0
+                    except SystemExit as e:
+                        if isinstance(e.code, int) or e.code is None:
+                            code = e.code or 0
+                        else:
+                            print(e.code, file=sys.stderr)
+                            code = 1
+                    except Exception:
+                        traceback.print_exc()
+                        code = 1
+            finally:
+                sys.argv = previous_argv
+                os.chdir(previous_cwd)
+                if ra._cache is not None:
+                    ra._cache.close()
+                ra.use_cache(None)
+            self.commands += 1
+            if code:
+                self.failures += 1
+                self.session.reset()
+        return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'code': code}
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'idle_seconds': round(time.time() - self.last_request, 1),
+            'commands': self.commands,
+            'failures': self.failures,
+            'expired': self.expired,
+            'env_mismatched': self.mismatched,
+            'session_age_seconds': round(time.time() - self.session.opened, 1) if self.session.opened else None,
+        }
+
+def _handle(handler):
+    """StreamRequestHandler.handle: one JSON request line, one JSON reply line"""
+    line = handler.rfile.readline()
+    if not line:
+        return
+    message = json.loads(line)
+    command = message.get('command')
+    if command == 'run':
+        reply = handler.daemon.run(message.get('argv', []), message.get('cwd', os.getcwd()), message.get('deadline'),
+                                   message.get('env'))
+    elif command == 'status':
+        reply = handler.daemon.status()
+    elif command == 'stop':
+        reply = {'stopping': True}
+        threading.Thread(target=handler.server.shutdown, daemon=True).start()
+    else:
+        reply = {'error': f"Unknown command: {command}"}
+    handler.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+def _answers(path):
+    try:
+        request({'command': 'status'}, path, timeout=5)
+        return True
+    except OSError:
+        return False
+
+def serve(path=None, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Serve commands on the socket until stopped, or idle for idle_timeout seconds (0: never)"""
+    import socketserver
+
+    path = path or socket_path()
+    if os.path.exists(path):
+        if _answers(path):
+            print(f"A risk daemon is already running on {path}")
+            return 1
+        os.unlink(path)
+
+    daemon = Daemon(idle_timeout)
+    handler = type('RiskDaemonHandler', (socketserver.StreamRequestHandler,), {'daemon': daemon, 'handle': _handle})
+    server = socketserver.ThreadingUnixStreamServer(path, handler)
+    server.daemon_threads = True
+
+    def watch_idle():
+        while idle_timeout:
+            time.sleep(min(idle_timeout, 60))
+            if time.time() - daemon.last_request >= idle_timeout:
+                server.shutdown()
+                return
+
+    threading.Thread(target=watch_idle, daemon=True).start()
+    print(f"Risk daemon {os.getpid()} serving on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.session.reset()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+def start(path=None, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """Start the daemon in the background and wait until it answers"""
+    import subprocess
+
+    path = path or socket_path()
+    if os.path.exists(path) and _answers(path):
+        print(f"A risk daemon is already running on {path}")
+        return 0
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'serve', '--socket', path, '--idle-timeout', str(idle_timeout)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            print(f"❌ The risk daemon exited during startup (code {process.returncode})")
+            return 1
+        if os.path.exists(path) and _answers(path):
+            print(f"Risk daemon {process.pid} serving on {path}")
+            return 0
+        time.sleep(0.05)
+    print(f"❌ The risk daemon did not answer on {path} within {START_TIMEOUT}s")
+    return 1
+
+def main():
+    import argparse
+
+    import profiling
+
+    parser = argparse.ArgumentParser(
+        description='Warm background process answering risk_analysis.py commands',
+        epilog='Commands run one at a time: a command waits for the one before it. A caller gives up after '
+               f'RISK_ANALYSIS_DAEMON_TIMEOUT seconds (default {FORWARD_TIMEOUT:g}) and runs the command itself; '
+               '--export and --profile always run in the caller, and so does a command whose caller has other '
+               'Snowflake, replica or cache settings than the daemon.',
+    )
+    profiling.add_argument(parser)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('start', 'Start the daemon in the background'), ('serve', 'Run the daemon in the foreground'),
+                            ('status', 'Show whether the daemon is running and what it has served'),
+                            ('stop', 'Stop the daemon')):
+        command_parser = subparsers.add_parser(name, help=help_text)
+        command_parser.add_argument('--socket', type=str, default=socket_path(),
+                                    help=f'Socket path (default: RISK_ANALYSIS_DAEMON_SOCKET or {DEFAULT_SOCKET})')
+        if name in ('start', 'serve'):
+            command_parser.add_argument('--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                                        help='Exit after this many seconds without a command (0: never)')
+
+    args = parser.parse_args()
+
+    if args.command == 'start':
+        return start(args.socket, args.idle_timeout)
+    if args.command == 'serve':
+        return serve(args.socket, args.idle_timeout)
+    try:
+        reply = request({'command': args.command}, args.socket, timeout=10)
+    except OSError:
+        print(f"No risk daemon running on {args.socket}")
+        return 1 if args.command == 'status' else 0
+    if args.command == 'stop':
+        print(f"Risk daemon on {args.socket} stopping")
+    else:
+        print(f"Risk daemon {reply['pid']} on {args.socket}: up {reply['uptime_seconds']:.0f}s, "
+              f"idle {reply['idle_seconds']:.0f}s, {reply['commands']} commands ({reply['failures']} failed, "
+              f"{reply.get('expired', 0)} dropped after their caller gave up, "
+              f"{reply.get('env_mismatched', 0)} sent back over different settings), "
+              f"session {'open' if reply['session_age_seconds'] is not None else 'not opened'}")
+    return 0
+
+if __name__ == "__main__":
+    import profiling
+
+    sys.exit(profiling.run_main(main, 'risk_daemon'))
@@ -0,0 +1,399 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from decimal import Decimal
+from urllib.parse import quote
+
+import risk_queries
+
+# Streaming export of the data product. Result rows are fetched in batches with
+# fetchmany and handed straight to a writer, so memory stays at one batch whatever the
+# table size and the file grows while results are still arriving. The summary printed
+# after an export is accumulated batch by batch. The format follows the file extension:
+# .csv, .jsonl (both optionally .gz, or .zst with zstandard) and .parquet (pyarrow, one
+# row group per batch). Rows go to FILE.part, renamed to FILE once the export completes.
+#
+# export_dataset() writes the data product as a Hive-partitioned Parquet dataset instead:
+# ROOT/SNAPSHOT=.../DATA_SOURCE=.../RISK_CATEGORY=.../LANGUAGE=.../part-NNNNN.parquet,
+# with the partition values in the paths only. Each export appends a snapshot; an
+# incremental one holds just the rows updated since the previous snapshot's watermark
+# (a "delta" on top of the last full snapshot; removed repositories only disappear with
+# the next full snapshot). ROOT/_manifest.json lists every snapshot and file with its
+# row count and per-column min/max, so readers can skip files without opening them;
+# the files carry the same statistics per row group.
+
+BATCH_SIZE = 50000
+PROGRESS_INTERVAL = 1.0
+
+FORMATS = ['csv', 'csv.gz', 'csv.zst', 'jsonl', 'jsonl.gz', 'jsonl.zst', 'parquet']
+
+DATASET_PARTITIONS = ['DATA_SOURCE', 'RISK_CATEGORY', 'LANGUAGE']
+ROW_GROUP_ROWS = 100000
+FILE_ROWS = 1000000
+MANIFEST = '_manifest.json'
+HIVE_NULL = '__HIVE_DEFAULT_PARTITION__'
+
+# Parquet types of risk_queries.EXPORT_COLUMNS, REPORT_BATCH_COLUMNS and dependency_scan.SCAN_COLUMNS
+PARQUET_TYPES = {
+    'REQUESTED_NAME': 'string',
+    'MANIFEST': 'string',
+    'ECOSYSTEM': 'string',
+    'PACKAGE': 'string',
+    'DATA_SOURCE': 'string',
+    'FULL_NAME': 'string',
+    'LANGUAGE': 'string',
+    'STARS': 'int64',
+    'COMMITS_90D': 'int64',
+    'ACTIVE_CONTRIBUTORS_90D': 'int64',
+    'DAYS_SINCE_LAST_RELEASE': 'int64',
+    'OPEN_ISSUES': 'int64',
+    'RISK_SCORE': 'double',
+    'RISK_CATEGORY': 'string',
+    'LAST_UPDATED': 'timestamp[us]',
+}
+
+def format_for(path):
+    """Export format named by the file extension (csv when there is none)"""
+    name = path.lower()
+    for fmt in sorted(FORMATS, key=len, reverse=True):
+        if name.endswith('.' + fmt):
+            return fmt
+    return 'csv'
+
+def _open_text(path, compression=None):
+    if compression == 'gz':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+    if compression == 'zst':
+        import zstandard
+
+        stream = zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class CsvWriter:
+    def __init__(self, path, columns, compression=None):
+        self.file = _open_text(path, compression)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class JsonlWriter:
+    """One JSON object per row, keyed by column name"""
+
+    def __init__(self, path, columns, compression=None):
+        self.file = _open_text(path, compression)
+        self.columns = columns
+
+    def write(self, rows):
+        self.file.write(''.join(
+            json.dumps(dict(zip(self.columns, row)), default=_json_value) + '\n' for row in rows
+        ))
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """One row group per batch; column min/max statistics are written by pyarrow"""
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([(column, pa.type_for_alias(PARQUET_TYPES[column])) for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        arrays = []
+        for field, values in zip(self.schema, zip(*rows)):
+            if self.pa.types.is_floating(field.type):
+                values = [None if value is None else float(value) for value in values]
+            elif self.pa.types.is_timestamp(field.type):
+                values = [datetime.fromisoformat(value) if isinstance(value, str) else value for value in values]
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def open_writer(path, fmt, columns):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of: {', '.join(FORMATS)})")
+    if fmt == 'parquet':
+        return ParquetWriter(path, columns)
+    kind, _, compression = fmt.partition('.')
+    writer = CsvWriter if kind == 'csv' else JsonlWriter
+    return writer(path, columns, compression or None)
+
+def write_rows(path, columns, rows, fmt=None):
+    """Write a result already in memory (e.g. a batch report) in the format of the file extension"""
+    writer = open_writer(path, fmt or format_for(path), columns)
+    try:
+        if rows:
+            writer.write(rows)
+    finally:
+        writer.close()
+
+class ExportStats:
+    """Row count and risk mix of an export, accumulated per batch"""
+
+    def __init__(self, columns):
+        self.score_index = columns.index('RISK_SCORE')
+        self.category_index = columns.index('RISK_CATEGORY')
+        self.rows = 0
+        self.scored = 0
+        self.score_total = 0.0
+        self.categories = Counter()
+
+    def update(self, rows):
+        self.rows += len(rows)
+        scores = [row[self.score_index] for row in rows if row[self.score_index] is not None]
+        self.scored += len(scores)
+        self.score_total += float(sum(scores))
+        self.categories.update(row[self.category_index] for row in rows)
+
+    @property
+    def average_score(self):
+        return self.score_total / self.scored if self.scored else 0.0
+
+def export(conn, path, fmt=None, batch_size=BATCH_SIZE, progress=sys.stderr):
+    """Stream risk_queries.EXPORT_SQL into path; returns the ExportStats of the written rows"""
+    fmt = fmt or format_for(path)
+    columns = risk_queries.EXPORT_COLUMNS
+    partial = f"{path}.part"
+    stats = ExportStats(columns)
+    cursor = conn.cursor()
+    cursor.execute(risk_queries.EXPORT_SQL)
+    writer = open_writer(partial, fmt, columns)
+    start = reported = time.perf_counter()
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            writer.write(rows)
+            stats.update(rows)
+            if progress is not None and time.perf_counter() - reported >= PROGRESS_INTERVAL:
+                reported = time.perf_counter()
+                progress.write(f"\r  {stats.rows:,} rows exported ({stats.rows / (reported - start):,.0f} rows/s)")
+                progress.flush()
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(partial)
+        raise
+    os.replace(partial, path)
+    if progress is not None and reported > start:
+        progress.write("\n")
+    return stats
+
+def _manifest_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return str(value)
+    return value
+
+def partition_path(values):
+    """Hive directory of a partition, values percent-encoded (LANGUAGE can be 'C#' or 'Vim script')"""
+    return '/'.join(
+        f"{column}={HIVE_NULL if value is None else quote(str(value), safe='')}"
+        for column, value in zip(DATASET_PARTITIONS, values)
+    )
+
+class DatasetWriter:
+    """Parquet files of one snapshot for rows arriving grouped by partition"""
+
+    def __init__(self, directory, columns, row_group_rows=ROW_GROUP_ROWS, file_rows=FILE_ROWS):
+        self.directory = directory
+        self.key_indexes = [columns.index(column) for column in DATASET_PARTITIONS]
+        self.data_columns = [column for column in columns if column not in DATASET_PARTITIONS]
+        self.data_indexes = [columns.index(column) for column in self.data_columns]
+        self.row_group_rows = row_group_rows
+        self.file_rows = file_rows
+        self.files = []
+        self.partition = None
+        self.pending = []
+        self.writer = None
+        self.entry = None
+
+    def write(self, rows):
+        for partition, group in itertools.groupby(rows, key=lambda row: tuple(row[i] for i in self.key_indexes)):
+            if partition != self.partition:
+                self._close_partition()
+                self.partition = partition
+            for row in group:
+                self.pending.append(tuple(row[i] for i in self.data_indexes))
+                if len(self.pending) >= self.row_group_rows:
+                    self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        if self.writer is None:
+            relative = f"{partition_path(self.partition)}/part-{len(self.files):05d}.parquet"
+            os.makedirs(os.path.dirname(os.path.join(self.directory, relative)), exist_ok=True)
+            self.writer = ParquetWriter(os.path.join(self.directory, relative), self.data_columns)
+            self.entry = {
+                'path': relative,
+                'partition': {column: _manifest_value(value) for column, value in zip(DATASET_PARTITIONS, self.partition)},
+                'rows': 0, 'row_groups': 0, 'min': {}, 'max': {},
+            }
+        self.writer.write(self.pending)
+        self.entry['rows'] += len(self.pending)
+        self.entry['row_groups'] += 1
+        for column, values in zip(self.data_columns, zip(*self.pending)):
+            values = [value for value in values if value is not None]
+            if values:
+                low, high = _manifest_value(min(values)), _manifest_value(max(values))
+                self.entry['min'][column] = min(self.entry['min'].get(column, low), low)
+                self.entry['max'][column] = max(self.entry['max'].get(column, high), high)
+        self.pending = []
+        if self.entry['rows'] >= self.file_rows:
+            self._close_file()
+
+    def _close_file(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.files.append(self.entry)
+            self.writer = self.entry = None
+
+    def _close_partition(self):
+        self._flush()
+        self._close_file()
+
+    def close(self):
+        """The manifest entries of the written files"""
+        self._close_partition()
+        return self.files
+
+def read_manifest(root):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {'partition_by': DATASET_PARTITIONS, 'snapshots': []}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+def _write_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST)
+    with open(f"{path}.part", 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(f"{path}.part", path)
+
+def export_dataset(conn, root, incremental=False, batch_size=BATCH_SIZE, row_group_rows=ROW_GROUP_ROWS,
+                   file_rows=FILE_ROWS, progress=sys.stderr):
+    """Append a snapshot of the data product to the dataset at root; returns its manifest entry,
+    or None when an incremental export finds nothing updated"""
+    manifest = read_manifest(root)
+    snapshots = manifest['snapshots']
+    since = snapshots[-1]['watermark'] if incremental and snapshots else None
+    base = next((entry['snapshot'] for entry in reversed(snapshots) if entry['kind'] == 'full'), None)
+    snapshot = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    # readers skip paths starting with '_', so a half-written snapshot is never seen
+    staging = os.path.join(root, f"_staging-{snapshot}")
+    columns = risk_queries.EXPORT_COLUMNS
+    updated_index = columns.index('LAST_UPDATED')
+
+    cursor = conn.cursor()
+    if since is None:
+        cursor.execute(risk_queries.dataset_sql())
+    else:
+        cursor.execute(risk_queries.dataset_sql(since=True), (since,))
+    writer = DatasetWriter(staging, columns, row_group_rows, file_rows)
+    stats = ExportStats(columns)
+    watermark = None
+    start = reported = time.perf_counter()
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            writer.write(rows)
+            stats.update(rows)
+            latest = max((row[updated_index] for row in rows if row[updated_index] is not None), default=None)
+            if latest is not None and (watermark is None or latest > watermark):
+                watermark = latest
+            if progress is not None and time.perf_counter() - reported >= PROGRESS_INTERVAL:
+                reported = time.perf_counter()
+                progress.write(f"\r  {stats.rows:,} rows exported ({stats.rows / (reported - start):,.0f} rows/s)")
+                progress.flush()
+        files = writer.close()
+    except BaseException:
+        writer.close()
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if progress is not None and reported > start:
+        progress.write("\n")
+    if not files:
+        shutil.rmtree(staging, ignore_errors=True)
+        if since is not None:
+            return None
+
+    directory = f"SNAPSHOT={snapshot}"
+    if files:
+        os.replace(staging, os.path.join(root, directory))
+    entry = {
+        'snapshot': snapshot,
+        'path': directory,
+        'kind': 'full' if since is None else 'delta',
+        'base': None if since is None else base,
+        'since': since,
+        'watermark': _manifest_value(watermark) if watermark is not None else since,
+        'rows': stats.rows,
+        'average_score': stats.average_score,
+        'categories': dict(stats.categories),
+        'files': files,
+    }
+    snapshots.append(entry)
+    _write_manifest(root, manifest)
+    return entry
+
+def _overlaps(file, ranges):
+    for column, (low, high) in ranges.items():
+        if column not in file['min']:
+            continue
+        if low is not None and file['max'][column] < low:
+            return False
+        if high is not None and file['min'][column] > high:
+            return False
+    return True
+
+def dataset_files(root, snapshot=None, partitions=None, ranges=None):
+    """Paths of the files that can hold matching rows: partition values must equal `partitions`,
+    column min/max must overlap `ranges` ({column: (low, high)}, None for open ends). By default
+    the latest full snapshot and the deltas appended after it."""
+    snapshots = read_manifest(root)['snapshots']
+    if snapshot is None:
+        full = [i for i, entry in enumerate(snapshots) if entry['kind'] == 'full']
+        selected = snapshots[full[-1]:] if full else []
+    else:
+        selected = [entry for entry in snapshots if entry['snapshot'] == snapshot]
+    partitions = partitions or {}
+    ranges = ranges or {}
+    return [
+        os.path.join(root, entry['path'], file['path'])
+        for entry in selected
+        for file in entry['files']
+        if all(file['partition'].get(column) == value for column, value in partitions.items())
+        and _overlaps(file, ranges)
+    ]
@@ -0,0 +1,273 @@
+import re
+import zlib
+
+# Read queries behind risk_analysis.py. Kept apart from the CLI so the same SQL runs
+# against Snowflake and the local backend, and so the --all dashboard can fetch every
+# section in one statement instead of one connection and scan per section.
+
+REPO_COLUMNS = [
+    'FULL_NAME',
+    'LANGUAGE',
+    'STARS',
+    'COMMITS_90D',
+    'ACTIVE_CONTRIBUTORS_90D',
+    'DAYS_SINCE_LAST_RELEASE',
+    'OPEN_ISSUES',
+    'RISK_SCORE',
+    'RISK_CATEGORY',
+]
+
+SUMMARY_SQL = """
+    SELECT
+        COUNT(*) as total_repos,
+        ROUND(AVG(RISK_SCORE), 2) as avg_risk_score,
+        COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END) as high_risk_count,
+        COUNT(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 END) as medium_risk_count,
+        COUNT(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 END) as low_risk_count,
+        MAX(LAST_UPDATED) as last_updated
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+"""
+
+def languages_sql(limit=15):
+    """Repository count and risk mix of the N most common languages"""
+    return f"""
+    SELECT
+        COALESCE(LANGUAGE, 'Unknown') as language,
+        COUNT(*) as repo_count,
+        ROUND(AVG(RISK_SCORE), 2) as avg_risk_score,
+        COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END) as high_risk,
+        COUNT(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 END) as medium_risk,
+        COUNT(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 END) as low_risk
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+    GROUP BY LANGUAGE
+    ORDER BY repo_count DESC, language
+    LIMIT {int(limit)}
+    """
+
+LANGUAGES_SQL = languages_sql()
+
+REPORT_SQL = f"""
+    SELECT
+        {', '.join(REPO_COLUMNS)},
+        LAST_UPDATED
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+      AND UPPER(FULL_NAME) = UPPER(%s)
+"""
+
+# Names per batch report statement, well inside Snowflake's VALUES and sqlite's parameter limits
+REPORT_BATCH_SIZE = 5000
+
+REPORT_BATCH_COLUMNS = ['REQUESTED_NAME'] + REPO_COLUMNS + ['LAST_UPDATED']
+
+def batch_report_sql(count):
+    """REPORT_SQL for `count` names at once: one join against a VALUES list instead of one scan
+    per name; rows start with the requested name"""
+    values = ', '.join('(%s)' for _ in range(int(count)))
+    columns = ', '.join(f"p.{column}" for column in REPO_COLUMNS)
+    return f"""
+    SELECT
+        n.column1 AS REQUESTED_NAME,
+        {columns},
+        p.LAST_UPDATED
+    FROM (VALUES {values}) n
+    JOIN CURATE.RISK_ANALYSIS_DATA_PRODUCT p
+      ON p.DATA_SOURCE = 'git_hub'
+     AND UPPER(p.FULL_NAME) = UPPER(n.column1)
+    """
+
+SEARCH_SQL = f"""
+    SELECT
+        {', '.join(REPO_COLUMNS)},
+        LAST_UPDATED
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+      AND UPPER(FULL_NAME) LIKE UPPER(%s)
+    ORDER BY RISK_SCORE DESC
+    LIMIT 20
+"""
+
+AS_OF_FILTER = """
+    DATA_SOURCE = 'git_hub'
+    AND VALID_FROM <= %(as_of)s
+    AND (VALID_TO IS NULL OR VALID_TO > %(as_of)s)
+"""
+
+AS_OF_SUMMARY_SQL = f"""
+    SELECT
+        COUNT(*) as total_repos,
+        ROUND(AVG(RISK_SCORE), 2) as avg_risk_score,
+        COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END) as high_risk_count,
+        COUNT(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 END) as medium_risk_count,
+        COUNT(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 END) as low_risk_count
+    FROM CURATE.RISK_SCORE_HISTORY
+    WHERE {AS_OF_FILTER}
+"""
+
+def as_of_top_sql(limit):
+    """Top N risky repositories by the scores valid at %(as_of)s"""
+    return f"""
+    SELECT FULL_NAME, RISK_SCORE, RISK_CATEGORY, MODEL_VERSION, VALID_FROM
+    FROM CURATE.RISK_SCORE_HISTORY
+    WHERE {AS_OF_FILTER}
+    ORDER BY RISK_SCORE DESC
+    LIMIT {int(limit)}
+    """
+
+HISTORY_SQL = """
+    SELECT
+        FULL_NAME,
+        RISK_SCORE,
+        RISK_CATEGORY,
+        MODEL_VERSION,
+        VALID_FROM,
+        VALID_TO
+    FROM CURATE.RISK_SCORE_HISTORY
+    WHERE DATA_SOURCE = 'git_hub'
+      AND UPPER(FULL_NAME) = UPPER(%s)
+    ORDER BY VALID_FROM
+"""
+
+EXPORT_COLUMNS = ['DATA_SOURCE'] + REPO_COLUMNS + ['LAST_UPDATED']
+
+EXPORT_SQL = f"""
+    SELECT
+        {', '.join(EXPORT_COLUMNS)}
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+    ORDER BY RISK_SCORE DESC
+"""
+
+def dataset_sql(since=False):
+    """Every data product row grouped by the dataset partitions (since: only rows updated after %s)"""
+    # scores descend within a partition, so each Parquet row group covers a narrow score range
+    where = "WHERE LAST_UPDATED > %s" if since else ""
+    return f"""
+    SELECT
+        {', '.join(EXPORT_COLUMNS)}
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    {where}
+    ORDER BY DATA_SOURCE, RISK_CATEGORY, LANGUAGE, RISK_SCORE DESC
+    """
+
+# CURATE only changes when SP_LOAD_RISK_ANALYSIS_DATA_PRODUCT runs; both aggregates are
+# answered from table metadata on Snowflake, so the check needs no warehouse scan
+FRESHNESS_SQL = """
+    SELECT MAX(LAST_UPDATED), COUNT(*)
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+"""
+
+# Watermark of the git_hub rows, for readers that hold the data product in memory; the
+# hash of the full names changes whenever the set of repositories does
+WATERMARK_SQL = """
+    SELECT w.last_updated, w.repos, k.keys
+    FROM (
+        SELECT MAX(LAST_UPDATED) AS last_updated, COUNT(*) AS repos
+        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+        WHERE DATA_SOURCE = 'git_hub'
+    ) w
+    -- separate aggregates, so each reads its own covering index on the local backends
+    CROSS JOIN (
+        SELECT HASH_AGG(FULL_NAME) AS keys
+        FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+        WHERE DATA_SOURCE = 'git_hub'
+    ) k
+"""
+
+class HashAgg:
+    """SQLite aggregate standing in for Snowflake's order-independent HASH_AGG on the local backends"""
+
+    def __init__(self):
+        self.total = 0
+
+    def step(self, value):
+        self.total += zlib.crc32(str(value).encode('utf-8'))
+
+    def finalize(self):
+        return self.total
+
+def product_rows_sql(since=False):
+    """Rows shaped like REPORT_SQL for every repository (since: only those updated after %s)"""
+    where = "AND LAST_UPDATED > %s" if since else ""
+    return f"""
+    SELECT
+        {', '.join(REPO_COLUMNS)},
+        LAST_UPDATED
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+    {where}
+    """
+
+def top_repositories_sql(limit, riskiest=True):
+    """Top N repositories by risk score (riskiest=False: healthiest first)"""
+    direction = 'DESC' if riskiest else 'ASC'
+    return f"""
+    SELECT
+        {', '.join(REPO_COLUMNS)}
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+    ORDER BY RISK_SCORE {direction}, FULL_NAME
+    LIMIT {int(limit)}
+    """
+
+# Dashboard rows share one column layout; each section maps its values onto it
+DASHBOARD_COLUMNS = ['SECTION', 'POSITION', 'LANGUAGE_NAME'] + REPO_COLUMNS + ['LAST_UPDATED']
+
+def dashboard_sql(risky=15, healthy=15, languages=15):
+    """Summary, languages, riskiest and healthiest repositories as one statement"""
+    # each section is a top-N (or aggregate) subquery, so the statement costs the same
+    # as the separate queries but takes one round trip
+    columns = ', '.join(REPO_COLUMNS)
+    return f"""
+    SELECT 'SUMMARY' AS SECTION, 0 AS POSITION, NULL AS LANGUAGE_NAME,
+           NULL, NULL, COUNT(*),
+           COUNT(CASE WHEN RISK_CATEGORY = 'HIGH' THEN 1 END),
+           COUNT(CASE WHEN RISK_CATEGORY = 'MEDIUM' THEN 1 END),
+           COUNT(CASE WHEN RISK_CATEGORY = 'LOW' THEN 1 END),
+           NULL, ROUND(AVG(RISK_SCORE), 2), NULL, MAX(LAST_UPDATED)
+    FROM CURATE.RISK_ANALYSIS_DATA_PRODUCT
+    WHERE DATA_SOURCE = 'git_hub'
+    UNION ALL
+    SELECT 'LANGUAGES', position, language,
+           NULL, NULL, repo_count, high_risk, medium_risk, low_risk,
+           NULL, avg_risk_score, NULL, NULL
+    FROM (
+        SELECT l.*, ROW_NUMBER() OVER (ORDER BY l.repo_count DESC, l.language) AS position
+        FROM ({languages_sql(languages)}) l
+    ) languages
+    UNION ALL
+    SELECT 'RISKY', ROW_NUMBER() OVER (ORDER BY RISK_SCORE DESC, FULL_NAME), NULL, {columns}, NULL
+    FROM ({top_repositories_sql(risky, riskiest=True)}) risky
+    UNION ALL
+    SELECT 'HEALTHY', ROW_NUMBER() OVER (ORDER BY RISK_SCORE ASC, FULL_NAME), NULL, {columns}, NULL
+    FROM ({top_repositories_sql(healthy, riskiest=False)}) healthy
+    """
+
+def split_dashboard(rows):
+    """Dashboard rows back into the row shapes of SUMMARY_SQL, LANGUAGES_SQL and top_repositories_sql"""
+    sections = {'SUMMARY': [], 'LANGUAGES': [], 'RISKY': [], 'HEALTHY': []}
+    for row in sorted(rows, key=lambda row: (row[0], row[1])):
+        sections[row[0]].append(row)
+
+    # values columns: 2 LANGUAGE_NAME, 3.. REPO_COLUMNS, 12 LAST_UPDATED
+    stars, commits, contributors, days = 5, 6, 7, 8
+    score = 10
+    summary = None
+    if sections['SUMMARY']:
+        row = sections['SUMMARY'][0]
+        summary = (row[stars], row[score], row[commits], row[contributors], row[days], row[12])
+    return {
+        'summary': summary,
+        'languages': [
+            (row[2], row[stars], row[score], row[commits], row[contributors], row[days])
+            for row in sections['LANGUAGES']
+        ],
+        'risky': [tuple(row[3:12]) for row in sections['RISKY']],
+        'healthy': [tuple(row[3:12]) for row in sections['HEALTHY']],
+    }
+
+def local_sql(query):
+    """A Snowflake-paramstyle statement (%s, %(name)s) in sqlite's qmark/named style"""
+    return re.sub(r'%\((\w+)\)s', r':\1', query).replace('%s', '?')
@@ -0,0 +1,362 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+import profiling
+
+# In-process mirror of the CASE ladders in CURATE.SP_LOAD_RISK_ANALYSIS_DATA_PRODUCT.
+# Scoring parameters are versioned in risk_models.json; the CURATE SQL is rendered from
+# the active version. Factors must be multiples of 0.1 and weights multiples of 0.01, so
+# factors are kept in tenths and weights in hundredths: every weighted sum is an exact
+# integer in thousandths and ROUND(..., 2) * 100 becomes (sum + 5) // 10, no float drift.
+
+RISK_MODELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_models.json')
+
+SCORING_COLUMNS = ['STARS', 'COMMITS_90D', 'ACTIVE_CONTRIBUTORS_90D', 'DAYS_SINCE_LAST_RELEASE', 'OPEN_ISSUES']
+
+_MODELS = {}
+
+def _scaled(value, scale, what):
+    scaled = Decimal(value) * scale
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"{what} {value} must be a multiple of {1 / Decimal(scale)}")
+    return int(scaled)
+
+def compile_model(version, spec):
+    """Validate one risk_models.json version and precompute its bucket lookups"""
+    factors = []
+    for factor in spec['factors']:
+        what = f"{version}.{factor['name']}"
+        ladder = [(Decimal(threshold), Decimal(value)) for threshold, value in factor['ladder']]
+        thresholds = [threshold for threshold, _ in ladder]
+        if factor['op'] == '>=':
+            if thresholds != sorted(thresholds, reverse=True):
+                raise ValueError(f"{what}: '>=' ladder thresholds must be descending")
+        elif factor['op'] == '<=':
+            if thresholds != sorted(thresholds):
+                raise ValueError(f"{what}: '<=' ladder thresholds must be ascending")
+        else:
+            raise ValueError(f"{what}: unsupported op {factor['op']!r}")
+
+        tenths = [_scaled(value, 10, f"{what} factor") for _, value in ladder]
+        else_tenths = _scaled(factor['else'], 10, f"{what} factor")
+        equals = [(Decimal(value), Decimal(result)) for value, result in factor.get('equals', [])]
+        equals_tenths = [(float(value), _scaled(result, 10, f"{what} factor")) for value, result in equals]
+        if any(not 0 <= value <= 10 for value in tenths + [else_tenths] + [t for _, t in equals_tenths]):
+            raise ValueError(f"{what}: factors must be between 0 and 1")
+
+        if factor['op'] == '>=':
+            # ascending thresholds; bucket i applies once i thresholds are met
+            bucket_thresholds = thresholds[::-1]
+            bucket_factors = [else_tenths] + tenths[::-1]
+        else:
+            # bucket i applies when the value is above i thresholds
+            bucket_thresholds = thresholds
+            bucket_factors = tenths + [else_tenths]
+
+        factors.append({
+            'name': factor['name'],
+            'column': factor['column'],
+            'op': factor['op'],
+            'ladder': ladder,
+            'equals': equals,
+            'else': Decimal(factor['else']),
+            'weight': Decimal(factor['weight']),
+            'thresholds': np.array([float(threshold) for threshold in bucket_thresholds]),
+            'factors': np.array(bucket_factors, dtype=np.int64),
+            'else_tenths': else_tenths,
+            'equals_tenths': equals_tenths,
+            'weight_hundredths': _scaled(factor['weight'], 100, f"{what} weight"),
+        })
+
+    if sum(factor['weight_hundredths'] for factor in factors) != 100:
+        raise ValueError(f"{version}: factor weights must add up to 1")
+
+    return {
+        'version': version,
+        'description': spec.get('description', ''),
+        'factors': factors,
+        'categories': [(name, Decimal(minimum)) for name, minimum in spec['categories']],
+        'default_category': spec['default_category'],
+    }
+
+def load_models(path=RISK_MODELS_PATH):
+    """All versions in the config file, as (active version, {version: compiled model})"""
+    with open(path) as f:
+        config = json.load(f, parse_float=Decimal)
+    models = {version: compile_model(version, spec) for version, spec in config['versions'].items()}
+    return config['active_version'], models
+
+def load_model(version=None, path=RISK_MODELS_PATH):
+    """One compiled model version; the config's active version by default"""
+    key = (path, version)
+    if key not in _MODELS:
+        active_version, models = load_models(path)
+        if (version or active_version) not in models:
+            raise KeyError(f"Unknown risk model version {version!r}, available: {', '.join(models)}")
+        _MODELS[key] = models[version or active_version]
+    return _MODELS[key]
+
+def _as_float(values):
+    """Column as float64 with NULL/None as NaN"""
+    return np.asarray(values, dtype=np.float64)
+
+def _factor_tenths(values, factor):
+    """Factor (in tenths) of one CASE ladder; NULL falls through to ELSE like in SQL"""
+    values = _as_float(values)
+    side = 'right' if factor['op'] == '>=' else 'left'
+    result = factor['factors'][np.searchsorted(factor['thresholds'], values, side=side)]
+    result = np.where(np.isnan(values), factor['else_tenths'], result)
+    # earlier `WHEN x = v` branches win, so apply them last to first
+    for value, tenths in reversed(factor['equals_tenths']):
+        result = np.where(values == value, tenths, result)
+    return result
+
+def score_columns(columns, model=None):
+    """Risk score (0-100, int64) per row from {COLUMN: values}, identical to the CURATE SQL"""
+    model = model or load_model()
+    weighted = sum(
+        _factor_tenths(columns[factor['column']], factor) * factor['weight_hundredths']
+        for factor in model['factors']
+    )
+    return (weighted + 5) // 10
+
+def risk_scores(stars, commits_90d, active_contributors_90d, days_since_last_release, open_issues, model=None):
+    """Risk score (0-100, int64) per row, identical to the CURATE SQL"""
+    values = (stars, commits_90d, active_contributors_90d, days_since_last_release, open_issues)
+    return score_columns(dict(zip(SCORING_COLUMNS, values)), model)
+
+def _category_codes(scores, model):
+    """Index into category_names(model) per score"""
+    return np.select(
+        [scores >= float(minimum) for _, minimum in model['categories']],
+        list(range(len(model['categories']))),
+        default=len(model['categories'])
+    )
+
+def category_names(model=None):
+    """Category names from riskiest to the default category"""
+    model = model or load_model()
+    return [name for name, _ in model['categories']] + [model['default_category']]
+
+def risk_categories(scores, model=None):
+    """Risk category per score"""
+    model = model or load_model()
+    return np.array(category_names(model))[_category_codes(np.asarray(scores), model)]
+
+def score_frame(df, model=None):
+    """Add RISK_SCORE and RISK_CATEGORY to a DataFrame with the CURATE input columns"""
+    scores = score_columns({column: df[column] for column in SCORING_COLUMNS}, model)
+    df = df.copy()
+    df['RISK_SCORE'] = scores.astype(np.float64)
+    df['RISK_CATEGORY'] = risk_categories(scores, model)
+    return df
+
+def score_repository(stars, commits_90d, active_contributors_90d, days_since_last_release, open_issues, model=None):
+    """Row-at-a-time reference with the SQL's decimal arithmetic, returns (score, category)"""
+    model = model or load_model()
+    row = dict(zip(SCORING_COLUMNS, (stars, commits_90d, active_contributors_90d, days_since_last_release, open_issues)))
+
+    weighted = Decimal(0)
+    for factor in model['factors']:
+        value = row[factor['column']]
+        result = factor['else']
+        if value is not None:
+            matches = [result for equal, result in factor['equals'] if value == equal]
+            if factor['op'] == '>=':
+                matches += [result for threshold, result in factor['ladder'] if value >= threshold]
+            else:
+                matches += [result for threshold, result in factor['ladder'] if value <= threshold]
+            if matches:
+                result = matches[0]
+        weighted += result * factor['weight']
+
+    score = int(weighted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+    for name, minimum in model['categories']:
+        if score >= minimum:
+            return score, name
+    return score, model['default_category']
+
+# ---------------------------------------------------------------------------
+# SQL rendering (CURATE procedure and the local pipeline stand-in)
+# ---------------------------------------------------------------------------
+
+def _case_sql(factor, literal, indent):
+    pad = ' ' * indent
+    branches = [f"{pad}    WHEN {factor['column']} = {value} THEN {literal(result)}" for value, result in factor['equals']]
+    branches += [
+        f"{pad}    WHEN {factor['column']} {factor['op']} {threshold} THEN {literal(result)}"
+        for threshold, result in factor['ladder']
+    ]
+    return "CASE \n" + '\n'.join(branches) + f"\n{pad}    ELSE {literal(factor['else'])}\n{pad}END"
+
+def snowflake_factor_sql(model, indent=16):
+    """`CASE ... END AS <name>_risk_factor` select items for the risk_calc CTE"""
+    pad = ' ' * indent
+    return ',\n'.join(
+        f"{pad}{_case_sql(factor, str, indent)} AS {factor['name']}_risk_factor"
+        for factor in model['factors']
+    )
+
+def snowflake_score_sql(model):
+    """ROUND(weighted factors, 2) * 100 over the risk_calc factor columns"""
+    terms = ' + '.join(f"({factor['name']}_risk_factor * {factor['weight']})" for factor in model['factors'])
+    return f"ROUND({terms}, 2) * 100"
+
+def category_sql(model, score_column='risk_score_raw'):
+    """CASE mapping a score column to its risk category"""
+    branches = ' '.join(f"WHEN {score_column} >= {minimum} THEN '{name}'" for name, minimum in model['categories'])
+    return f"CASE {branches} ELSE '{model['default_category']}' END"
+
+def local_score_sql(model):
+    """Exact integer score expression: factors in tenths times weights in hundredths"""
+    terms = ' +\n            '.join(
+        f"{_case_sql(factor, lambda value: str(int(value * 10)), 12)} * {factor['weight_hundredths']}"
+        for factor in model['factors']
+    )
+    return f"(\n            {terms} + 5\n        ) / 10"
+
+# ---------------------------------------------------------------------------
+# What-if rescoring
+# ---------------------------------------------------------------------------
+
+def what_if(columns, baseline, candidate):
+    """Score one snapshot under two model versions and count category migrations"""
+    baseline_scores = score_columns(columns, baseline)
+    candidate_scores = score_columns(columns, candidate)
+
+    baseline_names, candidate_names = category_names(baseline), category_names(candidate)
+    pairs = (
+        _category_codes(baseline_scores, baseline) * len(candidate_names) +
+        _category_codes(candidate_scores, candidate)
+    )
+    counts = np.bincount(pairs, minlength=len(baseline_names) * len(candidate_names))
+
+    return {
+        'rows': len(baseline_scores),
+        'migrations': {
+            (source, target): int(counts[i * len(candidate_names) + j])
+            for i, source in enumerate(baseline_names) for j, target in enumerate(candidate_names)
+        },
+        'changed_scores': int(np.count_nonzero(baseline_scores != candidate_scores)),
+        'mean_delta': float(np.mean(candidate_scores - baseline_scores)) if len(baseline_scores) else 0.0,
+    }
+
+def print_what_if(result, baseline, candidate, elapsed):
+    """Category migration matrix between two model versions"""
+    names = category_names(baseline)
+    names += [name for name in category_names(candidate) if name not in names]
+
+    corner = f"{baseline['version']} -> {candidate['version']}"
+    print("\n" + "="*70)
+    print(f"WHAT-IF RESCORING: {corner} ({candidate['description']})")
+    print("="*70)
+    print(f"Repositories rescored: {result['rows']:,} in {elapsed*1000:.1f} ms")
+    print(f"Scores changed:        {result['changed_scores']:,} (mean delta {result['mean_delta']:+.2f})")
+    print("-"*70)
+    print(f"{corner:<15}" + ''.join(f"{name:>12}" for name in names))
+    for source in names:
+        print(f"{source:<15}" + ''.join(f"{result['migrations'].get((source, target), 0):>12,}" for target in names))
+    moved = sum(count for (source, target), count in result['migrations'].items() if source != target)
+    print("-"*70)
+    print(f"Repositories changing category: {moved:,}")
+    print("="*70)
+
+# ---------------------------------------------------------------------------
+# Parity check
+# ---------------------------------------------------------------------------
+
+def _edge_values(model, column):
+    """NULL, negatives, zero and every threshold with its neighbours"""
+    values = {-1, 0, 1, 10 ** 7}
+    for factor in model['factors']:
+        if factor['column'] == column:
+            for threshold in [threshold for threshold, _ in factor['ladder'] + factor['equals']]:
+                threshold = int(threshold)
+                values.update((threshold - 1, threshold, threshold + 1))
+    return [None] + sorted(values)
+
+def parity_grid(model=None):
+    """Every combination of edge values of the five inputs"""
+    model = model or load_model()
+    return list(itertools.product(*(_edge_values(model, column) for column in SCORING_COLUMNS)))
+
+def check_parity(version=None):
+    """Compare the vectorized scores with the decimal reference and the local CURATE SQL"""
+    import local_pipeline as lp
+
+    model = load_model(version)
+    grid = parity_grid(model)
+    scores = risk_scores(*zip(*grid), model=model)
+    categories = risk_categories(scores, model)
+
+    reference = [score_repository(*row, model=model) for row in grid]
+    reference_mismatches = sum(
+        (int(score), category) != expected
+        for score, category, expected in zip(scores, categories, reference)
+    )
+
+    conn = lp.get_local_connection()
+    conn.executemany("""
+        INSERT INTO ENRICH.REPO_ENTRYLINE (
+            DATA_SOURCE, FULL_NAME, STARS, COMMITS_90D, ACTIVE_CONTRIBUTORS_90D,
+            DAYS_SINCE_LAST_RELEASE, OPEN_ISSUES
+        ) VALUES ('git_hub', ?, ?, ?, ?, ?, ?)
+    """, [(f"grid/{i}",) + row for i, row in enumerate(grid)])
+    sql_scores = dict(conn.execute(f"SELECT FULL_NAME, risk_score_raw FROM ({lp.risk_score_sql(model)})"))
+    conn.close()
+    sql_mismatches = sum(int(score) != sql_scores[f"grid/{i}"] for i, score in enumerate(scores))
+
+    print("\n" + "="*70)
+    print(f"RISK SCORING PARITY CHECK: model {model['version']}")
+    print("="*70)
+    print(f"Input combinations:              {len(grid):,}")
+    print(f"Mismatches vs decimal reference: {reference_mismatches}")
+    print(f"Mismatches vs local CURATE SQL:  {sql_mismatches}")
+    print("="*70)
+    return reference_mismatches == 0 and sql_mismatches == 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized repository risk scoring')
+    parser.add_argument('--models', action='store_true', help='List the risk model versions in risk_models.json')
+    parser.add_argument('--check', type=str, nargs='?', const='', metavar='VERSION',
+                        help='Check parity with the SQL risk model (default: active version)')
+    parser.add_argument('--what-if', type=str, metavar='VERSION',
+                        help='Rescore the ENRICH snapshot of a local pipeline (see --db) under VERSION')
+    parser.add_argument('--baseline', type=str, help='Baseline version for --what-if (default: active version)')
+    parser.add_argument('--db', type=str, help='Directory of a file-backed local pipeline')
+    profiling.add_argument(parser)
+
+    args = parser.parse_args()
+
+    if args.models:
+        active_version, models = load_models()
+        for version, model in models.items():
+            marker = '*' if version == active_version else ' '
+            print(f"{marker} {version:<10} {model['description']}")
+
+    if args.check is not None and not check_parity(args.check or None):
+        raise SystemExit(1)
+
+    if args.what_if:
+        import local_pipeline as lp
+
+        conn = lp.get_local_connection(args.db)
+        rows = conn.execute(f"""
+            SELECT {', '.join(SCORING_COLUMNS)} FROM ENRICH.REPO_ENTRYLINE WHERE DATA_SOURCE = 'git_hub'
+        """).fetchall()
+        conn.close()
+
+        columns = {column: [row[i] for row in rows] for i, column in enumerate(SCORING_COLUMNS)}
+        baseline, candidate = load_model(args.baseline), load_model(args.what_if)
+        start = time.perf_counter()
+        result = what_if(columns, baseline, candidate)
+        print_what_if(result, baseline, candidate, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    profiling.run_main(main, 'risk_scoring')
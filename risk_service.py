@@ -0,0 +1,422 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from dotenv import load_dotenv
+
+import pipeline_exporter
+import query_trace
+import replica
+import risk_queries
+
+load_dotenv()
+
+# Long-running HTTP/JSON lookup service over the data product, for callers that would
+# otherwise start a Python process and log in to Snowflake per question (CI jobs running
+# risk_analysis.py --report). Every git_hub row is held in memory keyed by upper-cased
+# full name, with the risk orderings, language rollup and summary computed when the data
+# is loaded. A background thread checks the watermark (MAX(LAST_UPDATED), COUNT(*) and a
+# HASH_AGG of the full names) every interval: unchanged data costs nothing, updated and
+# added rows are merged in from a delta query, and a key set the delta cannot account for
+# (deleted or replaced repositories) reloads everything, as does every FULL_RELOAD_INTERVAL
+# seconds. Each load builds a new immutable snapshot that is swapped in, so requests never
+# wait for a refresh.
+#
+#   GET  /repos/<owner>/<name>                    one repository
+#   POST /repos  {"repos": [...]}                 many repositories (also GET /repos?name=..&name=..)
+#   GET  /top?n=10&order=risky|healthy&language=  top N by risk score
+#   GET  /languages?limit=15                      repository count and risk mix per language
+#   GET  /summary                                 totals per risk category
+#   GET  /stats, /metrics                         latency percentiles per endpoint (JSON / Prometheus)
+#   GET  /health
+
+DEFAULT_PORT = 8765
+DEFAULT_INTERVAL = 60
+# backstop for key changes the hash check lets through (a repository replaced by one with
+# an older LAST_UPDATED in the same interval as new ones)
+FULL_RELOAD_INTERVAL = 24 * 3600
+LATENCY_WINDOW = 10000
+MAX_BATCH = 10000
+MAX_TOP = 1000
+TOP_CACHE = 256
+PERCENTILES = (50, 90, 99)
+
+FIELDS = [column.lower() for column in risk_queries.REPO_COLUMNS] + ['last_updated']
+SCORE, CATEGORY, LANGUAGE = FIELDS.index('risk_score'), FIELDS.index('risk_category'), FIELDS.index('language')
+
+def get_connection():
+    import snowflake.connector
+
+    return query_trace.traced(snowflake.connector.connect(
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        role=os.getenv("SNOWFLAKE_ROLE"),
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        database=os.getenv("SNOWFLAKE_DATABASE")
+    ))
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return str(value)
+    return value
+
+def _fetchall(conn, sql, params=None):
+    cursor = conn.cursor()
+    try:
+        if params is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+class Snapshot:
+    """Immutable in-memory view of the data product; a refresh builds a new one and swaps it in"""
+
+    def __init__(self, rows, watermark, count, keys, full_loaded_at=None):
+        self.rows = rows
+        self.watermark = watermark
+        self.count = count
+        self.keys = keys
+        self.loaded_at = time.time()
+        self.full_loaded_at = full_loaded_at or self.loaded_at
+        # one sort by risk; the stable re-sort by score alone keeps names ascending within a score
+        riskiest = sorted(rows.items(), key=lambda item: (-(item[1][SCORE] or 0), item[1][0]))
+        healthiest = sorted(riskiest, key=lambda item: item[1][SCORE] or 0)
+        self.riskiest = [key for key, _ in riskiest]
+        self.healthiest = [key for key, _ in healthiest]
+        self.by_language = {'riskiest': {}, 'healthiest': {}}
+        languages = {}
+        categories = Counter()
+        total_score = 0.0
+        for key, row in riskiest:
+            name = row[LANGUAGE] or 'Unknown'
+            language = languages.get(name)
+            if language is None:
+                language = languages[name] = [0, 0.0, Counter()]
+                self.by_language['riskiest'][name] = []
+            self.by_language['riskiest'][name].append(key)
+            language[0] += 1
+            language[1] += row[SCORE] or 0
+            language[2][row[CATEGORY]] += 1
+            categories[row[CATEGORY]] += 1
+            total_score += row[SCORE] or 0
+        for key, row in healthiest:
+            self.by_language['healthiest'].setdefault(row[LANGUAGE] or 'Unknown', []).append(key)
+        self.language_names = {name.upper(): name for name in languages}
+        self.languages = [
+            {'language': name, 'repo_count': count, 'avg_risk_score': round(score / count, 2),
+             'high_risk': mix['HIGH'], 'medium_risk': mix['MEDIUM'], 'low_risk': mix['LOW']}
+            for name, (count, score, mix) in sorted(languages.items(), key=lambda item: (-item[1][0], item[0]))
+        ]
+        self.summary = {
+            'total_repos': len(rows),
+            'avg_risk_score': round(total_score / len(rows), 2) if rows else None,
+            'high_risk_count': categories['HIGH'],
+            'medium_risk_count': categories['MEDIUM'],
+            'low_risk_count': categories['LOW'],
+            'last_updated': _plain(watermark),
+        }
+        self._top = {}
+
+    def document(self, key):
+        return dict(zip(FIELDS, self.rows[key]))
+
+    def top(self, n, riskiest=True, language=None):
+        cache_key = (n, riskiest, language)
+        result = self._top.get(cache_key)
+        if result is None:
+            order = 'riskiest' if riskiest else 'healthiest'
+            keys = getattr(self, order) if language is None else self.by_language[order].get(self.language_names.get(language.upper()), [])
+            result = [self.document(key) for key in keys[:n]]
+            if len(self._top) < TOP_CACHE:
+                self._top[cache_key] = result
+        return result
+
+class LatencyStats:
+    """Latencies of the most recent requests per endpoint"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.counts = Counter()
+        self.errors = Counter()
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok=True):
+        with self._lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self.counts[endpoint] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self):
+        """{endpoint: count, errors and p50/p90/p99/max latency in ms over the window}"""
+        with self._lock:
+            samples = {endpoint: sorted(values) for endpoint, values in self.samples.items()}
+            counts, errors = dict(self.counts), dict(self.errors)
+        report = {}
+        for endpoint, values in sorted(samples.items()):
+            entry = {'count': counts[endpoint], 'errors': errors.get(endpoint, 0)}
+            for percentile in PERCENTILES:
+                entry[f"p{percentile}_ms"] = round(values[min(len(values) - 1, len(values) * percentile // 100)] * 1000, 3)
+            entry['max_ms'] = round(values[-1] * 1000, 3)
+            report[endpoint] = entry
+        return report
+
+class RiskService:
+    """The in-memory index, its watermark refresh and the request handling"""
+
+    def __init__(self, connect, interval=DEFAULT_INTERVAL, full_reload_interval=FULL_RELOAD_INTERVAL):
+        self.connect = connect
+        self.interval = interval
+        self.full_reload_interval = full_reload_interval
+        self.conn = None
+        self.snapshot = None
+        self.latency = LatencyStats()
+        self.refreshes = Counter()
+        self.failures = 0
+        self.last_refresh = None
+        self.last_duration = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Bring the index up to the source's watermark; returns 'unchanged', 'delta', 'full' or 'failed'"""
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = self.connect()
+            watermark, count, keys = _fetchall(self.conn, risk_queries.WATERMARK_SQL)[0]
+            current = self.snapshot
+            if current is not None and time.time() - current.full_loaded_at >= self.full_reload_interval:
+                current = None
+            if current is not None and (watermark, count, keys) == (current.watermark, current.count, current.keys):
+                kind = 'unchanged'
+            else:
+                rows = None
+                if current is not None and current.watermark is not None:
+                    delta = _fetchall(self.conn, risk_queries.product_rows_sql(since=True), (current.watermark,))
+                    rows = dict(current.rows)
+                    rows.update((row[0].upper(), tuple(map(_plain, row))) for row in delta)
+                    kind = 'delta'
+                    # with the same key set the delta only updated rows; a changed one must be
+                    # explained by the repositories the delta added, and the count must add up
+                    if keys != current.keys and (len(rows) == len(current.rows) or len(rows) != count):
+                        rows = None
+                if rows is None or len(rows) != count:
+                    # first load, or repositories were removed or replaced: the delta cannot account for them
+                    rows = {row[0].upper(): tuple(map(_plain, row))
+                            for row in _fetchall(self.conn, risk_queries.product_rows_sql())}
+                    kind = 'full'
+                self.snapshot = Snapshot(rows, watermark, count, keys,
+                                         current.full_loaded_at if kind == 'delta' else None)
+        except Exception as e:
+            print(f"Error refreshing the risk index: {e}")
+            # reconnect on the next refresh, and keep serving the last good snapshot
+            self.conn = None
+            self.failures += 1
+            kind = 'failed'
+        self.last_refresh = time.time()
+        self.last_duration = time.perf_counter() - start
+        self.refreshes[kind] += 1
+        return kind
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        """Load now, then keep refreshing in the background"""
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name='risk-index-refresh', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def batch(self, snapshot, names):
+        if len(names) > MAX_BATCH:
+            raise ValueError(f"At most {MAX_BATCH} repositories per batch")
+        found, missing = {}, []
+        for name in names:
+            key = str(name).strip().upper()
+            if key in snapshot.rows:
+                found[name] = snapshot.document(key)
+            else:
+                missing.append(name)
+        return {'found': found, 'missing': missing}
+
+    def stats(self):
+        snapshot = self.snapshot
+        return {
+            'rows': len(snapshot.rows) if snapshot else 0,
+            'watermark': _plain(snapshot.watermark) if snapshot else None,
+            'loaded_at': snapshot.loaded_at if snapshot else None,
+            'last_refresh': self.last_refresh,
+            'last_refresh_ms': round(self.last_duration * 1000, 3) if self.last_duration is not None else None,
+            'refreshes': dict(self.refreshes),
+            'uptime_seconds': round(time.time() - self.latency.started, 1),
+            'endpoints': self.latency.report(),
+        }
+
+    def metrics(self):
+        """Prometheus exposition of the latency percentiles and index state"""
+        stats = self.stats()
+        latency = pipeline_exporter.MetricFamily('risk_service_request_latency_seconds',
+                                                 'Request latency over the recent window', 'summary')
+        requests = pipeline_exporter.MetricFamily('risk_service_requests_total', 'Requests served', 'counter')
+        for endpoint, entry in stats['endpoints'].items():
+            for percentile in PERCENTILES:
+                latency.add(entry[f"p{percentile}_ms"] / 1000, endpoint=endpoint, quantile=percentile / 100)
+            requests.add(entry['count'], endpoint=endpoint)
+        rows = pipeline_exporter.MetricFamily('risk_service_index_rows', 'Repositories in the in-memory index')
+        rows.add(stats['rows'])
+        refresh = pipeline_exporter.MetricFamily('risk_service_refresh_duration_seconds', 'Duration of the latest refresh')
+        refresh.add(self.last_duration)
+        return '\n'.join(family.render() for family in (latency, requests, rows, refresh)) + '\n'
+
+    def handle(self, method, path, query, body=None):
+        """(endpoint, HTTP status, JSON-able payload or text) of one request"""
+        snapshot = self.snapshot
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if parts == ['health']:
+            ok = snapshot is not None
+            return 'health', 200 if ok else 503, {'status': 'ok' if ok else 'loading', 'rows': len(snapshot.rows) if ok else 0}
+        if parts == ['stats']:
+            return 'stats', 200, self.stats()
+        if parts == ['metrics']:
+            return 'metrics', 200, self.metrics()
+        if snapshot is None:
+            return 'loading', 503, {'error': 'The index is still loading'}
+
+        if parts[0] == 'repos' and len(parts) == 3 and method == 'GET':
+            key = f"{parts[1]}/{parts[2]}".upper()
+            if key not in snapshot.rows:
+                return 'repo', 404, {'error': f"Repository not found: '{parts[1]}/{parts[2]}'"}
+            return 'repo', 200, snapshot.document(key)
+        if parts == ['repos']:
+            names = query.get('name', []) if method == 'GET' else _posted_names(body)
+            return 'batch', 200, self.batch(snapshot, names)
+        if parts == ['top'] and method == 'GET':
+            n = int(query.get('n', ['10'])[0])
+            if not 0 < n <= MAX_TOP:
+                raise ValueError(f"n must be between 1 and {MAX_TOP}")
+            order = query.get('order', ['risky'])[0]
+            if order not in ('risky', 'healthy'):
+                raise ValueError("order must be 'risky' or 'healthy'")
+            language = query.get('language', [None])[0]
+            return 'top', 200, snapshot.top(n, order == 'risky', language)
+        if parts == ['languages'] and method == 'GET':
+            return 'languages', 200, snapshot.languages[:int(query.get('limit', ['15'])[0])]
+        if parts == ['summary'] and method == 'GET':
+            return 'summary', 200, snapshot.summary
+        return 'unknown', 404, {'error': f"No such endpoint: {method} {path}"}
+
+def _posted_names(body):
+    """The 'repos' list of a POST /repos body; ValueError (a 400) for any other shape"""
+    document = json.loads(body or b'{}')
+    if not isinstance(document, dict):
+        raise ValueError("The request body must be a JSON object")
+    names = document.get('repos') or []
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError("'repos' must be a list of repository names")
+    return names
+
+class RiskHandler(BaseHTTPRequestHandler):
+    # keep-alive, so a client issuing many lookups pays for one connection; headers and body are
+    # separate writes, which Nagle would hold back until the client's delayed ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service = None
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        body = None
+        if method == 'POST':
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            endpoint, status, payload = self.service.handle(method, url.path, parse_qs(url.query), body)
+        except ValueError as e:
+            endpoint, status, payload = 'bad_request', 400, {'error': str(e)}
+        except Exception as e:
+            endpoint, status, payload = 'error', 500, {'error': str(e)}
+
+        if isinstance(payload, str):
+            content_type, data = 'text/plain; version=0.0.4; charset=utf-8', payload.encode('utf-8')
+        else:
+            content_type, data = 'application/json', json.dumps(payload, default=_plain).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.service.latency.record(endpoint, time.perf_counter() - start, status < 500)
+
+    def log_message(self, format, *args):
+        pass
+
+def create_server(service, host='127.0.0.1', port=DEFAULT_PORT):
+    """HTTP server answering from the service's in-memory index (port 0 picks a free port)"""
+    handler = type('RiskServiceHandler', (RiskHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP/JSON risk lookup service over an in-memory copy of the data product')
+    parser.add_argument('--replica', type=str, nargs='?', const=os.getenv("RISK_ANALYSIS_REPLICA", replica.DEFAULT_PATH),
+                        help='Load from the local replica instead of Snowflake')
+    parser.add_argument('--db', type=str, help='Load from a file-backed local pipeline instead of Snowflake')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='Seconds between watermark checks')
+
+    args = parser.parse_args()
+
+    if args.replica:
+        connect, source = (lambda: replica.connect(args.replica)), f"replica {args.replica}"
+    elif args.db:
+        connect, source = (lambda: replica.get_local_db_connection(args.db)), f"local pipeline {args.db}"
+    else:
+        connect, source = get_connection, "Snowflake"
+    service = RiskService(connect, args.interval).start()
+    server = create_server(service, args.host, args.port)
+    rows = len(service.snapshot.rows) if service.snapshot else 0
+    print(f"Serving {rows:,} repositories from {source} on http://{args.host}:{server.server_port} "
+          f"(watermark checked every {args.interval:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+if __name__ == "__main__":
+    main()
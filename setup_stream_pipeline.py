@@ -3,17 +3,42 @@ import snowflake.connector
 from dotenv import load_dotenv
 import os
 
+import layer_metrics
+import profiling
+import query_trace
+
 load_dotenv()
 
+# Raw tables whose inserts are tracked by a stream and consumed incrementally
+RAW_STREAM_TABLES = [
+    'SRC_GIT_REPOSITORIES',
+    'SRC_GIT_REPO_CONTRIBUTORS',
+    'SRC_GIT_REPO_COMMITS',
+    'SRC_GIT_REPO_ISSUES',
+    'SRC_GIT_REPO_RELEASES',
+]
+
+# Every task sets QUERY_TAG = 'pipeline:<node>', so the statements its procedures run can be
+# found in QUERY_HISTORY (a task's session never carries a client's tag)
+QUERY_TAG_PREFIX = 'pipeline'
+
+# LINKMAP hubs loaded by independent nodes of the task graph
+LINKMAP_HUB_TABLES = [
+    'HUB_REPO_CONTRIBUTORS',
+    'HUB_REPO_COMMITS',
+    'HUB_REPO_ISSUES',
+    'HUB_REPO_RELEASES',
+]
+
 def setup_pipeline_with_stream():
-    conn = snowflake.connector.connect(
+    conn = query_trace.traced(snowflake.connector.connect(
         user=os.getenv("SNOWFLAKE_USER"),
         password=os.getenv("SNOWFLAKE_PASSWORD"),
         role=os.getenv("SNOWFLAKE_ROLE"),
         account=os.getenv("SNOWFLAKE_ACCOUNT"),
         warehouse='COMPUTE_WH',
         database=os.getenv("SNOWFLAKE_DATABASE")
-    )
+    ))
     
     cursor = conn.cursor()
     
@@ -31,13 +56,63 @@ def setup_pipeline_with_stream():
             );
         """)
         
-        print("3. Creating stream on raw table...")
+        print("3. Creating streams on raw tables...")
+        # SHOW_INITIAL_ROWS lets the first run backfill rows loaded before the stream existed
+        for table in RAW_STREAM_TABLES:
+            cursor.execute(f"""
+                CREATE OR REPLACE STREAM RAW.STREAM_{table} 
+                ON TABLE RAW.{table}
+                APPEND_ONLY = TRUE
+                SHOW_INITIAL_ROWS = TRUE;
+            """)
+        
+        print("4. Creating task graph node procedure...")
+        # every graph node logs its own start/end time so PIPELINE_LOG shows the critical path
         cursor.execute("""
-            CREATE OR REPLACE STREAM RAW.STREAM_SRC_GIT_REPOSITORIES 
-            ON TABLE RAW.SRC_GIT_REPOSITORIES;
+            CREATE OR REPLACE PROCEDURE ORCHESTRATION.SP_RUN_PIPELINE_NODE(P_NODE VARCHAR, P_CALL VARCHAR)
+            RETURNS VARCHAR
+            LANGUAGE SQL
+            AS
+            $$
+            DECLARE
+                v_start_time TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP();
+                v_log_id NUMBER;
+            BEGIN
+                INSERT INTO ORCHESTRATION.PIPELINE_LOG 
+                    (pipeline_name, stage, status, message, start_time)
+                VALUES ('GITHUB_RISK', :P_NODE, 'STARTED', :P_CALL, :v_start_time);
+                
+                -- only this row is closed below, never an older STARTED row left open by a
+                -- killed run (a node's task does not overlap itself, so the start time is unique)
+                SELECT MAX(log_id) INTO :v_log_id
+                FROM ORCHESTRATION.PIPELINE_LOG
+                WHERE pipeline_name = 'GITHUB_RISK' 
+                  AND stage = :P_NODE 
+                  AND start_time = :v_start_time;
+                
+                EXECUTE IMMEDIATE :P_CALL;
+                
+                UPDATE ORCHESTRATION.PIPELINE_LOG 
+                SET status = 'COMPLETED', 
+                    message = 'Node completed: ' || :P_CALL,
+                    end_time = CURRENT_TIMESTAMP()
+                WHERE log_id = :v_log_id;
+                
+                RETURN 'SUCCESS: ' || :P_NODE;
+            EXCEPTION
+                WHEN OTHER THEN
+                    UPDATE ORCHESTRATION.PIPELINE_LOG 
+                    SET status = 'ERROR', 
+                        message = 'Node failed: ' || SQLERRM,
+                        end_time = CURRENT_TIMESTAMP()
+                    WHERE log_id = :v_log_id;
+                    RAISE;
+            END;
+            $$;
         """)
         
-        print("4. Creating wrapper procedure with stream check...")
+        print("5. Creating wrapper procedure with stream check...")
+        # root node of the task graph: logs the run and loads STAGE; the LINKMAP tasks follow it
         cursor.execute("""
             CREATE OR REPLACE PROCEDURE ORCHESTRATION.SP_RUN_GIT_PIPELINE()
             RETURNS VARCHAR
@@ -46,47 +121,38 @@ def setup_pipeline_with_stream():
             $$
             DECLARE
                 v_stream_has_data BOOLEAN;
-                v_result VARCHAR;
+                no_new_data EXCEPTION (-20001, 'No new data in stream, task graph skipped');
             BEGIN
-                -- Check if stream has data
-                SELECT SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPOSITORIES') INTO v_stream_has_data;
+                -- Check if any raw stream has data
+                SELECT SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPOSITORIES')
+                    OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_CONTRIBUTORS')
+                    OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_COMMITS')
+                    OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_ISSUES')
+                    OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_RELEASES')
+                INTO v_stream_has_data;
                 
                 IF (v_stream_has_data = FALSE) THEN
-                    -- No new data, skip execution
+                    -- No new data: fail the root so its AFTER tasks do not run (a successful
+                    -- return would let ENRICH and CURATE run over an empty queue)
                     INSERT INTO ORCHESTRATION.PIPELINE_LOG 
                         (pipeline_name, stage, status, message)
                     VALUES ('GITHUB_RISK', 'CHECK_STREAM', 'SKIPPED', 
                             'No new data in stream, skipping pipeline execution');
-                    RETURN 'No new data, pipeline skipped';
+                    RAISE no_new_data;
                 END IF;
                 
-                -- Log start
+                -- Log start; the finalizer task closes this row once the whole graph has run
                 INSERT INTO ORCHESTRATION.PIPELINE_LOG 
                     (pipeline_name, stage, status, message)
                 VALUES ('GITHUB_RISK', 'FULL_PIPELINE', 'STARTED', 
                         'New data detected, starting pipeline execution');
                 
-                -- Execute all pipeline steps
-                CALL STAGE.SP_LOAD_STG_REPOSITORIES();
-                CALL LINKMAP.SP_LOAD_HUB_REPO_CONTRIBUTORS();
-                CALL LINKMAP.SP_LOAD_HUB_REPO_COMMITS();
-                CALL LINKMAP.SP_LOAD_HUB_REPO_ISSUES();
-                CALL LINKMAP.SP_LOAD_HUB_REPO_RELEASES();
-                CALL ENRICH.SP_LOAD_REPO_ENTRYLINE();
-                CALL CURATE.SP_LOAD_RISK_ANALYSIS_DATA_PRODUCT();
+                CALL ORCHESTRATION.SP_RUN_PIPELINE_NODE('STAGE', 'CALL STAGE.SP_LOAD_STG_REPOSITORIES()');
                 
-                -- Log success
-                UPDATE ORCHESTRATION.PIPELINE_LOG 
-                SET status = 'COMPLETED', 
-                    message = 'Pipeline completed successfully for new data',
-                    end_time = CURRENT_TIMESTAMP()
-                WHERE pipeline_name = 'GITHUB_RISK' 
-                  AND stage = 'FULL_PIPELINE' 
-                  AND status = 'STARTED'
-                  AND end_time IS NULL;
-                
-                RETURN 'Pipeline executed successfully for new data';
+                RETURN 'STAGE loaded, task graph continues';
             EXCEPTION
+                WHEN no_new_data THEN
+                    RAISE;
                 WHEN OTHER THEN
                     -- Log error
                     INSERT INTO ORCHESTRATION.PIPELINE_LOG 
@@ -98,17 +164,99 @@ def setup_pipeline_with_stream():
             $$;
         """)
         
-        print("5. Creating scheduled task...")
-        cursor.execute("""
+        print("6. Creating task graph...")
+        # child tasks can only be added while the root task is suspended
+        cursor.execute("ALTER TASK IF EXISTS ORCHESTRATION.TASK_RUN_GIT_PIPELINE SUSPEND;")
+        
+        cursor.execute(f"""
             CREATE OR REPLACE TASK ORCHESTRATION.TASK_RUN_GIT_PIPELINE
                 WAREHOUSE = 'COMPUTE_WH'
                 SCHEDULE = '2 MINUTE'
+                QUERY_TAG = '{QUERY_TAG_PREFIX}:STAGE'
+            WHEN SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPOSITORIES')
+                OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_CONTRIBUTORS')
+                OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_COMMITS')
+                OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_ISSUES')
+                OR SYSTEM$STREAM_HAS_DATA('RAW.STREAM_SRC_GIT_REPO_RELEASES')
             AS
                 CALL ORCHESTRATION.SP_RUN_GIT_PIPELINE();
         """)
         
-        print("6. Resuming task...")
-        cursor.execute("ALTER TASK ORCHESTRATION.TASK_RUN_GIT_PIPELINE RESUME;")
+        # the four LINKMAP loads read different RAW streams and MERGE only into their own hub
+        # and latest-batch tables (LOAD_BATCHES and CHANGED_REPOS take plain INSERTs, which
+        # do not lock each other), so they run concurrently once STAGE is done
+        linkmap_tasks = []
+        for table in LINKMAP_HUB_TABLES:
+            node = f"LINKMAP_{table[len('HUB_REPO_'):]}"
+            cursor.execute(f"""
+                CREATE OR REPLACE TASK ORCHESTRATION.TASK_{node}
+                    WAREHOUSE = 'COMPUTE_WH'
+                    QUERY_TAG = '{QUERY_TAG_PREFIX}:{node}'
+                    AFTER ORCHESTRATION.TASK_RUN_GIT_PIPELINE
+                AS
+                    CALL ORCHESTRATION.SP_RUN_PIPELINE_NODE('{node}', 'CALL LINKMAP.SP_LOAD_{table}()');
+            """)
+            linkmap_tasks.append(f"ORCHESTRATION.TASK_{node}")
+        
+        # ENRICH waits for every LINKMAP load, CURATE and the purge follow in order
+        downstream = [
+            ('ENRICH', 'CALL ENRICH.SP_LOAD_REPO_ENTRYLINE()', ', '.join(linkmap_tasks)),
+            ('CURATE', 'CALL CURATE.SP_LOAD_RISK_ANALYSIS_DATA_PRODUCT()', 'ORCHESTRATION.TASK_ENRICH'),
+            # keep the last 3 LINKMAP batches; older superseded rows are purged
+            ('PURGE_LINKMAP', 'CALL LINKMAP.SP_PURGE_HUB_BATCHES(3)', 'ORCHESTRATION.TASK_CURATE'),
+        ]
+        for node, call, after in downstream:
+            cursor.execute(f"""
+                CREATE OR REPLACE TASK ORCHESTRATION.TASK_{node}
+                    WAREHOUSE = 'COMPUTE_WH'
+                    QUERY_TAG = '{QUERY_TAG_PREFIX}:{node}'
+                    AFTER {after}
+                AS
+                    CALL ORCHESTRATION.SP_RUN_PIPELINE_NODE('{node}', '{call}');
+            """)
+        
+        # runs after every graph run, successful or not, and closes the FULL_PIPELINE row
+        cursor.execute(f"""
+            CREATE OR REPLACE TASK ORCHESTRATION.TASK_FINALIZE_GIT_PIPELINE
+                WAREHOUSE = 'COMPUTE_WH'
+                QUERY_TAG = '{QUERY_TAG_PREFIX}:FINALIZE'
+                FINALIZE = ORCHESTRATION.TASK_RUN_GIT_PIPELINE
+            AS
+                UPDATE ORCHESTRATION.PIPELINE_LOG p
+                SET status = IFF(f.error_count > 0, 'ERROR', 'COMPLETED'),
+                    message = 'Pipeline task graph finished',
+                    end_time = CURRENT_TIMESTAMP()
+                FROM (
+                    -- errors logged since each open run started (no correlated subquery in SET)
+                    SELECT r.log_id, COUNT(e.log_id) AS error_count
+                    FROM ORCHESTRATION.PIPELINE_LOG r
+                    LEFT JOIN ORCHESTRATION.PIPELINE_LOG e
+                      ON e.pipeline_name = 'GITHUB_RISK'
+                     AND e.status = 'ERROR'
+                     AND e.start_time >= r.start_time
+                    WHERE r.pipeline_name = 'GITHUB_RISK' 
+                      AND r.stage = 'FULL_PIPELINE' 
+                      AND r.status = 'STARTED'
+                      AND r.end_time IS NULL
+                    GROUP BY r.log_id
+                ) f
+                WHERE p.log_id = f.log_id;
+        """)
+        
+        # the layer metrics scan whole tables, so they refresh on their own slower schedule
+        # instead of inside every 2-minute incremental run
+        cursor.execute(f"""
+            CREATE OR REPLACE TASK ORCHESTRATION.TASK_REFRESH_LAYER_METRICS
+                WAREHOUSE = 'COMPUTE_WH'
+                SCHEDULE = '{layer_metrics.REFRESH_MINUTES} MINUTE'
+                QUERY_TAG = '{QUERY_TAG_PREFIX}:REFRESH_LAYER_METRICS'
+            AS
+                CALL ORCHESTRATION.SP_REFRESH_LAYER_METRICS();
+        """)
+        
+        print("7. Resuming task graph...")
+        cursor.execute("SELECT SYSTEM$TASK_DEPENDENTS_ENABLE('ORCHESTRATION.TASK_RUN_GIT_PIPELINE');")
+        cursor.execute("ALTER TASK ORCHESTRATION.TASK_REFRESH_LAYER_METRICS RESUME;")
 
         print("Stream-based pipeline setup completed successfully!")
         
@@ -120,4 +268,4 @@ def setup_pipeline_with_stream():
         conn.close()
 
 if __name__ == "__main__":
-    setup_pipeline_with_stream()
\ No newline at end of file
+    profiling.run_main(setup_pipeline_with_stream, 'setup_stream_pipeline')
\ No newline at end of file